@@ -0,0 +1,99 @@
+''' Benchmark `extract_variable()` engines
+
+    Example
+        $ python bench/extract_bench.py
+        $ python bench/extract_bench.py --repeat 10 --json
+
+    Note
+        - compares `engine='ast'` (current extractor) against `engine='token'` and
+          `engine='bytecode'` on generated source files shaped like real world modules.
+        - files are compiled into `__pycache__` first, like an installed package would be.
+'''
+import sys
+import json
+import time
+import os.path
+import argparse
+import py_compile
+import tempfile
+import tracemalloc
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dynamic_import.extract import ENGINES, extract_variable  # noqa: E402
+
+
+def generate_pb2(count):
+    ''' generated `*_pb2.py` like module, huge serialized blob & many top-level assignments. '''
+    lines = ['from google.protobuf import descriptor as _descriptor\n',
+             f'DESCRIPTOR = _descriptor.AddSerializedFile({bytes(range(256)) * (count * 4)!r})\n']
+    for i in range(count):
+        lines.append(f'_MESSAGE{i} = DESCRIPTOR.message_types_by_name["Message{i}"]\n')
+        lines.append(f'Message{i} = _reflection.GeneratedProtocolMessageType("Message{i}", (_message.Message,), {{\n'
+                     f'    "DESCRIPTOR": _MESSAGE{i},\n    "__module__": "schema_pb2",\n}})\n')
+    return ''.join(lines)
+
+
+def generate_functions(count, with_all):
+    ''' large hand written like module, optionally starting with `__all__`. '''
+    lines = []
+    if with_all:
+        names = ', '.join(f'"function_{i}"' for i in range(count))
+        lines.append(f'__all__ = ({names},)\n\n')
+    for i in range(count):
+        lines.append(f'def function_{i}(value, *, option=None):\n'
+                     f'    """Docstring {i}."""\n'
+                     f'    result = [value * {i} for _ in range(10)]\n'
+                     f'    if option:\n'
+                     f'        result.append({{"key": option}})\n'
+                     f'    return result\n\n\n'
+                     f'class Class{i}:\n'
+                     f'    attribute = {i}\n\n'
+                     f'    def method(self):\n'
+                     f'        return self.attribute\n\n\n')
+    return ''.join(lines)
+
+
+def measure(path, engine, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract_variable(path, engine)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    extract_variable(path, engine)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=2000, help='number of definitions per file')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print JSON lines instead of table')
+    args = parser.parse_args()
+
+    sources = {'pb2': generate_pb2(args.size),
+               'functions': generate_functions(args.size, False),
+               'functions_all': generate_functions(args.size, True)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, source in sources.items():
+            path = os.path.join(tmp, f'{name}.py')
+            with open(path, 'w') as file:
+                file.write(source)
+            py_compile.compile(path, doraise=True)
+
+            result = {'file': name, 'bytes': os.path.getsize(path)}
+            assert extract_variable(path, 'ast') == extract_variable(path, 'token') == \
+                   extract_variable(path, 'bytecode')
+            for engine in ENGINES:
+                result[f'{engine}_seconds'], result[f'{engine}_peak_bytes'] = measure(path, engine, args.repeat)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                timings = '   '.join(f"{engine}: {result[f'{engine}_seconds'] * 1e3:8.2f} ms "
+                                     f"{result[f'{engine}_peak_bytes'] / 1e6:7.2f} MB peak" for engine in ENGINES)
+                print(f"{name:<15} {result['bytes'] / 1e6:6.2f} MB   {timings}")
+
+
+if __name__ == '__main__':
+    main()
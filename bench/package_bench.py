@@ -0,0 +1,217 @@
+''' Benchmark `importer()` on generated packages against eager import & `importlib.util.LazyLoader`
+
+    Example
+        $ python bench/package_bench.py
+        $ python bench/package_bench.py --modules 10 1000 50000 --depth 2 --exports implicit --json
+        $ python bench/package_bench.py --modules 100 --so 10  # also needs `cython` & C compiler
+        $ python bench/package_bench.py --modules 50000 --variants dynamic --index --validate unchecked
+
+    Note
+        - each measurement runs inside a new python process, so nothing is already imported.
+        - "dynamic" is `importer()`, "eager" is `from .module import *` of every module & "lazy" is
+          `LazyLoader` of every module with PEP 562 `__getattr__` mapping names to their module.
+        - metrics:
+            cold_seconds:       import with no cache, package is scanned & cache created ("dynamic" only)
+            warm_seconds:       import (best of `--repeat`), cache is used
+            invalidate_seconds: import after one module changed, only that file is scanned again ("dynamic" only)
+            access_seconds:     first use of a name from a module that is not loaded yet (best of `--repeat`)
+            import_bytes:       memory allocated by import (`tracemalloc`)
+            import_peak_bytes:  peak memory while importing, e.g. cache being loaded before it's unpacked
+            access_bytes:       memory allocated by first use of a name
+        - all files are compiled into `__pycache__` first, like an installed package would be.
+'''
+import os
+import sys
+import json
+import glob
+import shutil
+import os.path
+import argparse
+import platform
+import tempfile
+import compileall
+import subprocess
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+from dynamic_import.version import version  # noqa: E402
+
+PKG = 'bench_pkg'
+VARIANTS = ('eager', 'lazy', 'dynamic')
+PER_DIR = 100  # modules per directory when `--depth` is used.
+# ran inside new process, prints JSON of timings & memory.
+CHILD = '''
+import sys, json, time, tracemalloc
+sys.path[:0] = [{root!r}, {tmp!r}]
+if {trace!r}:
+    tracemalloc.start()
+start = time.perf_counter()
+import {pkg}
+imported = time.perf_counter()
+import_bytes, import_peak_bytes = tracemalloc.get_traced_memory()
+getattr({pkg}, {name!r})
+accessed = time.perf_counter()
+access_bytes = tracemalloc.get_traced_memory()[0] - import_bytes
+print(json.dumps({{'import': imported - start, 'access': accessed - imported,
+                  'import_bytes': import_bytes, 'import_peak_bytes': import_peak_bytes,
+                  'access_bytes': access_bytes}}))
+'''
+
+
+def module_path(i, depth):
+    ''' relative path of `i` module, e.g. depth 2: "d0/d3/m312" '''
+    k = i // PER_DIR
+    return '/'.join([*(f'd{(k // 10 ** level) % 10}' for level in reversed(range(depth))), f'm{i}'])
+
+
+def module_names(i, size):
+    return [f'm{i}_function_{j}' if j % 2 else f'M{i}_CONST_{j}' for j in range(size)]
+
+
+def generate_module(i, size, exports):
+    ''' module with `size` definitions, using `__all__` or implicit (all public names) exports. '''
+    lines = []
+    if exports == 'all':
+        lines.append(f'__all__ = {tuple(module_names(i, size))!r}\n\n')
+    else:
+        lines.append('_PRIVATE = None\n\n')
+    for name in module_names(i, size):
+        if name[0] == 'M':
+            lines.append(f'{name} = {{"value": {i}, "items": list(range(10))}}\n\n')
+        else:
+            lines.append(f'def {name}(value, *, option=None):\n'
+                         f'    """Docstring."""\n'
+                         f'    return [value * {i} for _ in range(10)] + [option]\n\n\n')
+    return ''.join(lines)
+
+
+def generate_init(variant, modules, depth, size, options=''):
+    if variant == 'dynamic':
+        return f'from dynamic_import import importer\nimporter({options})\n'
+    paths = [module_path(i, depth).replace('/', '.') for i in range(modules)]
+    if variant == 'eager':
+        return ''.join(f'from .{path} import *\n' for path in paths)
+    names = {name: f'{PKG}.{path}' for i, path in enumerate(paths) for name in module_names(i, size)}
+    return ('import sys\nimport importlib.util\n\n\n'
+            'def lazy_import(name):\n'
+            '    spec = importlib.util.find_spec(name)\n'
+            '    loader = importlib.util.LazyLoader(spec.loader)\n'
+            '    spec.loader = loader\n'
+            '    module = importlib.util.module_from_spec(spec)\n'
+            '    sys.modules[name] = module\n'
+            '    loader.exec_module(module)\n'
+            '    return module\n\n\n'
+            f'MODULES = {{name: lazy_import(name) for name in {sorted(set(names.values()))!r}}}\n'
+            f'NAMES = {names!r}\n\n\n'
+            'def __getattr__(name):\n'
+            '    try:\n'
+            '        return getattr(MODULES[NAMES[name]], name)\n'
+            '    except KeyError:\n'
+            '        raise AttributeError(name) from None\n')
+
+
+def generate_package(tmp, modules, depth, size, exports, so):
+    ''' write package into `tmp`, first `so` modules are compiled into extension modules. '''
+    pkg_dir = os.path.join(tmp, PKG)
+    for i in range(modules):
+        path = os.path.join(pkg_dir, f'{module_path(i, depth)}.py')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(generate_module(i, size, exports))
+    if so:
+        if not (cythonize := shutil.which('cythonize')):
+            raise SystemExit('`--so` requires `cython` to be installed.')
+        paths = []
+        for i in range(min(so, modules)):
+            path = os.path.join(pkg_dir, module_path(i, depth))
+            os.rename(f'{path}.py', f'{path}.pyx')
+            paths.append(f'{path}.pyx')
+        subprocess.run([cythonize, '--inplace', '-3', f'--parallel={os.cpu_count()}', '--quiet', *paths],
+                       check=True, capture_output=True, cwd=tmp)
+        for path in paths:
+            # note: source is removed so names are extracted by importing extension in worker process.
+            os.remove(path)
+            os.remove(f'{path[:-4]}.c')
+        for path in glob.glob(os.path.join(tmp, '**', 'build'), recursive=True):
+            shutil.rmtree(path)  # note: left over by `cythonize`, would be scanned as sub-package.
+    return pkg_dir
+
+
+def run(tmp, name, trace=False):
+    code = CHILD.format(root=ROOT, tmp=tmp, pkg=PKG, name=name, trace=trace)
+    r = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if r.returncode:
+        raise RuntimeError(r.stderr)
+    return json.loads(r.stdout)
+
+
+def bench_variant(tmp, pkg_dir, variant, args, modules):
+    ''' run all metrics of `variant` against already generated package '''
+    with open(os.path.join(pkg_dir, '__init__.py'), 'w') as file:
+        options = f'workers={args.workers}, engine={args.engine!r}, validate={args.validate!r}, index={args.index}'
+        file.write(generate_init(variant, modules, args.depth, args.size, options))
+    compileall.compile_dir(pkg_dir, quiet=2)
+    for path in (*glob.glob(os.path.join(pkg_dir, '__pycache__', '__init__.importer-*')),
+                 *glob.glob(os.path.join(pkg_dir, '__pycache__', '__init__.index-*'))):
+        os.remove(path)
+
+    # first use of a name, each repeat uses name from a different not yet loaded module.
+    names = [module_names(i, args.size)[0] for i in range(modules - 1, -1, -max(1, modules // args.repeat))]
+    result = {}
+    if variant == 'dynamic':
+        result['cold_seconds'] = run(tmp, names[0])['import']
+    timings = [run(tmp, name) for name in names[:args.repeat]]
+    result['warm_seconds'] = min(i['import'] for i in timings)
+    result['access_seconds'] = min(i['access'] for i in timings)
+    memory = run(tmp, names[0], True)
+    result['import_bytes'] = memory['import_bytes']
+    result['import_peak_bytes'] = memory['import_peak_bytes']
+    result['access_bytes'] = memory['access_bytes']
+    if variant == 'dynamic':
+        path = os.path.join(pkg_dir, f'{module_path(modules - 1, args.depth)}.py')
+        with open(path, 'a') as file:
+            file.write('\nINVALIDATE = 1\n')
+        result['invalidate_seconds'] = run(tmp, names[0])['import']
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='number of modules in package, each number is a separate benchmark (up to 50000)')
+    parser.add_argument('--depth', type=int, default=0, help='directory levels modules are spread across')
+    parser.add_argument('--size', type=int, default=10, help='number of definitions per module')
+    parser.add_argument('--exports', choices=('all', 'implicit'), default='all',
+                        help='modules define `__all__` or all public names are exported')
+    parser.add_argument('--so', type=int, default=0, help='number of modules compiled into extension modules')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--workers', type=int, default=1, help='`importer(workers)`')
+    parser.add_argument('--engine', default='ast', help='`importer(engine)`')
+    parser.add_argument('--validate', default='mtime_ns', help='`importer(validate)`')
+    parser.add_argument('--index', action='store_true', help='`importer(index=True)`')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print JSON lines instead of table')
+    args = parser.parse_args()
+
+    for modules in args.modules:
+        with tempfile.TemporaryDirectory() as tmp:
+            pkg_dir = generate_package(tmp, modules, args.depth, args.size, args.exports, args.so)
+            for variant in sorted(args.variants, key=VARIANTS.index):  # note: "dynamic" changes a file, so last.
+                result = {'bench': 'package', 'version': version, 'python': platform.python_version(),
+                          'modules': modules, 'depth': args.depth, 'size': args.size, 'exports': args.exports,
+                          'so': min(args.so, modules), 'variant': variant, 'workers': args.workers,
+                          'engine': args.engine, 'validate': args.validate, 'index': args.index,
+                          **bench_variant(tmp, pkg_dir, variant, args, modules)}
+                if args.json:
+                    print(json.dumps(result), flush=True)
+                else:
+                    seconds = '   '.join(f'{key[:-8]}: {result[key] * 1e3:9.2f} ms' for key in
+                                         ('cold_seconds', 'warm_seconds', 'invalidate_seconds', 'access_seconds')
+                                         if key in result)
+                    print(f"{modules:>6} modules  {variant:<8} {seconds}   "
+                          f"import: {result['import_bytes'] / 1e6:7.2f} MB   "
+                          f"peak: {result['import_peak_bytes'] / 1e6:7.2f} MB   "
+                          f"access: {result['access_bytes'] / 1e3:8.1f} KB", flush=True)
+
+
+if __name__ == '__main__':
+    main()
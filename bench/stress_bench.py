@@ -0,0 +1,147 @@
+''' Stress `importer()` with many processes & threads starting at once against missing, stale or corrupt cache
+
+    Example
+        $ python bench/stress_bench.py
+        $ python bench/stress_bench.py --processes 32 --threads 8 --modules 2000 --rounds 5 --json
+
+    Note
+        - each round starts `--processes` processes together, each imports the package from `--threads`
+          threads released at the same time.
+        - scenarios:
+            cold:    there is no cache
+            stale:   cache exists but one module was changed since it was created
+            corrupt: cache file is cut in half, as if it was read while still being written
+            warm:    cache is valid (baseline)
+        - counts come from instrumentation events (`DYNAMIC_IMPORT_STATS`) of all the processes:
+            scans:   number of processes that scanned the package, ideally 1 for cold, stale & corrupt
+            errors:  unreadable cache found ("cache_miss" with reason "error"), e.g. partially written
+        - round fails if any process crashed or imported package is missing names, exits with 1.
+'''
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from package_bench import ROOT, PKG, generate_package, generate_init, module_names, module_path
+sys.path.insert(0, ROOT)
+from dynamic_import.version import version  # noqa: E402
+
+SCENARIOS = ('cold', 'stale', 'corrupt', 'warm')
+# ran inside each process, prints JSON of when it was ready & what went wrong.
+CHILD = '''
+import sys, json, time, threading
+sys.path[:0] = [{root!r}, {tmp!r}]
+expected = {expected!r}
+barrier = threading.Barrier({threads})
+errors = []
+
+def run():
+    barrier.wait()
+    try:
+        import {pkg}
+        if (missing := len(set(expected) - set(dir({pkg})))):
+            errors.append(f'{{missing}} names are missing')
+        else:
+            getattr({pkg}, expected[-1])
+    except BaseException as e:
+        errors.append(f'{{type(e).__name__}}: {{e}}')
+
+threads = [threading.Thread(target=run) for _ in range({threads})]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(json.dumps({{'ready': time.time(), 'errors': errors}}))
+'''
+
+
+def prepare(scenario, pkg_dir, modules, depth, round_):
+    ''' put cache into state `scenario` needs, must be called after package was imported once. '''
+    cache_paths = glob.glob(os.path.join(pkg_dir, '__pycache__', '__init__.importer-*'))
+    if scenario == 'cold':
+        for path in cache_paths:
+            os.remove(path)
+    elif scenario == 'stale':
+        with open(os.path.join(pkg_dir, f'{module_path(modules - 1, depth)}.py'), 'a') as file:
+            file.write(f'\nSTALE_{round_} = 1\n')
+    elif scenario == 'corrupt':
+        for path in cache_paths:
+            with open(path, 'r+b') as file:
+                file.truncate(os.path.getsize(path) // 2)
+
+
+def run_round(tmp, args, expected):
+    ''' start all processes at once, returns result of each & instrumentation events '''
+    export = os.path.join(tmp, 'stats.jsonl')
+    if os.path.exists(export):
+        os.remove(export)
+    env = {**os.environ, 'DYNAMIC_IMPORT_STATS': export}
+    code = CHILD.format(root=ROOT, tmp=tmp, pkg=PKG, threads=args.threads, expected=expected)
+    start = time.time()
+    procs = [subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              text=True, env=env) for _ in range(args.processes)]
+    results = []
+    for proc in procs:
+        stdout, stderr = proc.communicate()
+        if proc.returncode:
+            results.append({'ready': time.time(), 'errors': [f'exit code {proc.returncode}: {stderr.strip()}']})
+        else:
+            results.append(json.loads(stdout))
+    events = []
+    if os.path.exists(export):
+        with open(export) as file:
+            events = [json.loads(line) for line in file]
+    return start, results, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=4, help='threads importing package inside each process')
+    parser.add_argument('--modules', type=int, default=500)
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--size', type=int, default=10, help='number of definitions per module')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1, help='`importer(workers)`')
+    parser.add_argument('--json', action='store_true', help='print JSON lines instead of table')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        pkg_dir = generate_package(tmp, args.modules, args.depth, args.size, 'all', 0)
+        with open(os.path.join(pkg_dir, '__init__.py'), 'w') as file:
+            file.write(generate_init('dynamic', args.modules, args.depth, args.size, f'workers={args.workers}'))
+        expected = [name for i in range(args.modules) for name in module_names(i, args.size)]
+        run_round(tmp, argparse.Namespace(processes=1, threads=1), expected)  # create cache & `.pyc` files.
+
+        for scenario in args.scenarios:
+            for round_ in range(args.rounds):
+                prepare(scenario, pkg_dir, args.modules, args.depth, round_)
+                start, results, events = run_round(tmp, args, expected)
+                errors = [error for result in results for error in result['errors']]
+                result = {'bench': 'stress', 'version': version, 'python': platform.python_version(),
+                          'scenario': scenario, 'round': round_, 'processes': args.processes,
+                          'threads': args.threads, 'modules': args.modules, 'workers': args.workers,
+                          'ready_seconds': max(i['ready'] for i in results) - start,
+                          'scans': sum(1 for i in events if i['event'] == 'scan'),
+                          'scan_seconds': sum(i['seconds'] for i in events if i['event'] == 'scan'),
+                          'cache_errors': sum(1 for i in events if i.get('reason') == 'error'),
+                          'failed': len(errors), 'error': errors[0] if errors else None}
+                failed = failed or bool(errors)
+                if args.json:
+                    print(json.dumps(result), flush=True)
+                else:
+                    print(f"{scenario:<8} round {round_}   ready: {result['ready_seconds'] * 1e3:8.1f} ms   "
+                          f"scans: {result['scans']:3} ({result['scan_seconds'] * 1e3:8.1f} ms)   "
+                          f"cache errors: {result['cache_errors']:3}   failed: {result['failed']:3}"
+                          + (f"   e.g. {result['error'][:200]}" if errors else ''), flush=True)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+from sys import stderr
+from argparse import ArgumentParser, REMAINDER
+from .profiler import profile_run, profile_report
+from .build import build_package, build_verify, build_static, build_bundle, build_inspect
+
+
+__all__ = 'main', 'main_profile', 'main_build', 'main_verify', 'main_inspect', 'main_compile', 'main_option'
+
+
+def main(args=None):
+    ''' Command line interface
+
+        Type
+            args:   Union[List[str], None]
+            return: Union[int, str, None]
+
+        Example
+            $ python3 -m dynamic_import profile app.py --port 8080
+            $ python3 -m dynamic_import profile -m app
+
+            # create cache ahead of time (e.g. image/wheel build), check it's up-to-date & show what's in it
+            $ python3 -m dynamic_import build pkg other_pkg -o workers=0
+            $ python3 -m dynamic_import verify pkg other_pkg
+            $ python3 -m dynamic_import inspect pkg --names
+
+            # memory-mapped index cache of many packages in one file, used when `DYNAMIC_IMPORT_BUNDLE=app.idx`
+            $ python3 -m dynamic_import build pkg other_pkg --bundle app.idx
+
+            # replace `importer()` with static lazy `__init__.py`, no scan or cache at run-time
+            $ python3 -m dynamic_import compile pkg --output build/lib/pkg/__init__.py
+    '''
+    parser = ArgumentParser(prog='python3 -m dynamic_import', description='Dynamic Import tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    profile = commands.add_parser('profile', help='run program & show every module that was lazily loaded.')
+    profile.add_argument('-m', dest='module', action='store_true', help='run `entry` as module (like `python -m`)')
+    profile.add_argument('entry', help='script path or module name to run')
+    profile.add_argument('args', nargs=REMAINDER, help='arguments passed to `entry`')
+    profile.set_defaults(func=main_profile)
+
+    for name, func, text in (('build', main_build, 'create cache of packages ahead of time.'),
+                             ('verify', main_verify, 'check cache of packages is up-to-date, without creating it.'),
+                             ('inspect', main_inspect, 'show contents & size of cache of packages.')):
+        command = commands.add_parser(name, help=text)
+        command.add_argument('packages', nargs='+', metavar='package', help='package name e.g. "pkg" or "pkg.sub"')
+        command.add_argument('-o', '--option', dest='options', action='append', type=main_option, default=[],
+                             metavar='NAME=VALUE', help='override `importer()` option read from `__init__.py` '
+                                                        'e.g. "-o workers=0" (value is python literal or string)')
+        command.add_argument('--cache-dir', help='same as `importer(cache_dir)`')
+        command.add_argument('--json', action='store_true', help='print JSON line per package')
+        command.set_defaults(func=func)
+        if name == 'build':
+            command.add_argument('--force', action='store_true', help='scan whole package even if cache is valid')
+            command.add_argument('--bundle', metavar='PATH', help='also combine index cache (`importer(index=True)`) '
+                                                                  'of all packages into one file')
+        elif name == 'inspect':
+            command.add_argument('--names', action='store_true', help='also list every name & its module')
+
+    static = commands.add_parser('compile', help='print or write `__init__.py` with `importer()` replaced by static '
+                                                 'name to module table.')
+    static.add_argument('package', help='package name e.g. "pkg" or "pkg.sub"')
+    static.add_argument('-o', '--option', dest='options', action='append', type=main_option, default=[],
+                        metavar='NAME=VALUE', help='override `importer()` option read from `__init__.py`')
+    static.add_argument('--output', help='file to write into, prints if not given')
+    static.set_defaults(func=main_compile)
+
+    parsed = parser.parse_args(args)
+    return parsed.func(parsed)
+
+
+def main_profile(parsed):
+    ''' Run `entry`, then print lazy load tree & unused modules into `stderr`
+
+        Type
+            parsed: argparse.Namespace
+            return: Union[int, str, None]
+    '''
+    nodes, unused, code = profile_run(parsed.entry, parsed.args, parsed.module)
+    profile_report(nodes, unused)
+    return code
+
+
+def main_build(parsed):
+    ''' Create cache of each package, using options `importer()` is called with inside its `__init__.py`
+
+        Type
+            parsed: argparse.Namespace
+            return: int
+
+        Example
+            $ python3 -m dynamic_import build pkg
+            built        pkg  120 names  15 files  12.0 KiB  45.1 ms  /path/pkg/__pycache__/__init__.importer-312.pyc
+
+            $ python3 -m dynamic_import build pkg other_pkg --bundle /app/app.idx
+            built        pkg  120 names  15 files  14.2 KiB  46.3 ms  /path/pkg/__pycache__/__init__.index-312.pyc
+            ...
+            bundled      2 packages  28.9 KiB  /app/app.idx
+
+        Note
+            - `--bundle` creates index cache of each package, bundle is only written if all of them succeed.
+    '''
+    def report(r):
+        if r['status'] == 'disabled':
+            return f'{r["status"]:<12} {r["package"]}'
+        return f'{r["status"]:<12} {r["package"]}  {r["names"]} names  {r["files"]} files  ' \
+               f'{r["size"] / 1024:.1f} KiB  {r["seconds"] * 1e3:.1f} ms  {r["cache_path"]}'
+
+    if parsed.bundle:
+        parsed.options.append(('index', True))
+    code = main_each(parsed, lambda name, options: build_package(name, options, parsed.cache_dir, parsed.force),
+                     report)
+    if parsed.bundle and not code:
+        try:
+            r = build_bundle(parsed.bundle, parsed.packages, dict(parsed.options), parsed.cache_dir)
+        except (ImportError, OSError, ValueError) as e:
+            print(f'{"error":<12} {parsed.bundle}  {e}', file=stderr)
+            return 1
+        if parsed.json:
+            from json import dumps
+
+            print(dumps(r))
+        else:
+            print(f'{"bundled":<12} {r["packages"]} packages  {r["size"] / 1024:.1f} KiB  {r["bundle_path"]}')
+    return code
+
+
+def main_verify(parsed):
+    ''' Check cache of each package is up-to-date, exits with `1` if any is not
+
+        Type
+            parsed: argparse.Namespace
+            return: int
+
+        Example
+            $ python3 -m dynamic_import verify pkg other_pkg
+            ok           pkg  /path/pkg/__pycache__/__init__.importer-312.pyc
+            file         other_pkg  /path/other_pkg/__pycache__/__init__.importer-312.pyc  (/path/other_pkg/one.py)
+    '''
+    def report(r):
+        return f'{r["status"]:<12} {r["package"]}  {r["cache_path"]}' + (f'  ({r["path"]})' if r['path'] else '')
+
+    return main_each(parsed, lambda name, options: build_verify(name, options, parsed.cache_dir), report,
+                     lambda r: r['status'] not in ('ok', 'disabled'))
+
+
+def main_inspect(parsed):
+    ''' Show contents & size of cache of each package
+
+        Type
+            parsed: argparse.Namespace
+            return: int
+
+        Example
+            $ python3 -m dynamic_import inspect pkg --names
+            package:      pkg
+            status:       ok
+            cache_path:   /path/pkg/__pycache__/__init__.importer-312.pyc
+            size:         12288 bytes
+            ...
+            one -> pkg.one
+    '''
+    def inspect(name, options):
+        r = build_verify(name, options, parsed.cache_dir)
+        if r['status'] != 'missing':
+            r.update(build_inspect(r['cache_path']))
+            if not parsed.names:
+                r['names'] = len(r['names'])
+        return r
+
+    def report(r):
+        lines = [f'{key + ":":<13} {value}' for key, value in r.items()
+                 if key != 'path' and not isinstance(value, dict)]
+        if isinstance(r.get('names'), dict):
+            lines.append(f'{"names:":<13} {len(r["names"])}')
+            lines.extend(f'{name} -> {module}' for name, module in r['names'].items())
+        return '\n'.join(lines)
+
+    return main_each(parsed, inspect, report, lambda r: r['status'] == 'missing')
+
+
+def main_compile(parsed):
+    ''' Print or write `__init__.py` of package with `importer()` replaced by static lazy loading
+
+        Type
+            parsed: argparse.Namespace
+            return: int
+
+        Example
+            $ python3 -m dynamic_import compile pkg --output build/lib/pkg/__init__.py
+    '''
+    try:
+        source = build_static(parsed.package, dict(parsed.options))
+    except (ImportError, OSError, SyntaxError, ValueError) as e:
+        print(f'{"error":<12} {parsed.package}  {e}', file=stderr)
+        return 1
+    if parsed.output:
+        with open(parsed.output, 'w') as file:
+            file.write(source)
+    else:
+        print(source, end='')
+    return 0
+
+
+def main_each(parsed, func, report, failed=None):
+    ''' Run `func(package, options)` for each package & print its result
+
+        Type
+            parsed: argparse.Namespace
+            func:   Callable[[str, Dict[str, any]], Dict[str, any]]
+            report: Callable[[Dict[str, any]], str]
+            failed: Union[Callable[[Dict[str, any]], bool], None]
+            return: int
+
+        Note
+            - returns `1` if any package could not be found/read or `failed(result)` is true.
+    '''
+    from json import dumps
+
+    code = 0
+    for name in parsed.packages:
+        try:
+            r = func(name, dict(parsed.options))
+        except (ImportError, OSError, SyntaxError, ValueError) as e:
+            print(f'{"error":<12} {name}  {e}', file=stderr)
+            code = 1
+            continue
+        print(dumps(r, default=str) if parsed.json else report(r), flush=True)
+        if failed and failed(r):
+            code = 1
+    return code
+
+
+def main_option(option):
+    ''' Parse "-o NAME=VALUE" command line option
+
+        Type
+            option: str
+            return: Tuple[str, any]
+
+        Example
+            >>> main_option('workers=0')
+            ('workers', 0)
+
+            >>> main_option('engine=token')
+            ('engine', 'token')
+    '''
+    from ast import literal_eval
+    from argparse import ArgumentTypeError
+
+    name, sep, value = option.partition('=')
+    if not sep:
+        raise ArgumentTypeError(f'{option!r} must be NAME=VALUE')
+    try:
+        return name, literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,484 @@
+from os import remove
+from time import perf_counter
+from os.path import basename, dirname, getsize
+from .check import exclude_file_check, exclude_dir_check, workers_check, engine_check, validate_check, cache_dir_check
+from .cache import pkg_cache_path, user_cache_dir, cache_writable, create_cache_dir, dump_cache, cache_lock, cache_id, \
+    load_cache, cache_check, load_files
+from .index import INDEX_MAGIC, Index, index_open, dump_index, load_index, index_check, index_files, dump_bundle, \
+    load_bundle
+from .prep import prep_package
+from .info import unpack_info
+from .special import special
+from .stats import new_stats, stats_event
+from .record import add_record
+from .version import version
+
+
+__all__ = 'OPTIONS', 'STATIC', 'build_cache', 'build_options', 'build_find', 'build_package', 'build_verify', \
+          'build_static', 'build_bundle', 'build_name', 'build_inspect'
+# `importer()` options that are read from `__init__.py` & their defaults.
+OPTIONS = {'cache': True, 'recursive': True, 'exclude_file': None, 'exclude_dir': None, 'workers': 1,
+           'engine': 'ast', 'validate': 'mtime_ns', 'defer': False, 'hot': None, 'cache_dir': None, 'index': False}
+# code `importer()` call is replaced with by `build_static()`, works same as `Module` using PEP 562.
+STATIC = '''
+# note: generated by "python3 -m dynamic_import compile {package}" (Dynamic Import {version}),
+#       generate it again when names or modules of package change.
+from sys import modules as _modules
+
+# name: source module
+_NAMES = {names}
+# source module: names it defines
+_MODULES = {modules}
+
+
+def __getattr__(name):
+    if (module_name := _NAMES.get(name)) is None:
+        raise AttributeError(f'module {{__name__!r}} has no attribute {{name!r}}')
+    __import__(module_name)  # note: cheaper than importing `importlib`
+    module = _modules[module_name]
+    names = globals()
+    # note: import system sets each sub-module it loads as package global, exported name of same name
+    #       (e.g. `pkg/one.py` that defines `one()`) is removed so its loaded by `__getattr__` again.
+    for var, value in tuple(names.items()):
+        if var in _NAMES and value is _modules.get(f'{{__name__}}.{{var}}'):
+            del names[var]
+    for var in _MODULES[module_name]:
+        names[var] = getattr(module, var)
+    return names[name]
+
+
+def __dir__():
+    return __all__
+
+
+'''
+# note: set after rest of `__init__.py`, so its own `__all__` (if any) does not replace it.
+STATIC_ALL = '''
+
+
+# note: generated, every name of package.
+__all__ = {all}
+'''
+
+
+def build_cache(pkg_name, pkg_path, init_file, recursive, exclude_file, exclude_dir, workers, engine, validate,
+                defer, cache_dir, stats, index=False, bundle=None):
+    ''' Load cache of package, create it if its missing or outdated
+
+        Type
+            pkg_name:     str
+            pkg_path:     str
+            init_file:    str
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            workers:      int
+            engine:       str
+            validate:     str
+            defer:        bool
+            cache_dir:    Union[str, None]
+            stats:        Dict[str, any]
+            index:        bool
+            bundle:       Union[str, None]
+            return:       Tuple[Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]],
+                                Union[str, None]]
+
+        Example
+            >>> build_cache('pkg', '/path/pkg/', '__init__.py', True, [], [], 1, 'ast', 'mtime_ns', False, None,
+            ...             new_stats('pkg'))
+            ({'one': ('pkg.one', '/path/pkg/one.py', ('one',), (1234500000000, 15)), ...}, None)
+
+        Note
+            - used by `importer()` & `python -m dynamic_import build`, options are already checked.
+            - returned `cache_dir` is user cache directory if package directory turned out to be read-only.
+            - with `index` cache is memory-mapped `Index` (see `index.py`) instead of `dict`
+            - package within `bundle` file is loaded from it if its up-to-date, no matter `index` is used or not.
+    '''
+    start = perf_counter()
+    if bundle and \
+            (info := load_bundle(bundle, pkg_path, recursive, exclude_file, exclude_dir, version, validate, defer,
+                                 stats)):
+        stats_event(stats, 'cache_hit', perf_counter() - start)
+        return info, cache_dir
+
+    func_name, load, dump, files_of = ('index', load_index, dump_index, index_files) if index else \
+        ('importer', load_cache, dump_cache, load_files)  # note: same as `build_name()`
+    cache_path = pkg_cache_path(pkg_path, init_file, func_name, cache_dir)
+    while True:
+        info = None
+        if (cached_id := cache_id(cache_path)) is not None:
+            info = load(cache_path, recursive, exclude_file, exclude_dir, version, validate, defer, stats)
+        if info or cache_dir or cache_writable(cache_path):
+            break
+        # note: package directory is read-only (or an archive), cache is kept in user cache directory instead.
+        cache_dir = user_cache_dir()
+        cache_path = pkg_cache_path(pkg_path, init_file, func_name, cache_dir)
+    if cached_id is None:
+        stats_event(stats, 'cache_miss', reason='missing', path=cache_path)
+    if info:
+        stats_event(stats, 'cache_hit', perf_counter() - start)
+        return info, cache_dir
+
+    # note: created before scan, otherwise creating `__pycache__` changes package directory mtime
+    #       right after its recorded & cache would not be valid on next start-up.
+    try:
+        create_cache_dir(cache_path)
+    except OSError:
+        pass  # note: cache can not be created, its lock & write are skipped too.
+    # only one process creates cache, others wait for it & use its result.
+    with cache_lock(cache_path) as waited:
+        if waited:
+            stats_event(stats, 'cache_wait', waited)
+        if cache_id(cache_path) not in (None, cached_id) and \
+                (info := load(cache_path, recursive, exclude_file, exclude_dir, version, validate, defer)):
+            stats_event(stats, 'cache_hit', perf_counter() - start)  # created by another process.
+            return info, cache_dir
+
+        files = files_of(cache_path, version, validate)  # per file result of previous scan,
+        cached = files.copy()                            # only changed files are extracted again.
+        scan = perf_counter()
+        info, dir_mtime = prep_package(pkg_name, pkg_path, recursive, exclude_file, exclude_dir, workers, files,
+                                       engine, validate)
+        reused = sum(1 for file_path, entry in files.items() if cached.get(file_path) is entry)
+        stats_event(stats, 'scan', perf_counter() - scan, names=len(info), reused=reused)
+        try:
+            dump(cache_path, info, recursive, exclude_file, exclude_dir, dir_mtime, version, files, validate)
+        except OSError:
+            pass  # note: package is still imported, just scanned again on next start-up.
+        else:
+            add_record(pkg_name, cache_path)
+            add_record(pkg_name, f'{cache_path}.lock')
+    return info, cache_dir
+
+
+def build_options(init_path):
+    ''' Read options `importer()` is called with inside `__init__.py`, without running it
+
+        Type
+            init_path: str
+            return:    Dict[str, any]
+
+        Example
+            # /path/pkg/__init__.py
+            # from dynamic_import import importer
+            # importer(exclude_dir='tests', workers=4)
+            >>> build_options('/path/pkg/__init__.py')
+            {'cache': True, 'recursive': True, 'exclude_file': None, 'exclude_dir': 'tests', 'workers': 4, ...}
+
+        Note
+            - raises `ValueError` if `importer()` is not called or an option is not a literal value
+              (e.g. variable), such option can be given using `build_package(options)`
+    '''
+    from ast import parse, walk, Call, Name, Attribute, literal_eval
+
+    with open(init_path, 'rb') as file:
+        tree = parse(file.read(), init_path)
+    for node in walk(tree):
+        if isinstance(node, Call) and ((isinstance(node.func, Name) and node.func.id == 'importer') or
+                                       (isinstance(node.func, Attribute) and node.func.attr == 'importer')):
+            r = OPTIONS.copy()
+            for keyword in node.keywords:
+                if keyword.arg not in OPTIONS:
+                    error = f'`importer({keyword.arg or "**"})` in {init_path!r} can not be read.'
+                    raise ValueError(error)
+                try:
+                    r[keyword.arg] = literal_eval(keyword.value)
+                except ValueError:
+                    error = f'`importer({keyword.arg})` in {init_path!r} is not a literal value, give it as option.'
+                    raise ValueError(error) from None
+            return r
+    raise ValueError(f'{init_path!r} does not call `importer()`')
+
+
+def build_find(pkg_name):
+    ''' Find `__init__.py` of package, without importing it
+
+        Type
+            pkg_name: str
+            return:   str
+
+        Example
+            >>> build_find('pkg')
+            '/path/pkg/__init__.py'
+
+        Note
+            - parent package of sub-package (e.g. "pkg" of "pkg.sub") is imported to find it.
+    '''
+    from importlib.util import find_spec
+
+    spec = find_spec(pkg_name)
+    if spec is None or not spec.origin or basename(spec.origin) != '__init__.py':
+        raise ValueError(f'{pkg_name!r} is not a package with `__init__.py`')
+    return spec.origin
+
+
+def build_package(pkg_name, options=None, cache_dir=None, force=False):
+    ''' Create cache of package ahead of time, e.g. while building image or wheel
+
+        Type
+            pkg_name:  str
+            options:   Union[Dict[str, any], None]
+            cache_dir: Union[str, None]
+            force:     bool
+            return:    Dict[str, any]
+
+        Example
+            >>> build_package('pkg')
+            {'package': 'pkg', 'status': 'built', 'cache_path': '/path/pkg/__pycache__/__init__.importer-312.pyc',
+             'names': 120, 'files': 15, 'size': 12288, 'seconds': 0.045}
+
+            # override options `importer()` is called with, e.g. use all cores to scan
+            >>> build_package('pkg', {'workers': 0})
+
+        Note
+            - "status" is 'built', 'up-to-date' (cache was valid) or 'disabled' (`importer(cache=False)`)
+            - `force` removes cache first, so whole package is scanned again.
+            - options that affect if cache is valid (e.g. `exclude_dir`, `validate`) must match `importer()` call,
+              otherwise cache is rejected at start-up.
+    '''
+    init_path, pkg_path, options, cache_path = build_prepare(pkg_name, options, cache_dir)
+    r = {'package': pkg_name, 'status': 'disabled', 'cache_path': cache_path}
+    if not options['cache']:
+        return r
+
+    if force:
+        try:
+            remove(cache_path)
+        except OSError:
+            pass  # note: missing or read-only.
+    start = perf_counter()
+    stats = new_stats(pkg_name)
+    info, cache_dir = build_cache(pkg_name, pkg_path, basename(init_path), options['recursive'],
+                                  options['exclude_file'], options['exclude_dir'], options['workers'],
+                                  options['engine'], options['validate'], False, options['cache_dir'], stats,
+                                  options['index'])
+    r['cache_path'] = cache_path = pkg_cache_path(pkg_path, basename(init_path), build_name(options), cache_dir)
+    r['status'] = 'built' if 'scan' in stats['counters'] else 'up-to-date'
+    r['names'] = len(info)
+    r['files'] = len({i[1] for i in info.values()})
+    r['size'] = getsize(cache_path)
+    r['seconds'] = perf_counter() - start
+    return r
+
+
+def build_verify(pkg_name, options=None, cache_dir=None):
+    ''' Check cache of package is up-to-date, without creating it
+
+        Type
+            pkg_name:  str
+            options:   Union[Dict[str, any], None]
+            cache_dir: Union[str, None]
+            return:    Dict[str, any]
+
+        Example
+            >>> build_verify('pkg')
+            {'package': 'pkg', 'status': 'ok', 'cache_path': '/path/pkg/__pycache__/__init__.importer-312.pyc',
+             'path': None}
+
+            >>> build_verify('pkg')
+            {'package': 'pkg', 'status': 'file', 'cache_path': '...', 'path': '/path/pkg/one.py'}
+
+        Note
+            - "status" is 'ok', 'disabled' or reason cache was rejected (same as "cache_miss" event reason)
+            - every directory & file is checked, even if `importer(defer=True)` is used.
+    '''
+    init_path, pkg_path, options, cache_path = build_prepare(pkg_name, options, cache_dir)
+    r = {'package': pkg_name, 'status': 'disabled', 'cache_path': cache_path, 'path': None}
+    if not options['cache']:
+        return r
+
+    if cache_id(cache_path) is None and not options['cache_dir'] and not cache_writable(cache_path):
+        r['cache_path'] = cache_path = pkg_cache_path(pkg_path, basename(init_path), build_name(options),
+                                                      user_cache_dir())
+    if cache_id(cache_path) is None:
+        r['status'] = 'missing'
+    else:
+        check = index_check if options['index'] else cache_check
+        _, reason = check(cache_path, options['recursive'], options['exclude_file'], options['exclude_dir'], version,
+                          options['validate'])
+        r['status'], r['path'] = reason or ('ok', None)
+    return r
+
+
+def build_static(pkg_name, options=None):
+    ''' Source of `__init__.py` with `importer()` call replaced by static name to module table
+
+        Type
+            pkg_name: str
+            options:  Union[Dict[str, any], None]
+            return:   str
+
+        Example
+            >>> build_static('pkg')
+            '# note: generated by "python3 -m dynamic_import compile pkg" ...\\nfrom sys import modules as _modules ...'
+
+            # e.g. while building wheel
+            $ python3 -m dynamic_import compile pkg --output build/lib/pkg/__init__.py
+
+        Note
+            - package is scanned same as `importer()` would, there is no cache or `dynamic_import` needed at
+              run-time. Names are looked up from table & their module imported on first use (see `STATIC`)
+            - `from dynamic_import import importer` or `import dynamic_import` line is removed (including `try`
+              block that only imports it, with its fallback), everything else in `__init__.py` is kept.
+            - names defined within `__init__.py` itself are only listed in `__all__`, which is set at the end
+              so `__all__` of `__init__.py` does not replace it.
+    '''
+    from ast import parse, Expr, Call, Name, Attribute, Import, ImportFrom, Try
+
+    def imports_importer(node):
+        if isinstance(node, ImportFrom):
+            return node.module == 'dynamic_import' and all(i.name == 'importer' for i in node.names)
+        elif isinstance(node, Import):
+            return all(i.name == 'dynamic_import' and i.asname is None for i in node.names)
+        elif isinstance(node, Try):
+            return all(map(imports_importer, node.body))  # e.g. `except ImportError:` fallback is removed too.
+        return False
+
+    init_path, pkg_path, options, _ = build_prepare(pkg_name, options, None)
+    info, _ = prep_package(pkg_name, pkg_path, options['recursive'], options['exclude_file'], options['exclude_dir'],
+                           options['workers'], None, options['engine'], options['validate'])
+    names = {}
+    variables = {}
+    for name, (module_name, _, found, _) in info.items():
+        if module_name != pkg_name:
+            names[name] = module_name
+            variables.setdefault(module_name, tuple(special(found)))
+    code = STATIC.format(package=pkg_name, version=version, names=build_format(names), modules=build_format(variables))
+
+    with open(init_path, 'rb') as file:
+        source = file.read().decode()
+    lines = source.splitlines(True)
+    replace = {}  # first line: (last line, new code)
+    for node in parse(source, init_path).body:
+        if imports_importer(node):
+            replace[node.lineno] = node.end_lineno, ''
+        elif isinstance(node, Expr) and isinstance(node.value, Call) and \
+                ((isinstance(node.value.func, Name) and node.value.func.id == 'importer') or
+                 (isinstance(node.value.func, Attribute) and node.value.func.attr == 'importer')):
+            replace[node.lineno] = node.end_lineno, code
+    if code not in (i[1] for i in replace.values()):
+        raise ValueError(f'{init_path!r} does not call `importer()` as a statement')
+    r = []
+    line = 1
+    while line <= len(lines):
+        if line in replace:
+            line, new = replace[line]
+            r.append(new)
+        else:
+            r.append(lines[line - 1])
+        line += 1
+    return f"{''.join(r).strip()}{STATIC_ALL.format(all=build_format(tuple(info)))}"
+
+
+def build_bundle(bundle_path, pkg_names, options=None, cache_dir=None):
+    ''' Combine index cache of each package into one bundle file, see `DYNAMIC_IMPORT_BUNDLE`
+
+        Type
+            bundle_path: str
+            pkg_names:   List[str]
+            options:     Union[Dict[str, any], None]
+            cache_dir:   Union[str, None]
+            return:      Dict[str, any]
+
+        Example
+            >>> build_package('pkg', {'index': True})
+            >>> build_bundle('/app/app.idx', ['pkg', 'other_pkg'])
+            {'bundle_path': '/app/app.idx', 'packages': 2, 'size': 24576}
+
+        Note
+            - index cache of each package must already be up-to-date, otherwise raises `ValueError`
+    '''
+    cache_paths = {}
+    for pkg_name in pkg_names:
+        r = build_verify(pkg_name, {**(options or {}), 'index': True}, cache_dir)
+        if r['status'] != 'ok':
+            raise ValueError(f'index cache of {pkg_name!r} can not be bundled, its {r["status"]!r}')
+        cache_paths[f'{dirname(build_find(pkg_name))}/'] = r['cache_path']
+    dump_bundle(bundle_path, cache_paths)
+    return {'bundle_path': bundle_path, 'packages': len(cache_paths), 'size': getsize(bundle_path)}
+
+
+def build_format(value):
+    ''' `repr()` of `dict` or `tuple` with one item per line, so generated module is readable & diff friendly '''
+    if not value:
+        return repr(value)
+    if isinstance(value, dict):
+        items = ''.join(f'    {key!r}: {item!r},\n' for key, item in value.items())
+        return f'{{\n{items}}}'
+    items = ''.join(f'    {item!r},\n' for item in value)
+    return f'(\n{items})'
+
+
+def build_prepare(pkg_name, options, cache_dir):
+    ''' Find package, read & check its `importer()` options
+
+        Type
+            pkg_name:  str
+            options:   Union[Dict[str, any], None]
+            cache_dir: Union[str, None]
+            return:    Tuple[str, str, Dict[str, any], str]
+    '''
+    init_path = build_find(pkg_name)
+    pkg_path = f'{dirname(init_path)}/'
+    r = build_options(init_path)
+    for name, value in (options or {}).items():
+        if name not in OPTIONS:
+            raise ValueError(f'`importer({name})` is not an option')
+        r[name] = value
+    if cache_dir is not None:
+        r['cache_dir'] = cache_dir
+    r['exclude_file'] = exclude_file_check(r['exclude_file'], pkg_name, pkg_path)
+    r['exclude_dir'] = exclude_dir_check(r['exclude_dir'], pkg_path, r['recursive'])
+    r['workers'] = workers_check(r['workers'])
+    r['engine'] = engine_check(r['engine'])
+    r['validate'] = validate_check(r['validate'])
+    r['cache_dir'] = cache_dir_check(r['cache_dir'])
+    return init_path, pkg_path, r, pkg_cache_path(pkg_path, basename(init_path), build_name(r), r['cache_dir'])
+
+
+def build_name(options):
+    ''' Name cache file of package is created with, see `pkg_cache_path(func_name)`
+
+        Type
+            options: Dict[str, any]
+            return:  str
+
+        Example
+            >>> build_name({'index': True, ...})
+            'index'
+    '''
+    return 'index' if options['index'] else 'importer'
+
+
+def build_inspect(cache_path):
+    ''' Contents & size of cache file
+
+        Type
+            cache_path: str
+            return:     Dict[str, any]
+
+        Example
+            >>> build_inspect('/path/pkg/__pycache__/__init__.importer-312.pyc')
+            {'cache_path': '/path/pkg/__pycache__/__init__.importer-312.pyc', 'size': 12288, 'version': '1.0.0',
+             'validate': 'mtime_ns', 'recursive': True, 'exclude_file': [], 'exclude_dir': [], 'dirs': 3,
+             'files': 15, 'modules': 15, 'format': 'marshal', 'names': {'one': 'pkg.one', ...}}
+
+        Note
+            - "format" is 'index' for `importer(index=True)` cache, otherwise 'marshal'
+    '''
+    from marshal import loads
+
+    with open(cache_path, 'rb') as file:
+        if file.read(len(INDEX_MAGIC)) == INDEX_MAGIC:
+            data = Index(index_open(cache_path))
+            cached_version, recursive, exclude_file, exclude_dir, dir_mtime, validate = data.options()
+            files = data.extraction()
+        else:
+            file.seek(0)
+            cached_version, recursive, exclude_file, exclude_dir, dir_mtime, data, files, validate = loads(file.read())
+            data, files = unpack_info(data), loads(files)
+    return {'cache_path': cache_path, 'size': getsize(cache_path), 'version': cached_version, 'validate': validate,
+            'recursive': recursive, 'exclude_file': exclude_file, 'exclude_dir': exclude_dir, 'dirs': len(dir_mtime),
+            'files': len(files), 'modules': len({i[0] for i in data.values()}),
+            'format': 'index' if isinstance(data, Index) else 'marshal',
+            'names': {name: i[0] for name, i in data.items()}}
@@ -1,36 +1,132 @@
-from os import mkdir, stat
-from sys import pycache_prefix, implementation
-from os.path import exists, join, dirname, splitext
+from os import makedirs, stat, listdir, getpid, replace, remove, access, environ, open as os_open, close, \
+    O_RDWR, O_CREAT, W_OK
+from sys import pycache_prefix, implementation, platform
+from time import monotonic, sleep
+from hashlib import blake2b
+from threading import get_ident
+from contextlib import contextmanager
+from os.path import exists, join, dirname, basename, splitext, expanduser
 from importlib.machinery import BYTECODE_SUFFIXES
-from marshal import dump, load
+from marshal import dumps, loads
+from .info import Info, pack_info, unpack_info
+from .stats import stats_event
 
 
-__all__ = 'CACHE_DIR_PATH', 'MARSHAL_VERSION', 'VERSION_TAG', 'CACHE_EXT', \
-          'pkg_cache_path', 'create_cache_dir', 'dump_cache', 'load_cache'
+__all__ = 'CACHE_DIR_PATH', 'CACHE_ENV', 'MARSHAL_VERSION', 'VERSION_TAG', 'CACHE_EXT', 'VALIDATE', 'LOCK_TIMEOUT', \
+          'pkg_cache_path', 'cache_key', 'user_cache_dir', 'cache_writable', 'create_cache_dir', 'dump_cache', \
+          'dump_file', 'write_file', 'cache_lock', 'cache_id', 'load_cache', 'cache_check', 'cache_outdated', \
+          'cache_changed', 'load_files', 'stamp_kind', 'file_stamp', 'dir_stamp'
 CACHE_DIR_PATH = pycache_prefix or '__pycache__'
+# environment variable of directory to keep cache of all packages in, e.g: `DYNAMIC_IMPORT_CACHE=/var/cache/app`
+CACHE_ENV = 'DYNAMIC_IMPORT_CACHE'
 MARSHAL_VERSION = 4
 VERSION_TAG = implementation.cache_tag.split('-')[1]  # e.g: 'cpython-312' to '312'
 CACHE_EXT = BYTECODE_SUFFIXES[0]  # e.g: ['.pyc'] to '.pyc'
+# how cache is checked to be up-to-date, same idea as PEP 552 `.pyc` invalidation modes.
+#   'mtime_ns':  nanosecond modified time (& size of file)
+#   'hash':      content hash of file (& names within directory), for when mtime can not be trusted.
+#   'unchecked': cache is trusted as is, for immutable install.
+VALIDATE = ('mtime_ns', 'hash', 'unchecked')
+# seconds to wait for another process to finish creating cache, before creating it anyway.
+LOCK_TIMEOUT = 60
 
+try:
+    from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+except ImportError:
+    flock = None  # note: no cross-process locking, each process creates cache on its own.
 
-def pkg_cache_path(pkg_path, file_name, func_name):
+
+def pkg_cache_path(pkg_path, file_name, func_name, cache_dir=None):
     ''' Temp cached file path pattern
 
         Type
             pkg_path:  str
             file_name: str
             func_name: str
+            cache_dir: Union[str, None]
             return:    str
 
         Example
             >>> pkg_cache_path('/path/pkg/', '__init__.py', 'importer')
             '/path/pkg/__pycache__/__init__.importer-312.pyc'
+
+            >>> pkg_cache_path('/path/pkg/', '__init__.py', 'importer', '/home/user/.cache/dynamic_import')
+            '/home/user/.cache/dynamic_import/pkg-5f0b6c3a1e2d4f78/__init__.importer-312.pyc'
+
+        Note
+            - with `cache_dir` each package gets its own sub-directory, see `cache_key()`
     '''
     name = splitext(file_name)[0]  # '__init__.py' to '__init__'
     new_file_name = f'{name}.{func_name}-{VERSION_TAG}{CACHE_EXT}'  # '__init__.importer-312.pyc'
+    if cache_dir:
+        return join(cache_dir, cache_key(pkg_path), new_file_name)
     return join(pkg_path, CACHE_DIR_PATH, new_file_name)
 
 
+def cache_key(pkg_path):
+    ''' Name of package directory within shared cache directory
+
+        Type
+            pkg_path: str
+            return:   str
+
+        Example
+            >>> cache_key('/path/pkg/')
+            'pkg-5f0b6c3a1e2d4f78'
+
+        Note
+            - hash of package path & python implementation tag (e.g. "cpython-312"), so same package
+              installed in many places or used by different pythons does not share cache.
+    '''
+    key = blake2b(f'{pkg_path}\0{implementation.cache_tag}'.encode(errors='surrogateescape'), digest_size=8)
+    return f'{basename(pkg_path.rstrip("/"))}-{key.hexdigest()}'
+
+
+def user_cache_dir():
+    ''' Cache directory of current user, used when package directory is read-only
+
+        Type
+            return: str
+
+        Example
+            >>> user_cache_dir()
+            '/home/user/.cache/dynamic_import'  # Linux, `$XDG_CACHE_HOME/dynamic_import` if set
+            '/Users/user/Library/Caches/dynamic_import'  # macOS
+            'C:\\Users\\user\\AppData\\Local\\dynamic_import'  # Windows
+    '''
+    if platform == 'win32':
+        root = environ.get('LOCALAPPDATA') or expanduser('~/AppData/Local')
+    elif platform == 'darwin':
+        root = expanduser('~/Library/Caches')
+    else:
+        root = environ.get('XDG_CACHE_HOME') or expanduser('~/.cache')
+    return join(root, 'dynamic_import')
+
+
+def cache_writable(cache_path):
+    ''' Check if cache can be created at `cache_path`
+
+        Type
+            cache_path: str
+            return:     bool
+
+        Example
+            >>> cache_writable('/path/pkg/__pycache__/__init__.importer-312.pyc')
+            True
+
+            # read-only image layer or root owned `site-packages`
+            >>> cache_writable('/usr/lib/python3/site-packages/pkg/__pycache__/__init__.importer-312.pyc')
+            False
+
+        Note
+            - if `__pycache__` does not exist yet, package directory is checked instead.
+    '''
+    path = dirname(cache_path)
+    if not exists(path):
+        path = dirname(path)
+    return access(path, W_OK)
+
+
 def create_cache_dir(cache_path):
     ''' Create `__pycache__` directory
 
@@ -43,11 +139,15 @@ def create_cache_dir(cache_path):
     '''
     pkg_dir = dirname(cache_path)
     if not exists(pkg_dir):
-        mkdir(pkg_dir)  # create `__pycache__` if it doesn't exist!
+        try:
+            makedirs(pkg_dir)  # create `__pycache__` (or its parents in shared cache directory) if it doesn't exist!
+        except FileExistsError:
+            return None  # created by another process at the same time.
         return True
 
 
-def dump_cache(cache_path, data, recursive, exclude_file, exclude_dir, dir_mtime, version):
+def dump_cache(cache_path, data, recursive, exclude_file, exclude_dir, dir_mtime, version, files=None,
+               validate='mtime_ns'):
     ''' Create cached file
 
         Type
@@ -56,18 +156,144 @@ def dump_cache(cache_path, data, recursive, exclude_file, exclude_dir, dir_mtime
             recursive:    bool
             exclude_file: List[str]
             exclude_dir:  List[str]
-            dir_mtime:    Dict[str, float]
+            dir_mtime:    Dict[str, Union[int, bytes]]
             version:      str
+            files:        Dict[str, Tuple[str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            validate:     str
             return:       None
 
         Example
             >>> dump_cache('/path/pkg/__pycache__/__init__.importer-312', ...)
+
+        Note
+            - `files` holds per file extraction result, used by `load_files()` to only
+              re-extract changed files when cache is no longer valid.
+            - `data` is kept as `pack_info()` & `files` as marshal bytes, which is not unpacked when
+              cache is valid.
+    '''
+    if not isinstance(data, Info):
+        data = Info(data)
+    dump_file(cache_path, (version, recursive, exclude_file, exclude_dir, dir_mtime, pack_info(data),
+                           dumps(files or {}, MARSHAL_VERSION), validate))
+
+
+def dump_file(path, data):
+    ''' Write marshal data atomically, reader sees old or new file never a partially written one
+
+        Type
+            path:   str
+            data:   any
+            return: None
+
+        Example
+            >>> dump_file('/path/pkg/__pycache__/__init__.importer-312.pyc', (...))
+
+        Note
+            - written into temporary file next to `path` then renamed over it, same as `.pyc` files are.
+    '''
+    write_file(path, dumps(data, MARSHAL_VERSION))
+
+
+def write_file(path, content):
+    ''' Write bytes atomically, see `dump_file()`
+
+        Type
+            path:    str
+            content: bytes
+            return:  None
+
+        Example
+            >>> write_file('/path/pkg/__pycache__/__init__.index-312.pyc', b'...')
+
+        Note
+            - file that is memory-mapped (see `index.py`) keeps its old content, as its replaced not rewritten.
+    '''
+    tmp_path = f'{path}.{getpid()}.{get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(content)
+        replace(tmp_path, path)
+    except BaseException:
+        try:
+            remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def cache_lock(cache_path, timeout=LOCK_TIMEOUT):
+    ''' Cross-process advisory lock, so only one process creates cache while others wait for it
+
+        Type
+            cache_path: str
+            timeout:    Union[int, float]
+            return:     Iterator[float]
+
+        Example
+            >>> with cache_lock('/path/pkg/__pycache__/__init__.importer-312.pyc') as waited:
+            ...     # check cache again if `waited`, another process might have just created it.
+            ...     ...
+
+        Note
+            - yields number of seconds it waited for lock, `0.0` if lock was free.
+            - lock is held on "<cache_path>.lock" file using `flock()`, which is released by OS even if
+              process holding it crashes.
+            - lock is not used if it can't be created (e.g. read-only directory), platform has no `fcntl`
+              or `timeout` has passed (process holding it might be stuck).
+    '''
+    try:
+        fd = os_open(f'{cache_path}.lock', O_RDWR | O_CREAT, 0o644) if flock else None
+    except OSError:
+        fd = None
+    if fd is None:
+        yield 0.0
+        return
+
+    start = None
+    locked = False
+    try:
+        while True:
+            try:
+                flock(fd, LOCK_EX | LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                if start is None:
+                    start = monotonic()
+                elif monotonic() - start > timeout:
+                    break
+                sleep(0.005)
+        yield 0.0 if start is None else monotonic() - start
+    finally:
+        if locked:
+            flock(fd, LOCK_UN)
+        close(fd)
+
+
+def cache_id(cache_path):
+    ''' Identity of cache file, changes when its replaced
+
+        Type
+            cache_path: str
+            return:     Union[Tuple[int, int], None]
+
+        Example
+            >>> cache_id('/path/pkg/__pycache__/__init__.importer-312.pyc')
+            (1234567, 1234500000000)
+
+            >>> cache_id('/path/pkg/__pycache__/does-not-exist.pyc')
+            None
     '''
-    with open(cache_path, 'w+b') as file:
-        dump((version, recursive, exclude_file, exclude_dir, dir_mtime, data), file, MARSHAL_VERSION)
+    try:
+        st = stat(cache_path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
 
 
-def load_cache(cache_path, recursive, exclude_file, exclude_dir, version):
+def load_cache(cache_path, recursive, exclude_file, exclude_dir, version, validate='mtime_ns', defer=False,
+               stats=None):
     ''' Load cached file
 
         Type
@@ -76,32 +302,233 @@ def load_cache(cache_path, recursive, exclude_file, exclude_dir, version):
             exclude_file: List[str]
             exclude_dir:  List[str]
             version:      str
+            validate:     str
+            defer:        bool
+            stats:        Union[Dict[str, any], None]
             return:       any
 
         Example
             >>> load_cache('/path/pkg/__pycache__/__init__.importer-312.pyc')
+
+            # trust cache without checking any directory or file.
+            >>> load_cache('/path/pkg/__pycache__/__init__.importer-312.pyc', ..., 'unchecked')
+
+            # only check directories, files are checked by `Module` when they are first used.
+            >>> load_cache('/path/pkg/__pycache__/__init__.importer-312.pyc', ..., 'mtime_ns', True)
+
+        Note
+            - reason cache was rejected is reported as "cache_miss" event into `stats`
+    '''
+    data, reason = cache_check(cache_path, recursive, exclude_file, exclude_dir, version, validate, defer)
+    if reason is not None and stats is not None:
+        stats_event(stats, 'cache_miss', reason=reason[0], path=reason[1])
+    return data
+
+
+def cache_check(cache_path, recursive, exclude_file, exclude_dir, version, validate='mtime_ns', defer=False):
+    ''' Load cached file & reason it was rejected
+
+        Type
+            cache_path:   str
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            version:      str
+            validate:     str
+            defer:        bool
+            return:       Tuple[Union[Info, None], Union[Tuple[str, Union[str, None]], None]]
+
+        Example
+            >>> cache_check('/path/pkg/__pycache__/__init__.importer-312.pyc', ...)
+            (Info({'one': ('pkg.one', '/path/pkg/one.py', ('one',), (1234500000000, 15)), ...}), None)
+
+            >>> cache_check('/path/pkg/__pycache__/__init__.importer-312.pyc', ...)
+            (None, ('file', '/path/pkg/one.py'))
     '''
     try:
         with open(cache_path, 'rb') as file:
-            cached_version, cached_recursive, cached_exclude_file, cached_exclude_dir, dir_mtime, data = load(file)
-
-            if version != cached_version:
-                return None  # check if Dynamic Import version has changed!
-            elif recursive != cached_recursive:
-                return None  # check if `recursive` has changed!'
-            elif exclude_file != cached_exclude_file:
-                return None  # check if `exclude_file` has changed!
-            elif exclude_dir != cached_exclude_dir:
-                return None  # check if `exclude_dir` has changed!
-            else:
-                # check if dir has changed.
-                for dir_path, mtime in dir_mtime.items():
-                    if mtime != stat(dir_path).st_mtime:
-                        return None
-                # check if each of the the files have changed.
-                for _, file_path, _, mtime in data.values():
-                    if mtime != stat(file_path).st_mtime:
-                        return None
-            return data
+            # note: reading whole file first is many times faster than `marshal.load()` reading from file.
+            cached_version, cached_recursive, cached_exclude_file, cached_exclude_dir, dir_mtime, packed, _, \
+                cached_validate = loads(file.read())
+
+            reason = cache_outdated((cached_version, cached_recursive, cached_exclude_file, cached_exclude_dir,
+                                     cached_validate), (version, recursive, exclude_file, exclude_dir, validate))
+            if reason is None and validate != 'unchecked':
+                # note: packed item is `(module, path, variables, stamp, names)`, same as entry of `info`
+                reason = cache_changed(dir_mtime, {} if defer else dict(enumerate(packed)), validate, defer)
+            if reason is None:
+                return unpack_info(packed), None
     except Exception:
-        return None
+        reason = 'error', cache_path
+    return None, reason
+
+
+def cache_outdated(cached, options):
+    ''' Find first option that has changed since cache was created
+
+        Type
+            cached:  Tuple[str, bool, List[str], List[str], str]
+            options: Tuple[str, bool, List[str], List[str], str]
+            return:  Union[Tuple[str, None], None]
+
+        Example
+            >>> cache_outdated(('1.0.0', True, [], [], 'mtime_ns'), ('1.0.0', True, [], [], 'hash'))
+            ('validate', None)
+
+            >>> cache_outdated(('1.0.0', True, [], [], 'mtime_ns'), ('1.0.0', True, [], [], 'unchecked'))
+            None
+
+        Note
+            - both are `(version, recursive, exclude_file, exclude_dir, validate)`
+            - `validate` is compared by kind of stamp, see `stamp_kind()`
+    '''
+    cached = (*cached[:4], stamp_kind(cached[4]))
+    options = (*options[:4], stamp_kind(options[4]))
+    # check if Dynamic Import version, `recursive`, `exclude_file`, `exclude_dir` or `validate` has changed!
+    for reason, cached_value, value in zip(('version', 'recursive', 'exclude_file', 'exclude_dir', 'validate'),
+                                           cached, options):
+        if value != cached_value:
+            return reason, None
+    return None
+
+
+def cache_changed(dir_mtime, data, validate, defer=False):
+    ''' Find first directory or file that has changed since cache was created
+
+        Type
+            dir_mtime: Dict[str, Union[int, bytes]]
+            data:      Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            validate:  str
+            defer:     bool
+            return:    Union[Tuple[str, str], None]
+
+        Example
+            >>> cache_changed(dir_mtime, data, 'mtime_ns')
+            None
+
+            >>> cache_changed(dir_mtime, data, 'mtime_ns')
+            ('file', '/path/pkg/one.py')
+
+            >>> cache_changed(dir_mtime, data, 'mtime_ns')
+            ('removed', '/path/pkg/sub/')
+    '''
+    try:
+        # check if dir has changed.
+        for path, mtime in dir_mtime.items():
+            if mtime != dir_stamp(path, validate):
+                return 'dir', path
+        # check if each of the the files have changed.
+        if not defer:
+            # note: file with many names is only checked once, files within archive have no stamp.
+            for path, mtime in {i[1]: i[3] for i in data.values()}.items():
+                if mtime is not None and mtime != file_stamp(path, validate):
+                    return 'file', path
+    except OSError:
+        return 'removed', path
+    return None
+
+
+def load_files(cache_path, version, validate='mtime_ns'):
+    ''' Load per file extraction result from cached file, even if cache is no longer valid
+
+        Type
+            cache_path: str
+            version:    str
+            validate:   str
+            return:     Dict[str, Tuple[str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+
+        Example
+            >>> load_files('/path/pkg/__pycache__/__init__.importer-312.pyc', version)
+            {'/path/pkg/one.py': ('pkg.one', ('one',), (1234500000000, 15)), ...}
+
+        Note
+            - returns empty `dict` if cache can not be read, Dynamic Import version or kind of stamp (see
+              `stamp_kind()`) has changed.
+            - entries are not validated here, `prep_package()` only reuses unchanged files.
+    '''
+    try:
+        with open(cache_path, 'rb') as file:
+            cached = loads(file.read())
+        if cached[0] == version and stamp_kind(cached[7]) == stamp_kind(validate):
+            return loads(cached[6])
+    except Exception:
+        pass
+    return {}
+
+
+def stamp_kind(validate):
+    ''' Kind of stamp files & directories are stamped with
+
+        Type
+            validate: str
+            return:   str
+
+        Example
+            >>> stamp_kind('unchecked')
+            'mtime_ns'
+
+        Note
+            - "unchecked" is stamped same as "mtime_ns", so cache (& per file results) created using either one
+              is used by other without scanning package again.
+    '''
+    return 'mtime_ns' if validate == 'unchecked' else validate
+
+
+def file_stamp(file_path, validate, entry=None):
+    ''' File stamp used to check if file has changed
+
+        Type
+            file_path: str
+            validate:  str
+            entry:     Union[os.DirEntry, None]
+            return:    Union[Tuple[int, int], bytes]
+
+        Example
+            >>> file_stamp('/path/pkg/one.py', 'mtime_ns')
+            (1234500000000, 15)
+
+            >>> file_stamp('/path/pkg/one.py', 'hash')
+            b'\x8e\x1f...'
+
+        Note
+            - `entry` from `os.scandir()` is used to avoid calling `stat()` again when its already known.
+            - "unchecked" is stamped same as "mtime_ns", see `stamp_kind()`
+    '''
+    if validate == 'hash':
+        with open(file_path, 'rb') as file:
+            return blake2b(file.read(), digest_size=16).digest()
+    st = entry.stat() if entry else stat(file_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def dir_stamp(dir_path, validate, names=None, entry=None):
+    ''' Directory stamp used to check if any file was added or removed
+
+        Type
+            dir_path: str
+            validate: str
+            names:    Union[List[str], None]
+            entry:    Union[os.DirEntry, None]
+            return:   Union[int, bytes]
+
+        Example
+            >>> dir_stamp('/path/pkg/', 'mtime_ns')
+            1234500000000
+
+            >>> dir_stamp('/path/pkg/', 'hash')
+            b'\x01\xa4...'
+
+        Note
+            - "hash" stamps sorted names within directory, `__pycache__` and hidden names are ignored
+              since they change without package itself changing.
+            - archive file (e.g. zipapp) is stamped by its modified time or content hash.
+    '''
+    if validate == 'hash':
+        if names is None:
+            try:
+                names = listdir(dir_path)
+            except NotADirectoryError:
+                return file_stamp(dir_path, validate)  # note: archive package is within, see `prep_archive()`
+        names = sorted(name for name in names if name[0] != '.' and name != '__pycache__')
+        return blake2b('/'.join(names).encode(errors='surrogateescape'), digest_size=16).digest()
+    return (entry.stat() if entry else stat(dir_path)).st_mtime_ns
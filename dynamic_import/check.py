@@ -1,9 +1,19 @@
-from os.path import normpath, isdir, isabs, isfile, join
-from .prep import EXT_SUFFIX
+from re import match
+from threading import RLock
+from os import environ
+from os.path import normpath, isdir, isabs, isfile, join, abspath, expanduser
+from .prep import EXT_SUFFIX, GLOB_CHAR, prep_glob, prep_archive_path
+from .extract import ENGINES
+from .cache import VALIDATE, CACHE_ENV
+from .hot import HOT
 
 
-__all__ = 'IMPORTER_CALLED', 'importer_called', 'exclude_file_check', 'exclude_dir_check'
+__all__ = 'IMPORTER_CALLED', 'IMPORTER_LOCK', 'importer_called', 'exclude_file_check', 'exclude_dir_check', \
+          'workers_check', 'engine_check', 'validate_check', 'hot_check', 'cache_dir_check'
 IMPORTER_CALLED = {}  # e.g {'/path/pkg/': {'/path/pkg/sub-dir/'}}
+# note: guards `IMPORTER_CALLED` as packages can be imported from many threads at once, which
+#       does not rely on GIL (free-threaded python). Each (sub-)interpreter has its own copy of both.
+IMPORTER_LOCK = RLock()
 
 
 def importer_called(pkg_path):
@@ -29,7 +39,7 @@ def importer_called(pkg_path):
             - will raises `ImportError()` if `importer()` was previously called from parent module.
             - use `importer(exclude_dir)` to exclude sub-dir if you want to call new `importer()` from sub-dir.
     '''
-    if IMPORTER_CALLED:
+    with IMPORTER_LOCK:
         for parent, exclude in IMPORTER_CALLED.items():
             if pkg_path.startswith(parent):  # `pkg_path` is within parent directory.
                 if pkg_path == parent:
@@ -37,13 +47,13 @@ def importer_called(pkg_path):
                 for each in exclude:
                     # TODO: need to reverse check if sub-directory called `importer()` before parent dir.
                     # sub-directory excluded.
-                    if pkg_path.startswith(each):
+                    if pkg_path.startswith(each) or (GLOB_CHAR(each) and match(prep_glob(each), pkg_path)):
                         return None
                 # sub-directory not excluded.
                 _ = f'Can not call `importer()` from {pkg_path!r}, as it was previously called from {parent!r}. ' \
                     'See `help(importer)` for more options.'
                 raise ImportError(_)
-    IMPORTER_CALLED[pkg_path] = set()
+        IMPORTER_CALLED[pkg_path] = set()
 
 
 def exclude_file_check(exclude_file, pkg_name, pkg_path):
@@ -60,6 +70,12 @@ def exclude_file_check(exclude_file, pkg_name, pkg_path):
 
             >>> exclude_file_check(('one.py', 'two.cpython-312-x86_64-linux-gnu.so'), 'pkg', '/path/pkg/')
             ['/path/pkg/one.py', '/path/pkg/two.cpython-312-x86_64-linux-gnu.so']
+
+            >>> exclude_file_check('**/test_*.py', 'pkg', '/path/pkg/')
+            ['/path/pkg/**/test_*.py']
+
+        Note
+            - glob pattern is not checked for extension or existence.
     '''
     r = []
     if not exclude_file:
@@ -73,6 +89,10 @@ def exclude_file_check(exclude_file, pkg_name, pkg_path):
             error = f'`importer(exclude_file)` received absolute path {each!r} must be relative path.'
             raise ValueError(error)
 
+        if GLOB_CHAR(each):
+            r.append(normpath(join(pkg_path, each)))  # '/path/pkg/<pattern>'
+            continue
+
         if not each.endswith(EXT_SUFFIX):
             ext = f'.{each.split(".", 1)[-1]}'
             sup = ', '.join(EXT_SUFFIX)
@@ -81,7 +101,8 @@ def exclude_file_check(exclude_file, pkg_name, pkg_path):
 
         each_file = normpath(join(pkg_path, each))  # '/path/pkg/<file>.<ext>'
 
-        if not isfile(each_file):
+        # note: not checked within archive, see `prep_archive()`
+        if not isfile(each_file) and prep_archive_path(pkg_path) is None:
             error = f'`importer(exclude_file)` received {each_file!r} which is not an file or does not exist!'
             raise ValueError(error)
         r.append(each_file)
@@ -103,8 +124,12 @@ def exclude_dir_check(exclude_dir, pkg_path, recursive):
             >>> exclude_dir_check(('sub-dir', 'sub/sub-dir'), '/path/pkg/', True)
             ['/path/pkg/sub-dir/', /path/pkg/sub/sub-dir/']
 
+            >>> exclude_dir_check(('**/tests', 'docs*'), '/path/pkg/', True)
+            ['/path/pkg/**/tests/', '/path/pkg/docs*/']
+
         Note:
-            - Values are appended into `IMPORTER_CALLED`
+            - Values are appended into `IMPORTER_CALLED` (if `importer()` was called from `pkg_path`)
+            - glob pattern is not checked for existence.
     '''
     r = []
     if not (recursive and exclude_dir):
@@ -125,10 +150,126 @@ def exclude_dir_check(exclude_dir, pkg_path, recursive):
             error = f'`importer(exclude_dir)` can not find directory {each_dir!r} within {pkg_path!r}'
             raise ValueError(error)
 
-        if not isdir(each_dir):
+        # note: not checked within archive, same as `exclude_file_check()`
+        if not (GLOB_CHAR(each) or isdir(each_dir) or prep_archive_path(pkg_path)):
             error = f'`importer(exclude_dir)` can not find directory: {each_dir!r}'
             raise ValueError(error)
 
-        IMPORTER_CALLED[pkg_path].add(each_dir)
+        with IMPORTER_LOCK:
+            if (excluded := IMPORTER_CALLED.get(pkg_path)) is not None:  # note: not registered by `build_cache()`
+                excluded.add(each_dir)
         r.append(each_dir)
     return r
+
+
+def workers_check(workers):
+    '''
+        Type
+            workers: int
+            return:  int
+
+        Example
+            >>> workers_check(4)
+            4
+
+            >>> workers_check(-1)
+            ValueError
+
+        Note
+            - `0` is kept as is, its turned into number of cores only when package is scanned, see `pool_workers()`
+    '''
+    if type(workers) is not int or workers < 0:
+        error = f'`importer(workers)` received {workers!r} must be 0 or higher.'
+        raise ValueError(error)
+    return workers
+
+
+def engine_check(engine):
+    '''
+        Type
+            engine: str
+            return: str
+
+        Example
+            >>> engine_check('token')
+            'token'
+
+            >>> engine_check('bad')
+            ValueError
+    '''
+    if engine not in ENGINES:
+        sup = ', '.join(ENGINES)
+        error = f'`importer(engine)` received {engine!r} not supported. Only allowed: {sup!r}'
+        raise ValueError(error)
+    return engine
+
+
+def validate_check(validate):
+    '''
+        Type
+            validate: str
+            return:   str
+
+        Example
+            >>> validate_check('hash')
+            'hash'
+
+            >>> validate_check('bad')
+            ValueError
+    '''
+    if validate not in VALIDATE:
+        sup = ', '.join(VALIDATE)
+        error = f'`importer(validate)` received {validate!r} not supported. Only allowed: {sup!r}'
+        raise ValueError(error)
+    return validate
+
+
+def hot_check(hot):
+    '''
+        Type
+            hot:    Union[str, None]
+            return: Union[str, None]
+
+        Example
+            >>> hot_check('record')
+            'record'
+
+            >>> hot_check('bad')
+            ValueError
+    '''
+    if hot not in HOT:
+        sup = ', '.join(map(str, HOT))
+        error = f'`importer(hot)` received {hot!r} not supported. Only allowed: {sup!r}'
+        raise ValueError(error)
+    return hot
+
+
+def cache_dir_check(cache_dir):
+    '''
+        Type
+            cache_dir: Union[str, None]
+            return:    Union[str, None]
+
+        Example
+            >>> cache_dir_check('~/.cache/app')
+            '/home/user/.cache/app'
+
+            # `DYNAMIC_IMPORT_CACHE=/var/cache/app`
+            >>> cache_dir_check(None)
+            '/var/cache/app'
+
+            >>> cache_dir_check(1)
+            ValueError
+
+        Note
+            - `None` falls back to `DYNAMIC_IMPORT_CACHE` environment variable, if its not set either `None`
+              is returned & cache is kept in package `__pycache__` directory (when its writable).
+    '''
+    if cache_dir is None:
+        cache_dir = environ.get(CACHE_ENV)
+        if not cache_dir:
+            return None
+    elif not isinstance(cache_dir, str) or not cache_dir:
+        error = f'`importer(cache_dir)` received {cache_dir!r} must be directory path or `None`'
+        raise ValueError(error)
+    return abspath(expanduser(cache_dir))
@@ -1,17 +1,72 @@
+from os import stat
+from os.path import exists
+from re import compile as re_compile
+from io import BytesIO
+from marshal import loads
+import dis
+from sys import version_info
+from importlib.util import MAGIC_NUMBER, cache_from_source, source_hash
+from keyword import iskeyword
+from collections import namedtuple
+from itertools import chain
+from tokenize import detect_encoding, tokenize, untokenize, TokenError, NAME, OP, NEWLINE, NL, COMMENT, \
+                     ENDMARKER, INDENT, DEDENT
 from importlib import import_module
 from ast import FunctionDef, AsyncFunctionDef, ClassDef, Assign, parse, literal_eval
 from .special import special
 
 
-__all__ = 'extract_variable', 'extract_so_variable'
+__all__ = 'ENGINES', 'extract_variable', 'parse_variable', 'token_variable', 'bytecode_variable', \
+          'code_variable', 'code_indented', 'source_so_variable', 'pyx_variable', 'extract_so_variable'
+ENGINES = ('ast', 'token', 'bytecode')
+Instruction = namedtuple('Instruction', 'offset opname arg argval jump')
+# source next to `.so` file that names can be read from, in order of preference.
+SO_SOURCE = ('.pyi', '.pyx', '.py')
 LIST_TUPLE = (list, tuple)
+# indented line with any of these can continue onto next line(s), so it must be scanned.
+CONTINUE_LINE = re_compile(rb'[\'"(\[{\\]').search
+EMPTY_LINE = re_compile(rb'[ \t\f]*(?:#|\r?\n|\r|$)').match
+SCAN_TOKEN = re_compile(rb'[#\'"()\[\]{}=;]').search
+# start of top-level statement, e.g. `def name`, `class Name`, `name =`, `name:`, `name`
+HEAD_TOKEN = re_compile(rb'[ \t\f]*(?:(?:async[ \t]+)?(?:def|class)[ \t]+([A-Za-z_]\w*)'
+                        rb'|([A-Za-z_]\w*)[ \t]*(?:(=)(?!=)|(:)(?!=))?)').match
+STRING_PREFIX = frozenset(b'rRbBuUfF')
+F_PREFIX = frozenset(b'fF')
+NOT_EQUAL = frozenset(b'=!<>:+-*/%&|^@~')  # char before `=` that makes it not an assignment.
+COMPOUND_KEYWORD = frozenset(('if', 'elif', 'else', 'for', 'while', 'with', 'try', 'except', 'finally', 'async'))
+# kind of top-level statement
+COMPOUND = 1  # e.g. `def`, `class`, `if`, ... rest of line belongs to its block.
+SIMPLE = 2  # e.g. `import os`, `one: int = 1` ignored, same as `ast`.
+ASSIGN = 3  # e.g. `one = 1`
+ALL = 4  # e.g. `__all__ = ('one',)`
+OTHER = 5  # e.g. `one.two = 1`, `print(one)`, can't decide if it has `=`
+JREL = frozenset(dis.hasjrel)
+JABS = frozenset(dis.hasjabs)
+BACKWARD = frozenset(op for op in JREL if 'BACKWARD' in dis.opname[op])  # python3.11+
+UNIT = 2 if version_info >= (3, 10) else 1  # jump argument is in code units since python3.10
+POSITIONS = version_info >= (3, 11)  # `code.co_positions()` gives column of each instruction.
+INDENT_CHAR = (b' ', b'\t', b'\f')
+# `BINARY_OP` argument of inplace operator, e.g. `one += 1` (python3.11+)
+INPLACE_ARG = frozenset(i for i, (_, sign) in enumerate(getattr(dis, '_nb_ops', ())) if sign.endswith('='))
+RETURN = frozenset(('RETURN_VALUE', 'RETURN_CONST'))
+IMPORT = frozenset(('IMPORT_NAME', 'IMPORT_FROM'))
+SKIP_OP = frozenset(('NOP', 'CACHE', 'EXTENDED_ARG'))
+# top-level statement `ast` does not handle the same way, e.g. `one.two = 1`, `one, two = 1, 2`,
+# `one: int = 1`, `global one`, `type One = int`, `def one[T](): ...`
+UNDECIDED_OP = frozenset(('STORE_ATTR', 'STORE_SUBSCR', 'STORE_SLICE', 'UNPACK_SEQUENCE', 'UNPACK_EX', 'STORE_GLOBAL',
+                          'SETUP_ANNOTATIONS', 'CALL_INTRINSIC_1', 'CALL_INTRINSIC_2'))
+# `try: ... else: ...` block can not be told apart from code that follows it.
+TRY_OP = frozenset(('SETUP_FINALLY', 'SETUP_WITH', 'SETUP_ASYNC_WITH'))
+# e.g. `one = two = 1`, `(one := 1)`, `one, two = 1, two`
+STACK_OP = frozenset(('COPY', 'DUP_TOP', 'SWAP', 'ROT_TWO', 'ROT_THREE', 'ROT_FOUR', 'ROT_N'))
 
 
-def extract_variable(path):
+def extract_variable(path, engine='ast'):
     ''' Extract variable value from source file
 
         Type
             path:   str
+            engine: str
             return: Union[List[str], Tuple[str]
 
         Example
@@ -29,9 +84,56 @@ def extract_variable(path):
             # `__all__` is not defined.
             >>> extract_variable('file_3.py')
             ('variable', 'ClassName', 'function_name', 'DEFINE')
+
+            # stream tokens, stop as soon as `__all__` is found.
+            >>> extract_variable('file_1.py', 'token')
+            ('one', 'two', 'three')
+
+            # use up-to-date `__pycache__/file_1.cpython-312.pyc` if available.
+            >>> extract_variable('file_1.py', 'bytecode')
+            ('one', 'two', 'three')
+
+        Note
+            - `engine='ast'` parses the whole file.
+            - `engine='token'` only looks at top-level statements and falls back to `ast` when
+              it can not decide, see `token_variable()`.
+            - `engine='bytecode'` reads names from valid `.pyc` file and falls back to `ast` when
+              there is none or it can not decide, see `bytecode_variable()`.
     '''
+    if engine == 'bytecode':
+        if (variables := bytecode_variable(path)) is not None:
+            return variables
     with open(path, 'rb') as file:
+        if engine == 'token':
+            if (variables := token_variable(file.readline, path)) is not None:
+                return variables
+            file.seek(0)
         content = file.read()
+    return parse_variable(content, path)
+
+
+def parse_variable(content, path, engine='ast'):
+    ''' Parse variable value from source content
+
+        Type
+            content: bytes
+            path:    str
+            engine:  str
+            return:  Union[List[str], Tuple[str]
+
+        Example
+            >>> parse_variable(b'__all__ = "one"', 'file_1.py')
+            ('one',)
+
+        Note
+            - `path` is only used for error message.
+    '''
+    if engine == 'token':
+        if (variables := token_variable(BytesIO(content).readline, path)) is not None:
+            return variables
+    elif engine == 'bytecode':
+        if (variables := bytecode_variable(path, content)) is not None:
+            return variables
 
     variables = []
     for body in parse(content, path).body:
@@ -52,6 +154,576 @@ def extract_variable(path):
     return variables
 
 
+def token_variable(readline, path):
+    ''' Extract variable value by streaming over top-level statements
+
+        Type
+            readline: Callable[[], bytes]
+            path:     str
+            return:   Union[List[str], Tuple[str], None]
+
+        Example
+            >>> with open('file_1.py', 'rb') as file:
+            ...     token_variable(file.readline, 'file_1.py')
+            ('one', 'two', 'three')
+
+        Note
+            - returns `None` when it can not decide, e.g. assignment to attribute, subscript or
+              unpacking, non literal `__all__`, non-ascii name or broken file. Use `parse_variable()` instead.
+            - stops reading as soon as top-level `__all__` is found, rest of file is not read.
+            - only tokens that matter are scanned (strings, brackets, `=`, `;`), indented line
+              without any of those is skipped without scanning.
+    '''
+    try:
+        encoding, first_lines = detect_encoding(readline)
+    except SyntaxError:
+        return None
+
+    variables = []
+    end_string = None  # quote of string that is still open, e.g. `"""`
+    f_brace = None  # number of open `{` in f-string, `None` if not f-string
+    paren = 0
+    joined = False  # line ends with `\`
+    kind = None  # kind of current top-level statement, `None` within indented block
+    equal = 0  # number of `=` outside of brackets in current top-level statement
+    value = None  # `__all__` value source
+    for line in chain(first_lines, iter(readline, b'')):
+        pos = 0
+        if not (end_string or paren or joined):  # start of logical line
+            if EMPTY_LINE(line):
+                continue  # empty or comment line
+            elif line[0] in (32, 9):  # 32 = ' ', 9 = '\t'
+                kind = None
+                if not CONTINUE_LINE(line):
+                    continue  # simple indented line can't change anything at top-level.
+            elif (found := head_token(line, pos, variables)) is None:
+                return None
+            else:
+                kind, pos, equal = found
+                if kind == ALL:
+                    value = [line[pos:]]
+        elif value is not None:
+            value.append(line)
+
+        comment = False
+        while True:
+            if end_string:
+                end = string_end(line, pos, end_string)
+                if f_brace is not None:
+                    chunk = line[pos:end]  # note: `{{` & `}}` escape are balanced as well.
+                    f_brace += chunk.count(b'{') - chunk.count(b'}')
+                if end == -1:
+                    if len(end_string) == 1 and not line.endswith((b'\\\n', b'\\\r\n')):
+                        return None  # single quoted string is not closed.
+                    break  # string continues on next line
+                elif f_brace:
+                    return None  # e.g. python3.12+ `f"{one["two"]}"`
+                pos = end
+                end_string = f_brace = None
+
+            if (found := SCAN_TOKEN(line, pos)) is None:
+                break
+            pos = found.end()
+            char = line[pos - 1]
+            if char == 35:  # '#'
+                comment = True
+                break
+            elif char in (34, 39):  # '"', "'"
+                start = pos - 1
+                if line[pos:pos + 2] == line[start:pos] * 2:
+                    pos += 2
+                end_string = line[start:pos]  # e.g. `'`, `"""`
+                f_brace = None
+                for i in line[max(start - 2, 0):start][::-1]:  # e.g. f"", rf"", Rb""
+                    if i not in STRING_PREFIX:
+                        break
+                    elif i in F_PREFIX:
+                        f_brace = 0
+            elif char in (40, 91, 123):  # '(', '[', '{'
+                paren += 1
+            elif char in (41, 93, 125):  # ')', ']', '}'
+                if (paren := paren - 1) < 0:
+                    return None
+            elif kind is None or paren:
+                continue
+            elif char == 61:  # '='
+                if (pos < 2 or line[pos - 2] not in NOT_EQUAL) and line[pos:pos + 1] != b'=':
+                    equal += 1
+            elif kind == COMPOUND:
+                continue  # ';' e.g. `if one: two = 1; three = 2` all belongs to `if` block.
+            elif value is not None or (kind == OTHER and equal):
+                return None
+            elif (found := head_token(line, pos, variables)) is None:  # ';' e.g. `one = 1; two = 2`
+                return None
+            else:
+                kind, pos, equal = found
+                if kind == ALL:
+                    value = [line[pos:]]
+
+        if end_string or paren:
+            continue
+        elif not comment and line.endswith((b'\\\n', b'\\\r\n', b'\\')):
+            joined = True
+            continue
+        joined = False
+
+        # end of logical line
+        if value is not None:
+            if equal > 1:
+                return None  # e.g. `__all__ = other = ['one']`
+            try:
+                # note: python3.9 `literal_eval()` does not strip leading whitespace, e.g. after `=`
+                value = literal_eval(b''.join(value).decode(encoding).strip())
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError, UnicodeDecodeError):
+                return None
+            _type = type(value)
+            if _type in LIST_TUPLE:
+                return value
+            elif _type is str:
+                return (value,)
+            else:
+                raise TypeError(f'`__all__` values in {path!r} is not string!')
+        elif kind == OTHER and equal:
+            return None  # e.g. `one.two = 1`, `one, two = 1, 2`, `(one) = 1`, `type One = int`
+
+    if end_string or paren or joined:
+        return None
+    return variables
+
+
+def string_end(line, pos, quote):
+    ''' Find end of string
+
+        Type
+            line:   bytes
+            pos:    int
+            quote:  bytes
+            return: int
+
+        Example
+            >>> string_end(b"'one\\'two' + three", 1, b"'")
+            11
+
+            >>> string_end(b'"""one\n', 3, b'"""')  # continues on next line
+            -1
+    '''
+    while (found := line.find(quote, pos)) != -1:
+        escape = found
+        while escape > pos and line[escape - 1] == 92:  # 92 = '\\'
+            escape -= 1
+        if (found - escape) % 2 == 0:
+            return found + len(quote)
+        pos = found + 1  # quote is escaped
+    return -1
+
+
+def head_token(line, pos, variables):
+    ''' Find kind of top-level statement starting at `pos`
+
+        Type
+            line:      bytes
+            pos:       int
+            variables: List[str]
+            return:    Union[Tuple[int, int, int], None]
+
+        Example
+            >>> head_token(b'one = 1', 0, variables)
+            (ASSIGN, 5, 1)  # `variables` is now ['one']
+
+        Note
+            - returns `(kind, pos, equal)` or `None` when it can not decide.
+    '''
+    if (found := HEAD_TOKEN(line, pos)) is None:
+        return OTHER, pos, 0  # e.g. `(one) = 1`, `@decorator`, `"""doc"""`
+    pos = found.end()
+    if line[pos:pos + 1] and line[pos] > 127:
+        return None  # non-ascii name
+    elif name := found.group(1):  # def, class
+        variables.append(name.decode())
+        return COMPOUND, pos, 0
+    name = found.group(2).decode()
+    if iskeyword(name):
+        return (COMPOUND if name in COMPOUND_KEYWORD else SIMPLE), pos, 0
+    elif found.group(3):  # `name =`
+        if name == '__all__':
+            return ALL, pos, 1
+        variables.append(name)
+        return ASSIGN, pos, 1
+    elif found.group(4):  # `name:`
+        return SIMPLE, pos, 0
+    return OTHER, pos, 0
+
+
+def bytecode_variable(path, source=None):
+    ''' Extract variable value from up-to-date `__pycache__` bytecode of source file
+
+        Type
+            path:   str
+            source: Union[bytes, None]
+            return: Union[List[str], Tuple[str], None]
+
+        Example
+            # ./__pycache__/file_1.cpython-312.pyc
+            >>> bytecode_variable('file_1.py')
+            ('one', 'two', 'three')
+
+            # `.pyc` does not exist or is stale
+            >>> bytecode_variable('file_2.py')
+            None
+
+        Note
+            - `.pyc` is validated same as import system does, by source mtime & size or by source hash.
+            - `source` content is only needed to validate hash based `.pyc`, or on python3.9 - 3.10 to find
+              indented lines (read from `path` if not given), see `code_indented()`
+            - returns `None` when there is no valid `.pyc` or `code_variable()` can not decide.
+    '''
+    try:
+        with open(cache_from_source(path), 'rb') as file:
+            data = file.read()
+        if data[:4] != MAGIC_NUMBER or len(data) < 16:
+            return None
+        flags = int.from_bytes(data[4:8], 'little')
+        if flags & ~0b11:
+            return None
+        elif flags:  # hash based, always checked even if "unchecked" since names must be correct.
+            if source is None:
+                with open(path, 'rb') as file:
+                    source = file.read()
+            if data[8:16] != source_hash(source):
+                return None
+        else:  # timestamp based
+            st = stat(path)
+            if int.from_bytes(data[8:12], 'little') != int(st.st_mtime) & 0xFFFFFFFF \
+                    or int.from_bytes(data[12:16], 'little') != st.st_size & 0xFFFFFFFF:
+                return None
+        code = loads(memoryview(data)[16:])
+        if source is None and not POSITIONS:
+            with open(path, 'rb') as file:
+                source = file.read()
+    except (OSError, NotImplementedError, EOFError, ValueError, TypeError):
+        return None
+    return code_variable(code, path, source)
+
+
+def code_variable(code, path, source=None):
+    ''' Extract variable value from module code object
+
+        Type
+            code:   types.CodeType
+            path:   str
+            source: Union[bytes, None]
+            return: Union[List[str], Tuple[str], None]
+
+        Example
+            >>> code_variable(compile('__all__ = "one"', 'file_1.py', 'exec'), 'file_1.py')
+            ('one',)
+
+        Note
+            - mimics `ast` extraction, names stored within `if` block are ignored. Instruction covered
+              by forward jump or after first return is within block.
+            - returns `None` when it can not decide, e.g. `try`, `with` or loop at top-level, attribute,
+              subscript, unpack or annotated assignment, non literal `__all__`.
+            - compiler removes constant `if` test (e.g. `if __debug__:`, `if True:`) leaving its block as
+              top-level code, so name stored on indented line returns `None` as well, see `code_indented()`
+    '''
+    if getattr(code, 'co_exceptiontable', None):
+        return None  # python3.11+ `try`, `with`
+    if (indented := code_indented(code, source)) is None:
+        return None
+    instructions = code_instructions(code)
+    end = None  # first return, anything after is only reachable by jump.
+    for instruction in instructions:
+        opname = instruction.opname
+        if opname in TRY_OP:
+            return None  # python3.9 - 3.10 `try`, `with`
+        elif instruction.jump is not None:
+            if instruction.jump <= instruction.offset and (end is None or instruction.jump <= end):
+                return None  # loop or out of line block jumping back, e.g. python3.10 chained compare
+        elif end is None and opname in RETURN:
+            end = instruction.offset
+        elif end is not None and opname == 'STORE_NAME':
+            return None  # python3.9 - 3.10 last statement `one = two if three else four`
+
+    variables = []
+    stop = 0  # instruction before furthest forward jump target is within block.
+    for index, instruction in enumerate(instructions):
+        offset = instruction.offset
+        if instruction.jump is not None and instruction.jump > stop:
+            stop = instruction.jump
+        if (end is not None and offset > end) or offset < stop:
+            continue
+        opname = instruction.opname
+        if opname in UNDECIDED_OP or opname.startswith('INPLACE_') or \
+                (opname == 'BINARY_OP' and instruction.arg in INPLACE_ARG):  # e.g. `one += 1`
+            return None
+        elif opname != 'STORE_NAME':
+            continue
+
+        name = instruction.argval
+        previous = [i.opname for i in instructions[max(index - 3, 0):index]]
+        if previous[-1:] and previous[-1] in IMPORT:
+            continue  # e.g. `import one`, `from one import two`
+        elif previous[-3:-1] in (['IMPORT_FROM', 'ROT_TWO'], ['IMPORT_FROM', 'SWAP']) and previous[-1] == 'POP_TOP':
+            continue  # python3.9 - 3.10 `import one.two as three`
+        elif previous[-1:] and previous[-1] in STACK_OP or name in ('__annotate__', '__conditional_annotations__'):
+            return None
+        elif offset in indented:
+            return None  # e.g. `if __debug__:` block
+        elif name == '__doc__' and index <= 2:
+            continue  # module docstring, e.g. `RESUME`, `LOAD_CONST`, `STORE_NAME`
+        elif name == '__all__':
+            value = const_value(instructions[:index])
+            if value is None:
+                return None
+            _type = type(value)
+            if _type in LIST_TUPLE:
+                return value
+            elif _type is str:
+                return (value,)
+            else:
+                raise TypeError(f'`__all__` values in {path!r} is not string!')
+        variables.append(name)
+    return variables
+
+
+def code_indented(code, source=None):
+    ''' Offsets of instructions that belong to indented source line
+
+        Type
+            code:   types.CodeType
+            source: Union[bytes, None]
+            return: Union[Set[int], None]
+
+        Example
+            >>> code_indented(compile('if __debug__:\n    one = 1\ntwo = 2', 'file_1.py', 'exec'))
+            {4, 6}
+
+        Note
+            - python3.11+ line is indented if none of its instructions starts at first column, `source`
+              is not needed.
+            - python3.9 - 3.10 has no columns, line of each instruction is looked up within `source`
+              instead. Returns `None` without `source`
+    '''
+    r = set()
+    if POSITIONS:
+        lines = {}
+        columns = {}
+        for index, (line, _, column, _) in enumerate(code.co_positions()):
+            if line is not None and column is not None:
+                lines[index * 2] = line
+                if column < columns.get(line, 1):
+                    columns[line] = column
+        for offset, line in lines.items():
+            if line not in columns:
+                r.add(offset)
+    elif source is not None:
+        source_lines = source.splitlines()
+        starts = dict(dis.findlinestarts(code))
+        line = None
+        for offset in range(0, len(code.co_code), 2):
+            line = starts.get(offset, line)
+            if line and source_lines[line - 1][:1] in INDENT_CHAR:
+                r.add(offset)
+    else:
+        return None
+    return r
+
+
+def code_instructions(code):
+    ''' Decode module code object into instructions
+
+        Type
+            code:   types.CodeType
+            return: List[Instruction]
+
+        Example
+            >>> code_instructions(compile('one = 1', 'file_1.py', 'exec'))
+            [Instruction(offset=2, opname='LOAD_CONST', arg=0, argval=1, jump=None),
+             Instruction(offset=4, opname='STORE_NAME', arg=0, argval='one', jump=None), ...]
+
+        Note
+            - lighter replacement for `dis.get_instructions()` which resolves representation of
+              every argument and is slower than parsing source for large modules.
+            - `CACHE`, `NOP` and `EXTENDED_ARG` are left out, `jump` is target offset of jump instruction.
+    '''
+    opname = dis.opname
+    names = code.co_names
+    consts = code.co_consts
+    raw = code.co_code
+    size = len(raw)
+    instructions = []
+    extended = 0
+    for offset in range(0, size, 2):
+        op = raw[offset]
+        arg = raw[offset + 1] | extended
+        name = opname[op]
+        if name == 'EXTENDED_ARG':
+            extended = arg << 8
+            continue
+        extended = 0
+        if name in SKIP_OP:
+            continue
+        jump = None
+        if op in JREL:
+            # note: relative to next instruction, after any inline `CACHE` entries (python3.11+)
+            after = offset + 2
+            while after < size and raw[after] == 0:
+                after += 2
+            jump = after - arg * UNIT if op in BACKWARD else after + arg * UNIT
+        elif op in JABS:
+            jump = arg * UNIT
+        if name == 'STORE_NAME':
+            argval = names[arg]
+        elif name == 'LOAD_CONST':
+            argval = consts[arg]
+        else:
+            argval = arg
+        instructions.append(Instruction(offset, name, arg, argval, jump))
+    return instructions
+
+
+def const_value(instructions):
+    ''' Literal value loaded by last instructions
+
+        Type
+            instructions: List[Instruction]
+            return:       Union[List, Tuple, str, int, ..., None]
+
+        Example
+            # LOAD_CONST ('one', 'two')
+            ('one', 'two')
+
+            # BUILD_LIST 0, LOAD_CONST ('one', 'two'), LIST_EXTEND 1
+            ['one', 'two']
+
+            # LOAD_CONST 'one', LOAD_CONST 'two', BUILD_LIST 2
+            ['one', 'two']
+    '''
+    if not instructions:
+        return None
+    last = instructions[-1]
+    if last.opname == 'LOAD_CONST':
+        return last.argval
+    elif last.opname == 'LIST_EXTEND' and last.arg == 1 and len(instructions) > 2:
+        build, load = instructions[-3:-1]
+        if build.opname == 'BUILD_LIST' and build.arg == 0 and load.opname == 'LOAD_CONST':
+            return list(load.argval)
+    elif last.opname in ('BUILD_LIST', 'BUILD_TUPLE') and len(instructions) > last.arg:
+        items = instructions[len(instructions) - 1 - last.arg:-1]
+        if all(i.opname == 'LOAD_CONST' for i in items):
+            value = [i.argval for i in items]
+            return value if last.opname == 'BUILD_LIST' else tuple(value)
+    return None
+
+
+def source_so_variable(file_path):
+    ''' Extract variable value from source next to `.so` file, without importing it
+
+        Type
+            file_path: str
+            return:    Union[List[str], Tuple[str], None]
+
+        Example
+            # /path/pkg/file_1.cpython-312-x86_64-linux-gnu.so
+            # /path/pkg/file_1.pyi
+            >>> source_so_variable('/path/pkg/file_1.cpython-312-x86_64-linux-gnu.so')
+            ['one', 'two']
+
+            # no `.pyi`, `.pyx` or `.py` file next to it.
+            >>> source_so_variable('/path/pkg/file_2.cpython-312-x86_64-linux-gnu.so')
+            None
+
+        Note
+            - `.pyi` stub is preferred as it describes what extension actually exports.
+            - `.pxd` only declares C level API, so its not enough on its own.
+    '''
+    path, _, name = file_path.rpartition('/')
+    base = f'{path}/{name.split(".")[0]}' if path else name.split('.')[0]
+    for ext in SO_SOURCE:
+        if exists(source := f'{base}{ext}'):
+            if ext == '.pyx':
+                return pyx_variable(source)
+            try:
+                return extract_variable(source)
+            except SyntaxError:
+                return None
+    return None
+
+
+def pyx_variable(path):
+    ''' Extract variable value from Cython `.pyx` source
+
+        Type
+            path:   str
+            return: Union[List[str], Tuple[str], None]
+
+        Example
+            # cpdef hello(name): ...
+            # cdef class World: ...
+            # cdef int hidden = 1
+            >>> pyx_variable('/path/pkg/file_1.pyx')
+            ['hello', 'World']
+
+        Note
+            - mimics `ast` extraction, only top-level names visible from Python are added, e.g. `def`,
+              `cpdef`, `class`, `cdef class`, `cpdef enum` and `name = ...`
+            - returns `None` when it can not decide, e.g. `include` or source can not be tokenized.
+    '''
+    variables = []
+    level = 0
+    line = []  # tokens of current top-level logical line
+    try:
+        with open(path, 'rb') as file:
+            for token in tokenize(file.readline):
+                kind = token.type
+                if kind == INDENT:
+                    level += 1
+                elif kind == DEDENT:
+                    level -= 1
+                elif level:
+                    continue
+                elif kind == NEWLINE or kind == ENDMARKER:
+                    if line:
+                        first = line[0].string
+                        second = line[1].string if len(line) > 1 else ''
+                        if first in ('def', 'class') or (first == 'async' and second == 'def'):
+                            variables.append(line[2 if first == 'async' else 1].string)
+                        elif first == 'cpdef' and len(line) > 2:
+                            if second == 'enum':
+                                if line[2].type == NAME:
+                                    variables.append(line[2].string)  # `cpdef enum Name:`
+                            else:
+                                # `cpdef [type] name(...)`
+                                stop = next((i for i, t in enumerate(line) if t.string == '('), 0)
+                                if stop > 1:
+                                    variables.append(line[stop - 1].string)
+                        elif first == 'cdef':
+                            # `cdef [public] class Name[(Base)] [object ...]:`
+                            for i, t in enumerate(line[1:4], 1):
+                                if t.string == 'class' and i + 1 < len(line):
+                                    variables.append(line[i + 1].string)
+                                    break
+                        elif first == 'include':
+                            return None  # names from included file are not known.
+                        elif line[0].type == NAME and second == '=' and line[1].type == OP:
+                            if first == '__all__':
+                                value = literal_eval(untokenize((t.type, t.string) for t in line[2:]).strip())
+                                _type = type(value)
+                                if _type in LIST_TUPLE:
+                                    return value
+                                elif _type is str:
+                                    return (value,)
+                                else:
+                                    raise TypeError(f'`__all__` values in {path!r} is not string!')
+                            variables.append(first)
+                    line = []
+                elif kind == NAME or kind == OP or (line and kind != NL and kind != COMMENT):
+                    line.append(token)
+    except (TokenError, SyntaxError, OSError, ValueError):
+        return None  # note: `literal_eval` also raises `ValueError` for non literal `__all__`
+    return variables
+
+
 def extract_so_variable(module_name):
     ''' Extract variable value from `.so` cython generated file
 
@@ -0,0 +1,58 @@
+from marshal import load
+from .cache import dump_file
+
+
+__all__ = 'HOT', 'dump_hot', 'load_hot'
+# what `importer(hot)` does with names that are used (hot set).
+#   None:         nothing (default)
+#   'record':     record names in order of first use & save them when program exits.
+#   'eager':      load modules of recorded names while `importer()` is called.
+#   'background': load modules of recorded names on background threads, see `Module.__warmup__()`
+HOT = (None, 'record', 'eager', 'background')
+
+
+def dump_hot(hot_path, names, version):
+    ''' Save recorded hot set
+
+        Type
+            hot_path: str
+            names:    List[str]
+            version:  str
+            return:   None
+
+        Example
+            >>> dump_hot('/path/pkg/__pycache__/__init__.hot-312.pyc', ['one', 'two'], version)
+
+        Note
+            - names are saved in order of first use, previous hot set is replaced.
+            - nothing is saved if no name was used.
+    '''
+    if names:
+        dump_file(hot_path, (version, tuple(dict.fromkeys(names))))
+
+
+def load_hot(hot_path, version, info):
+    ''' Load recorded hot set
+
+        Type
+            hot_path: str
+            version:  str
+            info:     Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            return:   List[str]
+
+        Example
+            >>> load_hot('/path/pkg/__pycache__/__init__.hot-312.pyc', version, info)
+            ['one', 'two']
+
+        Note
+            - returns empty `list` if hot set is missing, unreadable or Dynamic Import version has changed.
+            - names that no longer exist in `info` are skipped.
+    '''
+    try:
+        with open(hot_path, 'rb') as file:
+            cached_version, names = load(file)
+        if cached_version == version:
+            return [name for name in names if name in info]
+    except Exception:
+        pass
+    return []
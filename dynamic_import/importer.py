@@ -1,10 +1,17 @@
-from os import remove
+from os import remove, environ
+from atexit import register
 from sys import _getframe, modules
-from os.path import exists, split
-from .module import Module
-from .check import importer_called, exclude_file_check, exclude_dir_check
-from .cache import pkg_cache_path, create_cache_dir, dump_cache, load_cache
+from time import perf_counter
+from os.path import split
+from .module import Module, warmup_names
+from .check import importer_called, exclude_file_check, exclude_dir_check, engine_check, validate_check, hot_check, \
+    workers_check, cache_dir_check
+from .cache import pkg_cache_path, user_cache_dir, cache_writable, create_cache_dir
+from .build import build_cache
+from .index import BUNDLE_ENV
 from .prep import prep_package
+from .hot import dump_hot, load_hot
+from .stats import new_stats, stats_event
 from .record import add_record
 from .version import version
 
@@ -12,7 +19,8 @@ from .version import version
 __all__ = 'importer',
 
 
-def importer(*, cache=True, recursive=True, exclude_file=None, exclude_dir=None):
+def importer(*, cache=True, recursive=True, exclude_file=None, exclude_dir=None, workers=1,
+             engine='ast', validate='mtime_ns', defer=False, hot=None, cache_dir=None, index=False):
     ''' Automatically import modules dynamically.
 
         Type
@@ -20,6 +28,13 @@ def importer(*, cache=True, recursive=True, exclude_file=None, exclude_dir=None)
             recursive:    bool
             exclude_file: Union[Tuple[str], str, None]
             exclude_dir:  Union[Tuple[str], str, None]
+            workers:      int
+            engine:       str
+            validate:     str
+            defer:        bool
+            hot:          Union[str, None]
+            cache_dir:    Union[str, None]
+            index:        bool
             return:       None
 
         Example
@@ -42,17 +57,59 @@ def importer(*, cache=True, recursive=True, exclude_file=None, exclude_dir=None)
             >>> importer(exclude_dir='sub-dir')                        # single
             >>> importer(exclude_dir=('sub-dir', 'sub/sub-dir', ...))  # multiple
 
+            # exclude using glob pattern, `**/` matches any number of sub-directories
+            >>> importer(exclude_file='**/test_*.py')
+            >>> importer(exclude_dir=('**/tests', 'docs*'))
+
+            # scan large package using multiple processes
+            >>> importer(workers=4)  # 4 processes
+            >>> importer(workers=0)  # all cores
+
+            # extract names by streaming tokens, faster for large files (falls back to `ast` if needed)
+            >>> importer(engine='token')
+
+            # extract names from up-to-date `__pycache__/*.pyc` (falls back to `ast` if needed)
+            >>> importer(engine='bytecode')
+
+            # how cache is checked to be up-to-date (similar to PEP 552)
+            >>> importer(validate='mtime_ns')   # file modified time in nanosecond & size (default)
+            >>> importer(validate='hash')       # file content hash, when mtime can not be trusted
+            >>> importer(validate='unchecked')  # trust cache as is, no `stat()` at start-up (immutable install)
+
+            # only check directories at start-up, each file is checked right before it's first loaded
+            >>> importer(defer=True)
+
+            # record names used (hot set) & save it next to cache when program exits
+            >>> importer(hot='record')
+            # on later start-up load modules of recorded names
+            >>> importer(hot='eager')       # right away
+            >>> importer(hot='background')  # on background threads, `pkg.__WARMUP__.result()` to wait
+
+            # keep cache in another directory (also `DYNAMIC_IMPORT_CACHE` environment variable)
+            >>> importer(cache_dir='/var/cache/app')
+
+            # keep cache as memory-mapped hash index, each name is read from it on first use
+            >>> importer(index=True)
+
         Note:
             - `importer()` on first run will scan all the `.py` files for `__all__` or variables to later import them
                dynamically.
             - for production `importer(cache)` must be set to default `True` as cache is what makes the `importer()`
               fast and dynamic.
+            - `__pycache__` and hidden (".name") directories are never scanned.
+            - cache hit/miss (& why), scan and load timings are available as `pkg.__STATS__`, see `stats.py`
+            - if package directory is read-only (e.g. container image, root owned `site-packages`) cache is kept in
+              user cache directory instead, see `user_cache_dir()`
+            - package within bundle file of `DYNAMIC_IMPORT_BUNDLE` environment variable is loaded from it, see
+              `python3 -m dynamic_import build --bundle`
     '''
+    start = perf_counter()
     caller = _getframe(1).f_globals  # get info of where `importer()` is being called from
     # note: avoiding using `inspect` module as it was adding 300-800% slowdown on run-time
-    pkg_name = caller['__package__']
     file_path = caller['__file__']
     pkg_dir, init_file = split(file_path)  # '/path/pkg', '__init__.py'
+    # note: python3.9 `zipimport` runs `__init__.py` with `__package__` set to `None`
+    pkg_name = caller.get('__package__') or getattr(caller.get('__spec__'), 'parent', None)
     pkg_path = f'{pkg_dir}/'  # '/path/pkg' to '/path/pkg/'
 
     if not pkg_name or init_file != '__init__.py':
@@ -67,25 +124,55 @@ def importer(*, cache=True, recursive=True, exclude_file=None, exclude_dir=None)
 
     exclude_file_path = exclude_file_check(exclude_file, pkg_name, pkg_path)  # type: list
     exclude_dir_path = exclude_dir_check(exclude_dir, pkg_path, recursive)  # type: list
-    cache_path = pkg_cache_path(pkg_path, init_file, 'importer')  # type: str
+    workers = workers_check(workers)  # type: int
+    engine = engine_check(engine)  # type: str
+    validate = validate_check(validate)  # type: str
+    hot = hot_check(hot)  # type: Union[str, None]
+    cache_dir = cache_dir_check(cache_dir)  # type: Union[str, None]
+    stats = new_stats(pkg_name)
     if cache:
-        while True:
-            if exists(cache_path):
-                if info := load_cache(cache_path, recursive, exclude_file_path, exclude_dir_path, version):
-                    break
-                else:
-                    remove(cache_path)
-                    continue
-            else:
-                info, dir_mtime = prep_package(pkg_name, pkg_path, recursive, exclude_file_path, exclude_dir_path)
-                create_cache_dir(cache_path)
-                dump_cache(cache_path, info, recursive, exclude_file_path, exclude_dir_path, dir_mtime, version)
-                add_record(pkg_name, cache_path)
-                break
+        info, cache_dir = build_cache(pkg_name, pkg_path, init_file, recursive, exclude_file_path, exclude_dir_path,
+                                      workers, engine, validate, defer, cache_dir, stats, index,
+                                      environ.get(BUNDLE_ENV))
     else:
-        if exists(cache_path):
-            remove(cache_path)
-        info, _ = prep_package(pkg_name, pkg_path, recursive, exclude_file_path, exclude_dir_path)
+        for func_name in ('importer', 'index'):
+            try:
+                remove(pkg_cache_path(pkg_path, init_file, func_name, cache_dir))
+            except OSError:
+                pass  # note: missing or read-only.
+        scan = perf_counter()
+        info, _ = prep_package(pkg_name, pkg_path, recursive, exclude_file_path, exclude_dir_path,
+                               workers, None, engine, validate)
+        stats_event(stats, 'scan', perf_counter() - scan, names=len(info), reused=0)
 
     module = modules.get(pkg_name)
-    modules[pkg_name] = Module(pkg_name, info, module)
+    modules[pkg_name] = new_module = Module(pkg_name, info, module)
+    new_module.__STATS__ = stats
+    # note: `import pkg` from another thread while `__init__.py` is still running can return original
+    #       module object (taken from `sys.modules` before waiting for import to finish), so its made to
+    #       forward names to `Module` (PEP 562).
+    module.__getattr__ = new_module.__getattr__
+    module.__dir__ = new_module.__dir__
+    if defer and validate != 'unchecked':
+        new_module.__CHECK__ = (validate, engine)
+
+    if hot:
+        hot_path = pkg_cache_path(pkg_path, init_file, 'hot', cache_dir)  # type: str
+        if not (cache_dir or cache_writable(hot_path)):
+            hot_path = pkg_cache_path(pkg_path, init_file, 'hot', user_cache_dir())
+        if hot == 'record':
+            new_module.__HOT__ = []
+            try:
+                create_cache_dir(hot_path)
+            except OSError:
+                pass  # note: hot set is not recorded.
+            else:
+                add_record(pkg_name, hot_path)
+                register(dump_hot, hot_path, new_module.__HOT__, version)
+        elif names := load_hot(hot_path, version, info):
+            if hot == 'eager':
+                for name in warmup_names(info, pkg_name, names).values():
+                    getattr(new_module, name)
+            else:
+                new_module.__warmup__(names)
+    stats_event(stats, 'importer', perf_counter() - start)
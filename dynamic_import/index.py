@@ -0,0 +1,447 @@
+from zlib import crc32
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from marshal import dumps, loads
+from threading import Lock
+from collections.abc import MutableMapping
+from .cache import MARSHAL_VERSION, write_file, cache_id, cache_key, cache_outdated, cache_changed, stamp_kind
+from .stats import stats_event
+
+
+__all__ = 'INDEX_MAGIC', 'BUNDLE_MAGIC', 'BUNDLE_ENV', 'HEADER', 'Index', 'dump_index', 'index_pack', 'index_open', \
+          'load_index', 'index_check', 'index_outdated', 'index_files', 'dump_bundle', 'load_bundle', 'bundle_open'
+# memory-mapped cache, used by `importer(index=True)`, name is looked up without loading whole cache.
+#   header:  magic, number of files, names & hash slots, offset of each section & end (from start of index)
+#   meta:    marshal of `(version, recursive, exclude_file, exclude_dir, dir_mtime, validate)`
+#   offsets: start of each file entry & end of last one
+#   entries: marshal of `(module_name, file_path, variables, stamp)` of each file
+#   slots:   open addressing hash table (`crc32` of name, linear probing), record number + 1 or 0 if empty
+#   records: name offset & size within string table, file entry number
+#   strings: "\0" joined names (utf-8), in record order
+#   files:   marshal of per file extraction result, only read when package needs to be scanned again
+INDEX_MAGIC = b'DIX1'
+HEADER = Struct('<4s3I8Q')
+SLOT = Struct('<I')
+RECORD = Struct('<3I')
+ENTRY = Struct('<2Q')  # note: start of entry & start of next one (end)
+# one file holding indexes of many packages, created by `python -m dynamic_import build --bundle`
+#   header:  magic, size of table
+#   table:   marshal of `{cache_key(pkg_path): (offset, size)}`, offset is from end of table
+#   indexes: each package index, as is
+BUNDLE_MAGIC = b'DIB1'
+BUNDLE_HEADER = Struct('<4sQ')
+# environment variable of bundle file indexes are looked up in first, e.g: `DYNAMIC_IMPORT_BUNDLE=/app/app.idx`
+BUNDLE_ENV = 'DYNAMIC_IMPORT_BUNDLE'
+BUNDLES = {}  # e.g. {'/app/app.idx': ((1234567, 1234500000000), mmap, {'pkg-5f0b6c3a1e2d4f78': (0, 4096)})}
+BUNDLE_LOCK = Lock()
+
+
+class Index(MutableMapping):
+
+    __slots__ = 'mm', 'base', 'files', 'names', 'slots', 'meta', 'offsets', 'data', 'table', 'records', 'strings', \
+                'extracted', 'end', 'entries', 'changed', 'removed'
+
+    def __init__(self, mm, base=0):
+        ''' Read-only mapping of memory-mapped cache, used same as `info` dict
+
+            Type
+                mm:     mmap.mmap
+                base:   int
+                return: None
+
+            Example
+                >>> info = Index(index_open('/path/pkg/__pycache__/__init__.index-312.pyc'))
+                >>> 'one' in info
+                True
+                >>> info['one']
+                ('pkg.one', '/path/pkg/one.py', ('one',), (1234500000000, 15))
+
+            Note
+                - `base` is where index starts within `mm`, used by bundle.
+                - each file entry is read on first use of one of its names & kept in `entries`
+                - names set or removed by `refresh_info()` are kept in `changed` & `removed`, file is never written.
+        '''
+        magic, self.files, self.names, self.slots, *offsets = HEADER.unpack_from(mm, base)
+        if magic != INDEX_MAGIC or base + offsets[-1] > len(mm):
+            raise ValueError('not an index or its cut short')
+        self.meta, self.offsets, self.data, self.table, self.records, self.strings, self.extracted, self.end = \
+            (base + offset for offset in offsets)
+        self.mm = mm
+        self.base = base
+        self.entries = {}
+        self.changed = {}
+        self.removed = set()
+
+    def __getitem__(self, name):
+        if (entry := self.changed.get(name)) is not None:
+            return entry
+        elif name in self.removed or (file_id := self.find(name)) is None:
+            raise KeyError(name)
+        return self.entry(file_id)
+
+    def __contains__(self, name):
+        if name in self.changed:
+            return True
+        return name not in self.removed and self.find(name) is not None
+
+    def __setitem__(self, name, entry):
+        self.changed[name] = entry
+        self.removed.discard(name)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.changed.pop(name, None)
+        if self.find(name) is not None:
+            self.removed.add(name)
+
+    def __iter__(self):
+        if not (self.changed or self.removed):
+            return iter(self.all_names())
+        removed = self.removed | self.changed.keys()
+        return iter((*(name for name in self.all_names() if name not in removed), *self.changed))
+
+    def __len__(self):
+        if not (self.changed or self.removed):
+            return self.names
+        return sum(1 for _ in self)
+
+    def all_names(self):
+        ''' All names within index, in order they were cached
+
+            Type
+                return: List[str]
+        '''
+        if not self.names:
+            return []
+        return self.mm[self.strings:self.extracted].decode(errors='surrogatepass').split('\0')
+
+    def find(self, name):
+        ''' Look up name, without reading any other name
+
+            Type
+                name:   str
+                return: Union[int, None]
+
+            Example
+                >>> info.find('one')
+                0
+
+            Note
+                - returns file entry number of name, `None` if its not within index.
+        '''
+        if not isinstance(name, str):
+            return None
+        key = name.encode(errors='surrogatepass')
+        mask = self.slots - 1
+        slot = crc32(key) & mask
+        while record := SLOT.unpack_from(self.mm, self.table + slot * SLOT.size)[0]:
+            offset, size, file_id = RECORD.unpack_from(self.mm, self.records + (record - 1) * RECORD.size)
+            if size == len(key) and self.mm[self.strings + offset:self.strings + offset + size] == key:
+                return file_id
+            slot = (slot + 1) & mask
+        return None
+
+    def entry(self, file_id):
+        ''' `(module_name, file_path, variables, stamp)` of file entry
+
+            Type
+                file_id: int
+                return:  Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes, None]]
+        '''
+        if (entry := self.entries.get(file_id)) is None:
+            start, end = ENTRY.unpack_from(self.mm, self.offsets + file_id * 8)
+            # note: another thread could read same entry at the same time, either one is kept.
+            entry = self.entries[file_id] = loads(self.mm[self.base + start:self.base + end])
+        return entry
+
+    def modules(self):
+        ''' Every file entry, used to check each file is unchanged
+
+            Type
+                return: Dict[int, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes, None]]]
+        '''
+        return {file_id: self.entry(file_id) for file_id in range(self.files)}
+
+    def options(self):
+        ''' `(version, recursive, exclude_file, exclude_dir, dir_mtime, validate)` index was created with '''
+        return loads(self.mm[self.meta:self.offsets])
+
+    def extraction(self):
+        ''' Per file extraction result, see `dump_cache(files)` '''
+        return loads(self.mm[self.extracted:self.end])
+
+
+def dump_index(cache_path, data, recursive, exclude_file, exclude_dir, dir_mtime, version, files=None,
+               validate='mtime_ns'):
+    ''' Create index cache file, takes same arguments as `dump_cache()`
+
+        Type
+            cache_path:   str
+            data:         Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            dir_mtime:    Dict[str, Union[int, bytes]]
+            version:      str
+            files:        Dict[str, Tuple[str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            validate:     str
+            return:       None
+
+        Example
+            >>> dump_index('/path/pkg/__pycache__/__init__.index-312.pyc', ...)
+    '''
+    write_file(cache_path, index_pack(data, (version, recursive, exclude_file, exclude_dir, dir_mtime, validate),
+                                      files or {}))
+
+
+def index_pack(data, meta, files):
+    ''' Index file content
+
+        Type
+            data:   Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            meta:   Tuple[str, bool, List[str], List[str], Dict[str, Union[int, bytes]], str]
+            files:  Dict[str, Tuple[str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            return: bytes
+
+        Note
+            - names of same file share one entry, hash table is at most half full.
+    '''
+    entries = {}  # file path: (file entry number, marshal of entry)
+    records = []
+    for name, entry in data.items():
+        if (file_id := entries.get(entry[1])) is None:
+            file_id = entries[entry[1]] = len(entries), dumps(entry, MARSHAL_VERSION)
+        records.append((name.encode(errors='surrogatepass'), file_id[0]))
+
+    size = 8
+    while size < len(records) * 2:
+        size *= 2
+    slots = [0] * size
+    packed = []
+    offset = 0
+    for number, (key, file_id) in enumerate(records, 1):
+        slot = crc32(key) & (size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = number
+        packed.append(RECORD.pack(offset, len(key), file_id))
+        offset += len(key) + 1
+
+    meta = dumps(meta, MARSHAL_VERSION)
+    offsets = []
+    start = HEADER.size + len(meta) + (len(entries) + 1) * 8
+    for _, entry in entries.values():
+        offsets.append(start)
+        start += len(entry)
+    offsets.append(start)
+    sections = (meta,
+                Struct(f'<{len(offsets)}Q').pack(*offsets),
+                b''.join(entry for _, entry in entries.values()),
+                Struct(f'<{size}I').pack(*slots),
+                b''.join(packed),
+                b'\0'.join(key for key, _ in records),
+                dumps(files, MARSHAL_VERSION))
+    header = []
+    start = HEADER.size
+    for section in sections:
+        header.append(start)
+        start += len(section)
+    header.append(start)
+    return b''.join((HEADER.pack(INDEX_MAGIC, len(entries), len(records), size, *header), *sections))
+
+
+def index_open(cache_path):
+    ''' Memory-map file
+
+        Type
+            cache_path: str
+            return:     mmap.mmap
+
+        Note
+            - mapping stays valid after file is replaced by newer cache, see `write_file()`
+    '''
+    with open(cache_path, 'rb') as file:
+        return mmap(file.fileno(), 0, access=ACCESS_READ)
+
+
+def load_index(cache_path, recursive, exclude_file, exclude_dir, version, validate='mtime_ns', defer=False,
+               stats=None):
+    ''' Load index cache file, takes same arguments as `load_cache()`
+
+        Type
+            cache_path:   str
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            version:      str
+            validate:     str
+            defer:        bool
+            stats:        Union[Dict[str, any], None]
+            return:       Union[Index, None]
+
+        Example
+            >>> load_index('/path/pkg/__pycache__/__init__.index-312.pyc', ...)
+            <dynamic_import.index.Index object at 0x...>
+    '''
+    data, reason = index_check(cache_path, recursive, exclude_file, exclude_dir, version, validate, defer)
+    if reason is not None and stats is not None:
+        stats_event(stats, 'cache_miss', reason=reason[0], path=reason[1])
+    return data
+
+
+def index_check(cache_path, recursive, exclude_file, exclude_dir, version, validate='mtime_ns', defer=False):
+    ''' Load index cache file & reason it was rejected, same as `cache_check()`
+
+        Type
+            cache_path:   str
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            version:      str
+            validate:     str
+            defer:        bool
+            return:       Tuple[Union[Index, None], Union[Tuple[str, Union[str, None]], None]]
+    '''
+    try:
+        index = Index(index_open(cache_path))
+        if (reason := index_outdated(index, recursive, exclude_file, exclude_dir, version, validate, defer)) is None:
+            return index, None
+    except Exception:
+        reason = 'error', cache_path
+    return None, reason
+
+
+def index_outdated(index, recursive, exclude_file, exclude_dir, version, validate='mtime_ns', defer=False):
+    ''' Reason index is no longer valid
+
+        Type
+            index:        Index
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            version:      str
+            validate:     str
+            defer:        bool
+            return:       Union[Tuple[str, Union[str, None]], None]
+
+        Note
+            - every file entry is read to check its file, unless `defer` or "unchecked" is used.
+    '''
+    cached_version, cached_recursive, cached_exclude_file, cached_exclude_dir, dir_mtime, cached_validate = \
+        index.options()
+    reason = cache_outdated((cached_version, cached_recursive, cached_exclude_file, cached_exclude_dir,
+                             cached_validate), (version, recursive, exclude_file, exclude_dir, validate))
+    if reason is None and validate != 'unchecked':
+        reason = cache_changed(dir_mtime, {} if defer else index.modules(), validate, defer)
+    return reason
+
+
+def index_files(cache_path, version, validate='mtime_ns'):
+    ''' Load per file extraction result from index cache file, same as `load_files()`
+
+        Type
+            cache_path: str
+            version:    str
+            validate:   str
+            return:     Dict[str, Tuple[str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+    '''
+    try:
+        index = Index(index_open(cache_path))
+        options = index.options()
+        if options[0] == version and stamp_kind(options[5]) == stamp_kind(validate):
+            return index.extraction()
+    except Exception:
+        pass
+    return {}
+
+
+def dump_bundle(bundle_path, cache_paths):
+    ''' Combine index cache files of many packages into one file
+
+        Type
+            bundle_path: str
+            cache_paths: Dict[str, str]
+            return:      None
+
+        Example
+            >>> dump_bundle('/app/app.idx', {'/path/pkg/': '/path/pkg/__pycache__/__init__.index-312.pyc', ...})
+
+        Note
+            - `cache_paths` maps package path to its index cache file, raises `ValueError` if its not an index.
+    '''
+    indexes = {}
+    for pkg_path, cache_path in cache_paths.items():
+        with open(cache_path, 'rb') as file:
+            indexes[cache_key(pkg_path)] = content = file.read()
+        if content[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f'{cache_path!r} is not an index cache, see `importer(index)`')
+    table = {}
+    offset = 0
+    for key, content in indexes.items():
+        table[key] = offset, len(content)
+        offset += len(content)
+    table = dumps(table, MARSHAL_VERSION)
+    write_file(bundle_path, b''.join((BUNDLE_HEADER.pack(BUNDLE_MAGIC, len(table)), table, *indexes.values())))
+
+
+def load_bundle(bundle_path, pkg_path, recursive, exclude_file, exclude_dir, version, validate='mtime_ns',
+                defer=False, stats=None):
+    ''' Load index of package from bundle file
+
+        Type
+            bundle_path:  str
+            pkg_path:     str
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            version:      str
+            validate:     str
+            defer:        bool
+            stats:        Union[Dict[str, any], None]
+            return:       Union[Index, None]
+
+        Example
+            # `DYNAMIC_IMPORT_BUNDLE=/app/app.idx`
+            >>> load_bundle('/app/app.idx', '/path/pkg/', ...)
+            <dynamic_import.index.Index object at 0x...>
+
+        Note
+            - returns `None` if package is not within bundle, reason its index was rejected is reported as
+              "cache_miss" event into `stats` & package cache is used instead.
+    '''
+    try:
+        mm, table = bundle_open(bundle_path)
+        if (found := table.get(cache_key(pkg_path))) is None:
+            return None
+        index = Index(mm, found[0])
+        reason = index_outdated(index, recursive, exclude_file, exclude_dir, version, validate, defer)
+    except Exception:
+        index = None
+        reason = 'error', bundle_path
+    if reason is None:
+        return index
+    if stats is not None:
+        stats_event(stats, 'cache_miss', reason=reason[0], path=reason[1])
+    return None
+
+
+def bundle_open(bundle_path):
+    ''' Memory-map bundle file & read its table, once per process unless file is replaced
+
+        Type
+            bundle_path: str
+            return:      Tuple[mmap.mmap, Dict[str, Tuple[int, int]]]
+    '''
+    file_id = cache_id(bundle_path)
+    with BUNDLE_LOCK:
+        if (bundle := BUNDLES.get(bundle_path)) is None or bundle[0] != file_id:
+            mm = index_open(bundle_path)
+            magic, size = BUNDLE_HEADER.unpack_from(mm)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f'{bundle_path!r} is not a bundle')
+            start = BUNDLE_HEADER.size + size
+            table = {key: (start + offset, size) for key, (offset, size) in
+                     loads(mm[BUNDLE_HEADER.size:start]).items()}
+            bundle = BUNDLES[bundle_path] = file_id, mm, table
+    return bundle[1], bundle[2]
@@ -0,0 +1,202 @@
+from sys import intern
+from array import array
+from itertools import repeat
+from collections.abc import MutableMapping
+from .special import special
+
+
+__all__ = 'Record', 'Info', 'pack_info', 'unpack_info'
+
+
+class Record:
+
+    __slots__ = 'number', 'module', 'path', 'variables'
+
+    def __init__(self, number, module, path, variables):
+        ''' Source module that defines names, shared by all of them
+
+            Type
+                number:    int
+                module:    str
+                path:      Union[str, None]
+                variables: Union[List[str], Tuple[str]]
+                return:    None
+
+            Note
+                - `number` is position of its stamp within `Info`
+        '''
+        self.number = number
+        self.module = module
+        self.path = path
+        self.variables = variables
+
+
+class Info(MutableMapping):
+
+    __slots__ = 'names', 'mtimes', 'sizes', 'stamps', 'last'
+
+    def __init__(self, data=None):
+        ''' Compact name to source module mapping, used same as `info` dict
+
+            Type
+                data:   Union[Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]],
+                              None]
+                return: None
+
+            Example
+                >>> info = Info()
+                >>> info.add('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15))
+                >>> info['one']
+                ('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15))
+
+                >>> Info({'one': ('pkg.one', '/path/pkg/one.py', ('one',), (1234500000000, 15))})
+
+            Note
+                - each name points to `Record` of its module, instead of a tuple per name repeating it.
+                - `(mtime_ns, size)` stamps are kept in `array`, other stamps (content hash or `None`) in `stamps`
+                - entry is created on each access, so it can be unpacked same as `dict` value.
+        '''
+        self.names = {}  # e.g. {'one': Record, 'ONE': Record}
+        self.mtimes = array('q')
+        self.sizes = array('q')
+        self.stamps = {}  # e.g. {0: b'\x8e\x1f...'}
+        self.last = None  # note: consecutive names of same module share its `Record`, see `__setitem__()`
+        if data:
+            self.update(data)
+
+    def __getitem__(self, name):
+        record = self.names[name]
+        return record.module, record.path, record.variables, self.stamp(record.number)
+
+    def get(self, name, default=None):
+        if (record := self.names.get(name)) is None:
+            return default
+        return record.module, record.path, record.variables, self.stamp(record.number)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __setitem__(self, name, entry):
+        module, path, variables, stamp = entry
+        if (last := self.last) is None or last.variables is not variables or last.module != module or \
+                last.path != path or self.stamp(last.number) != stamp:
+            last = self.record(module, path, variables, stamp)
+        self.names[name] = last
+
+    def __delitem__(self, name):
+        del self.names[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def record(self, module, path, variables, stamp):
+        ''' New `Record`, used by next names that are set
+
+            Type
+                module:    str
+                path:      Union[str, None]
+                variables: Union[List[str], Tuple[str]]
+                stamp:     Union[Tuple[int, int], bytes, None]
+                return:    Record
+        '''
+        number = len(self.mtimes)
+        if type(stamp) is tuple:
+            self.mtimes.append(stamp[0])
+            self.sizes.append(stamp[1])
+        else:
+            self.mtimes.append(0)
+            self.sizes.append(0)
+            self.stamps[number] = stamp
+        self.last = Record(number, module, path, variables)
+        return self.last
+
+    def stamp(self, number):
+        ''' Stamp of `Record` number
+
+            Type
+                number: int
+                return: Union[Tuple[int, int], bytes, None]
+        '''
+        if number in self.stamps:
+            return self.stamps[number]
+        return self.mtimes[number], self.sizes[number]
+
+    def add(self, module, path, variables, stamp):
+        ''' Add names defined by module
+
+            Type
+                module:    str
+                path:      Union[str, None]
+                variables: Union[List[str], Tuple[str]]
+                stamp:     Union[Tuple[int, int], bytes, None]
+                return:    None
+
+            Example
+                >>> info.add('pkg.one', '/path/pkg/one.py', ['one', '__version__'], (1234500000000, 15))
+
+            Note
+                - special names (e.g. `__version__`) are skipped, name already added is replaced.
+                - names are interned, so they are shared with `Module` attributes once loaded.
+        '''
+        variables = type(variables)(map(intern, variables))
+        record = self.record(intern(module), path, variables, stamp)
+        self.names.update(zip(special(variables), repeat(record)))
+
+    def modules(self):
+        ''' Entry of each `Record` names still point to, used to check each file is unchanged
+
+            Type
+                return: Dict[int, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes, None]]]
+        '''
+        records = {record.number: record for record in self.names.values()}
+        return {number: (record.module, record.path, record.variables, self.stamp(number))
+                for number, record in records.items()}
+
+
+def pack_info(info):
+    ''' Marshal friendly form of `Info`, see `unpack_info()`
+
+        Type
+            info:   Info
+            return: Tuple[Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes], Tuple[str]]]
+
+        Example
+            >>> pack_info(info)
+            (('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15), ('one', 'ONE')), ...)
+
+        Note
+            - one item per run of names that share `Record`, in order names were added.
+            - names are `variables` itself when they are the same, so marshal only stores it once.
+    '''
+    r = []
+    run = []
+    last = None
+    for name, record in (*info.names.items(), (None, None)):
+        if record is not last:
+            if last is not None:
+                variables = last.variables
+                if len(run) == len(variables) and all(map(str.__eq__, run, variables)):
+                    run = variables
+                r.append((last.module, last.path, variables, info.stamp(last.number),
+                          run if run is variables else tuple(run)))
+            last = record
+            run = []
+        run.append(name)
+    return tuple(r)
+
+
+def unpack_info(packed):
+    ''' Create `Info` from `pack_info()` result
+
+        Type
+            packed: Tuple[Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes], Tuple[str]]]
+            return: Info
+    '''
+    info = Info()
+    names = info.names
+    for module, path, variables, stamp, run in packed:
+        names.update(zip(run, repeat(info.record(module, path, variables, stamp))))
+    return info
@@ -1,30 +1,63 @@
+from gc import collect, freeze, get_freeze_count
+from sys import modules
+from threading import Lock, RLock
 from types import ModuleType
-from importlib.util import spec_from_loader, module_from_spec
-from importlib.machinery import SourceFileLoader, ExtensionFileLoader
-from .prep import EXT_SUFFIX
+from time import perf_counter
+from importlib import import_module
+from .prep import prep_extract
+from .cache import file_stamp
+from .special import special
+from .stats import new_stats, stats_event
 
 
-__all__ = 'Module',
+__all__ = 'MODULE_LOCKS', 'WARMUP_WORKERS', 'Module', 'refresh_info', 'warmup_names', 'warmup', 'prefork', \
+          'module_lock'
+# lock per source module name, shared by all `Module` of the (sub-)interpreter.
+# note: module global so each (sub-)interpreter has its own.
+MODULE_LOCKS = {}
+REFRESH_LOCK = Lock()  # guards `Module.__INFO__` while its being updated.
+WARMUP_WORKERS = 4  # default number of threads `Module.__warmup__()` loads modules with.
 
 
 class Module(ModuleType):
 
-    __slots__ = '__PACKAGE__', '__INFO__'
+    __slots__ = '__PACKAGE__', '__INFO__', '__CHECK__', '__MODULE__', '__HOT__', '__WARMUP__', '__STATS__'
 
     def __init__(self, package, info, module, *args, **kwargs):
         ''' Dynamic import module
 
             Type
                 package: str
-                info:    Dict[str, Tuple[str, str, Union[List[str], Tuple[str]]]]
+                info:    Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
                 module:  sys
                 args:    Tuple[any]
                 kwargs:  Dict[str, any]
                 return:  None
+
+            Note
+                - `info` is `Info` (see `info.py`) or `Index` when `importer(index=True)` is used, each name is
+                  then looked up within memory-mapped cache file on first use, see `index.py`
+                - names are dropped from `info` once their module is loaded, as their value is in `__dict__`
+                - `__all__` (& `dir()`) is only listed on first use, not while package is imported.
+                - `__CHECK__` is set to `(validate, engine)` by `importer(defer=True)` so each file is
+                  checked (and re-extracted if changed) right before it's first loaded.
+                - `__MODULE__` is the original package module, names defined in `__init__.py` are
+                  taken from it instead of running `__init__.py` again.
+                - concurrent first access of names from the same source module waits for a single
+                  load by import system, no lock of its own is held while module code runs.
+                - `__HOT__` is set to a `list` by `importer(hot='record')`, each name is appended to it
+                  in order of first use.
+                - `__WARMUP__` is future of last `__warmup__()` call.
+                - `__STATS__` holds counters & timings, see `new_stats()`
         '''
         super().__init__(package, None, *args, **kwargs)
         self.__PACKAGE__ = package
         self.__INFO__ = info
+        self.__CHECK__ = None
+        self.__MODULE__ = module
+        self.__HOT__ = None
+        self.__WARMUP__ = None
+        self.__STATS__ = new_stats(package)
         # note: ^ these needs to mimic magic method name since those are made to raise error
 
         # only include special name from previous module, all other names should be
@@ -32,7 +65,16 @@ class Module(ModuleType):
         for key, value in module.__dict__.items():
             if (key[0:2] == '__' == key[-2:]) and (key[2] != '_' != key[-3]):
                 self.__dict__[key] = value  # only update `__special__` names
-        setattr(self, '__all__', (*self.__dict__, *self.__INFO__))
+        # note: `__all__` is set on first use (see `__getattr__`), listing names of `Index` decodes each one.
+        self.__dict__.pop('__all__', None)
+
+    def __setattr__(self, name, value):
+        # note: import system sets sub-module as attribute of its parent package, exported name of same
+        #       name (loaded or not) is kept instead, e.g. `pkg/one.py` that defines `one()`
+        if isinstance(value, ModuleType) and value.__name__ == f'{self.__PACKAGE__}.{name}' and \
+                (name in self.__INFO__ or name in self.__dict__):
+            return None
+        super().__setattr__(name, value)
 
     def __dir__(self):
         '''
@@ -46,6 +88,53 @@ class Module(ModuleType):
         '''
         return self.__all__
 
+    def __warmup__(self, names=None, workers=WARMUP_WORKERS):
+        ''' Load modules in the background, before their names are first used
+
+            Type
+                names:   Union[None, str, List[str], Tuple[str]]
+                workers: int
+                return:  concurrent.futures.Future
+
+            Example
+                >>> import pkg
+                >>> future = pkg.__warmup__()                # all modules
+                >>> future = pkg.__warmup__('sub')           # modules inside `pkg/sub/`
+                >>> future = pkg.__warmup__(['one', 'two'])  # modules that define `one` & `two`
+                >>> future.result()                          # wait till done
+                ['pkg.one', 'pkg.sub.two']
+
+            Note
+                - names are reduced to their source module, each module is loaded once.
+                - loading goes through `__getattr__` so it's safe to use names while warming up.
+                - future raises first error any module raised while loading.
+        '''
+        self.__WARMUP__ = warmup(self, warmup_names(self.__INFO__, self.__PACKAGE__, names, self.__dict__), workers)
+        return self.__WARMUP__
+
+    def __prefork__(self, names=None, freeze=True):
+        ''' Load modules right away & freeze them before forking worker processes
+
+            Type
+                names:  Union[None, str, List[str], Tuple[str]]
+                freeze: bool
+                return: Dict[str, Union[int, List[str]]]
+
+            Example
+                # gunicorn.conf.py
+                >>> def on_starting(server):
+                ...     import pkg
+                ...     pkg.__prefork__()  # all modules, or same `names` as `__warmup__()`
+                {'loaded': ['pkg.one', ...], 'modules': 42, 'bytes': 1234567, 'frozen': 98765}
+
+            Note
+                - "modules" counts all new `sys.modules` entries, including ones loaded modules import.
+                - "bytes" is memory allocated while loading, measured using `tracemalloc`.
+                - "frozen" is number of objects moved into permanent generation by `gc.freeze()`, so
+                  garbage collector in forked worker does not touch them & break copy-on-write sharing.
+        '''
+        return prefork(self, warmup_names(self.__INFO__, self.__PACKAGE__, names, self.__dict__), freeze)
+
     def __getattr__(self, name):
         '''
             Type
@@ -60,25 +149,271 @@ class Module(ModuleType):
                 >>> import pkg
                 >>> pkg.one()
         '''
-        if name in self.__INFO__:
-            module_name, module_path, variables, _ = self.__INFO__[name]
-            if module_path.endswith(EXT_SUFFIX[0]):  # e.g: '.py'
-                loader = SourceFileLoader(module_name, module_path)
-            elif module_path.endswith(EXT_SUFFIX[1:]):  # e.g: '.cpython-312-x86_64-linux-gnu.so'
-                loader = ExtensionFileLoader(module_name, module_path)
+        if (entry := self.__INFO__.get(name)) is not None:
+            start = perf_counter()
+            if self.__CHECK__:
+                # note: only file check is done while holding module lock, no module code runs within it.
+                with module_lock(entry[0]):
+                    if name in self.__dict__:
+                        return self.__dict__[name]  # loaded by another thread while waiting.
+                    elif name not in self.__INFO__:
+                        return getattr(self, name)  # removed by another thread's `refresh_info()`
+                    elif not refresh_info(self.__INFO__, name, *self.__CHECK__):
+                        if '__all__' in self.__dict__:
+                            names = (*(i for i in self.__all__ if i in self.__dict__), *self.__INFO__)
+                            setattr(self, '__all__', tuple(dict.fromkeys(names)))
+                        return getattr(self, name)
+                    entry = self.__INFO__[name]
+            module_name, _, variables, _ = entry
+            if module_name == self.__PACKAGE__:
+                module = self.__MODULE__  # e.g. names defined in `pkg/__init__.py`
             else:
-                raise NotImplementedError(f'`Module()` {module_path!r} extension type.')
-            spec = spec_from_loader(loader.name, loader)
-            module = module_from_spec(spec)
-            loader.exec_module(module)
+                # note: loaded through import system, which finds module using `__path__` of parent package
+                #       (`Module` has same `__path__` as package) & makes concurrent loads wait for a single one.
+                try:
+                    module = import_module(module_name)
+                except RuntimeError:
+                    # note: import system's module lock detected deadlock, module being loaded by another
+                    #       thread is waiting for module this thread is loading (circular import). Partially
+                    #       loaded module is used instead, same as import system does for `import` statement.
+                    module = modules.get(module_name)
+                    if not getattr(getattr(module, '__spec__', None), '_initializing', False):
+                        raise
 
             # add all the variables found in modules `__all__` into `self`
+            # note: package module's own names are read from its `__dict__`, as its `__getattr__` forwards
+            #       missing names back to this `Module`.
+            found = module.__dict__ if module_name == self.__PACKAGE__ else None
+            loaded = []
             for var in variables:
-                setattr(self, var, getattr(module, var))
-            return getattr(self, name)
+                try:
+                    self.__dict__[var] = getattr(module, var) if found is None else found[var]
+                except (AttributeError, KeyError):
+                    continue  # note: not defined (yet), e.g. module is still being loaded (circular import)
+                loaded.append(var)
+            if name not in self.__dict__:
+                if getattr(getattr(module, '__spec__', None), '_initializing', False):
+                    error = f'cannot import name {name!r} from partially initialized module {module_name!r} ' \
+                            '(most likely due to a circular import)\n'
+                else:
+                    error = f'module {module_name!r} has no attribute {name!r}\n'
+                raise AttributeError(error)
+            # note: loaded names are only read from `__dict__` from now on, dropping them keeps
+            #       `__INFO__` down to modules that are not loaded yet.
+            with REFRESH_LOCK:
+                first = name in self.__INFO__  # e.g. not loaded by another thread at the same time.
+                for var in special(loaded):
+                    self.__INFO__.pop(var, None)
+            if first:
+                if self.__HOT__ is not None:
+                    self.__HOT__.append(name)
+                stats_event(self.__STATS__, 'load', perf_counter() - start, name=name, module=module_name)
+            return self.__dict__[name]
+        elif name == '__all__':
+            # note: sub-module set as attribute by import system is not an exported name.
+            package = f'{self.__PACKAGE__}.'
+            with REFRESH_LOCK:  # note: other threads drop names from `__INFO__` while loading.
+                names = (*(key for key, value in tuple(self.__dict__.items())
+                           if not (isinstance(value, ModuleType) and value.__name__ == f'{package}{key}')),
+                         *self.__INFO__)
+            setattr(self, '__all__', tuple(dict.fromkeys(names)))
+            return self.__all__
+        elif name in self.__dict__:
+            # note: original package module forwards its missing names here, including ones already loaded.
+            return self.__dict__[name]
         else:
             try:
                 return super().__getattr__(name)
             except AttributeError:
                 error = f'module {self.__PACKAGE__!r} has no attribute {name!r}\n'
                 raise AttributeError(error) from None
+
+
+def refresh_info(info, name, validate, engine):
+    ''' Check file `name` belongs to, re-extract its names if file has changed since it was cached
+
+        Type
+            info:     Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            name:     str
+            validate: str
+            engine:   str
+            return:   bool
+
+        Example
+            >>> refresh_info(info, 'one', 'mtime_ns', 'ast')
+            True
+
+            # file has changed & `one` was removed from it.
+            >>> refresh_info(info, 'one', 'mtime_ns', 'ast')
+            False
+
+        Note
+            - returns `True` if file is unchanged, `False` if `info` was updated in place.
+            - new name added to a file is only found once one of its already known names is used.
+    '''
+    module_name, module_path, variables, mtime = info[name]
+    try:
+        stamp = file_stamp(module_path, validate)
+    except OSError:
+        stamp = None  # file has been removed.
+    if stamp == mtime:
+        return True
+
+    if stamp is not None:
+        found = prep_extract(module_name, module_path, engine)
+    with REFRESH_LOCK:
+        for var in special(variables):
+            if info.get(var, (None, None))[1] == module_path:
+                del info[var]
+        if stamp is not None:
+            for var in special(found):
+                info[var] = (module_name, module_path, found, stamp)
+    return False
+
+
+def warmup_names(info, package, names=None, loaded=()):
+    ''' Map source module name to a name it defines, for modules that needs to be loaded
+
+        Type
+            info:    Dict[str, Tuple[str, str, Union[List[str], Tuple[str]], Union[Tuple[int, int], bytes]]]
+            package: str
+            names:   Union[None, str, List[str], Tuple[str]]
+            loaded:  Union[Dict[str, any], Tuple[str]]
+            return:  Dict[str, str]
+
+        Example
+            >>> warmup_names(info, 'pkg')
+            {'pkg.one': 'one', 'pkg.sub.two': 'two'}
+
+            >>> warmup_names(info, 'pkg', 'sub')  # or 'pkg.sub'
+            {'pkg.sub.two': 'two'}
+
+            >>> warmup_names(info, 'pkg', ['one', 'ONE'])
+            {'pkg.one': 'one'}
+
+        Note
+            - names defined in package `__init__.py` are skipped as its already loaded.
+            - names in `loaded` (e.g. `Module.__dict__`) are skipped, as they are dropped from `info` once loaded.
+    '''
+    if names is None or isinstance(names, str):
+        with REFRESH_LOCK:  # note: other threads drop names from `info` while loading.
+            found = [(name, entry[0]) for name, entry in info.items()]
+        if names is not None:
+            prefix = names if names.startswith(f'{package}.') else f'{package}.{names}'
+            found = [(name, module_name) for name, module_name in found
+                     if module_name == prefix or module_name.startswith(f'{prefix}.')]
+    else:
+        found = []
+        for name in names:
+            if (entry := info.get(name)) is not None:
+                found.append((name, entry[0]))
+            elif name not in loaded:
+                raise AttributeError(f'module {package!r} has no attribute {name!r}\n')
+
+    r = {}
+    for name, module_name in found:
+        if module_name != package:
+            r.setdefault(module_name, name)
+    return r
+
+
+def warmup(module, module_names, workers=WARMUP_WORKERS):
+    ''' Load each module by using one of its names on a thread pool
+
+        Type
+            module:       Module
+            module_names: Dict[str, str]
+            workers:      int
+            return:       concurrent.futures.Future
+
+        Example
+            >>> future = warmup(pkg, {'pkg.one': 'one', 'pkg.sub.two': 'two'}, 2)
+            >>> future.result()
+            ['pkg.one', 'pkg.sub.two']
+
+        Note
+            - returns right away, future result is list of module names once all are loaded.
+    '''
+    from concurrent.futures import Future, ThreadPoolExecutor  # note: not needed unless warming up.
+
+    if workers < 1:
+        raise ValueError(f'`__warmup__(workers)` received {workers!r} must be 1 or higher.')
+
+    future = Future()
+    if not module_names:
+        future.set_result([])
+        return future
+
+    lock = Lock()
+    pending = [len(module_names)]
+    errors = []
+
+    def done(result):
+        if (error := result.exception()) is not None:
+            errors.append(error)
+        with lock:
+            pending[0] -= 1
+            if pending[0]:
+                return
+        if errors:
+            future.set_exception(errors[0])
+        else:
+            future.set_result(list(module_names))
+
+    executor = ThreadPoolExecutor(min(workers, len(module_names)), f'{module.__PACKAGE__}-warmup')
+    for name in module_names.values():
+        executor.submit(getattr, module, name).add_done_callback(done)
+    executor.shutdown(wait=False)  # note: threads exit once all the modules are loaded.
+    return future
+
+
+def prefork(module, module_names, freeze_objects=True):
+    ''' Load each module by using one of its names, then freeze all objects
+
+        Type
+            module:         Module
+            module_names:   Dict[str, str]
+            freeze_objects: bool
+            return:         Dict[str, Union[int, List[str]]]
+
+        Example
+            >>> prefork(pkg, {'pkg.one': 'one', 'pkg.sub.two': 'two'})
+            {'loaded': ['pkg.one', 'pkg.sub.two'], 'modules': 3, 'bytes': 4096, 'frozen': 5678}
+    '''
+    from tracemalloc import is_tracing, start, stop, get_traced_memory
+
+    before = len(modules)
+    if tracing := not is_tracing():
+        start()
+    try:
+        size = get_traced_memory()[0]
+        for name in module_names.values():
+            getattr(module, name)
+        size = get_traced_memory()[0] - size
+    finally:
+        if tracing:
+            stop()
+    if freeze_objects:
+        collect()  # note: garbage left from loading would otherwise be frozen as well.
+        freeze()
+    return {'loaded': list(module_names), 'modules': len(modules) - before, 'bytes': size,
+            'frozen': get_freeze_count()}
+
+
+def module_lock(module_name):
+    ''' Lock of source module, used while its file is checked by `importer(defer=True)`, created on first use
+
+        Type
+            module_name: str
+            return:      threading.RLock
+
+        Example
+            >>> with module_lock('pkg.sub.module'):
+            ...     ...
+
+        Note
+            - never held while module code runs, loading itself is guarded by import system's module lock.
+    '''
+    if (lock := MODULE_LOCKS.get(module_name)) is None:
+        lock = MODULE_LOCKS.setdefault(module_name, RLock())  # note: only one lock wins race.
+    return lock
@@ -0,0 +1,145 @@
+from os import cpu_count
+from sys import platform
+from itertools import repeat
+from threading import active_count
+from multiprocessing import get_context, get_all_start_methods, TimeoutError as MultiprocessingTimeoutError
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .extract import parse_variable, extract_so_variable
+
+
+__all__ = 'MIN_FILES', 'SO_TIMEOUT', 'pool_workers', 'pool_fork', 'pool_context', 'pool_read', 'pool_variables', \
+          'pool_so_variables'
+MIN_FILES = 32  # below this many `.py` files starting a process pool costs more than it saves.
+SO_TIMEOUT = 60  # seconds extension module is given to import inside worker process.
+
+
+def pool_workers(workers):
+    ''' Normalize number of workers
+
+        Type
+            workers: int
+            return:  int
+
+        Example
+            >>> pool_workers(4)
+            4
+
+            >>> pool_workers(0)  # use all available cores
+            8
+    '''
+    if workers < 0:
+        raise ValueError(f'`importer(workers)` received {workers!r} must be 0 or higher.')
+    return workers or cpu_count() or 1
+
+
+def pool_fork():
+    ''' Worker processes can be started using "fork"
+
+        Type
+            return: bool
+
+        Example
+            >>> pool_fork()  # Linux, no other thread running
+            True
+
+        Note
+            - only used on Linux, macOS default is "spawn" (since python3.8) as its system libraries are not
+              safe to use in forked child.
+            - not used while other threads are running (e.g. `importer()` called within threaded server), child
+              only has copy of forking thread & lock held by any other thread stays locked in it forever.
+            - when `False` names are extracted in current process one file at a time instead, slower for large
+              package but cache is only created once.
+    '''
+    return platform == 'linux' and active_count() == 1 and 'fork' in get_all_start_methods()
+
+
+def pool_context():
+    ''' Multiprocessing context used by the process pool
+
+        Type
+            return: multiprocessing.context.BaseContext
+
+        Note
+            - "fork" is used since `spawn` & `forkserver` re-import `__main__` inside
+              the worker, which would call `importer()` again while it's still scanning.
+              Pool is only used when `pool_fork()` is `True`
+    '''
+    return get_context('fork')
+
+
+def pool_read(path):
+    ''' Read source file content (ran inside thread pool)
+
+        Type
+            path:   str
+            return: bytes
+    '''
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def pool_variables(file_paths, workers, engine='ast'):
+    ''' Extract variables from `.py` files in parallel
+
+        Type
+            file_paths: List[str]
+            workers:    int
+            engine:     str
+            return:     List[Union[List[str], Tuple[str]]]
+
+        Example
+            >>> pool_variables(['/path/pkg/one.py', '/path/pkg/two.py'], 4)
+            [('one',), ['two', 'TWO']]
+
+        Note
+            - source files are read on a thread pool and parsed on a process pool.
+            - result is in the same order as `file_paths` so merging it is deterministic.
+            - files are extracted serially when "fork" can not be used, see `pool_fork()`
+    '''
+    if not pool_fork():
+        return [parse_variable(pool_read(file_path), file_path, engine) for file_path in file_paths]
+
+    workers = min(workers, len(file_paths)) or 1
+    with ProcessPoolExecutor(workers, mp_context=pool_context()) as process:
+        # note: start worker processes before any reader threads exist, forking a
+        #       multi-threaded process can deadlock.
+        process.submit(int).result()
+        with ThreadPoolExecutor(workers) as thread:
+            contents = thread.map(pool_read, file_paths)
+            chunk = max(1, len(file_paths) // (workers * 4))
+            return list(process.map(parse_variable, contents, file_paths, repeat(engine), chunksize=chunk))
+
+
+def pool_so_variables(module_names, workers, timeout=SO_TIMEOUT):
+    ''' Extract variables from `.so` files by importing them inside isolated worker processes
+
+        Type
+            module_names: List[str]
+            workers:      int
+            timeout:      Union[int, float]
+            return:       List[Union[List[str], Tuple[str]]]
+
+        Example
+            >>> pool_so_variables(['pkg.one', 'pkg.two'], 1)
+            [['one'], ('two', 'TWO')]
+
+        Note
+            - extension initialization & its imports stay in worker process, which is
+              discarded once done, so scanning process memory does not grow.
+            - raises `TimeoutError` if extension takes longer than `timeout` to import.
+            - "fork" is required for the worker to see the package that's being scanned as
+              already imported, without it (see `pool_fork()`) `.so` is imported in current process instead.
+    '''
+    if not pool_fork():
+        return [extract_so_variable(module_name) for module_name in module_names]
+
+    with pool_context().Pool(min(workers, len(module_names)) or 1) as pool:
+        results = [pool.apply_async(extract_so_variable, (module_name,)) for module_name in module_names]
+        r = []
+        for module_name, result in zip(module_names, results):
+            try:
+                r.append(result.get(timeout))
+            except MultiprocessingTimeoutError:
+                error = f'extracting names from {module_name!r} took longer than {timeout} seconds.'
+                raise TimeoutError(error) from None
+        return r
@@ -1,17 +1,24 @@
-from os import walk, stat
-from os.path import join
+from os import scandir
+from os.path import isdir, isfile, dirname
+from re import compile as re_compile, escape
 from importlib.machinery import EXTENSION_SUFFIXES
-from .extract import extract_variable, extract_so_variable
+from .cache import file_stamp, dir_stamp
+from .extract import extract_variable, parse_variable, source_so_variable
+from .info import Info
 from .special import special
 
 
-__all__ = 'EXT_SUFFIX', 'prep_package', 'prep_files', 'prep_variables'
+__all__ = 'EXT_SUFFIX', 'GLOB_CHAR', 'prep_package', 'prep_files', 'prep_archive_path', 'prep_archive', \
+          'prep_namespace', 'prep_exclude', 'prep_glob', 'prep_variables', 'prep_extract'
 # e.g: ('.py', '.cpython-312-x86_64-linux-gnu.so', '.abi3.so', '.so')
 EXT_SUFFIX = ('.py', *EXTENSION_SUFFIXES)
 # EXT_SUFFIX = ('.py', *(i for i in EXTENSION_SUFFIXES if i != '.so'))
+GLOB_CHAR = re_compile(r'[*?\[]').search  # exclude path with any of these is a glob pattern.
+GLOB_TOKEN = re_compile(r'\*\*/|\*|\?|\[!?\]?[^\]]*\]|[^*?\[]+|\[')
 
 
-def prep_package(pkg_name, pkg_path, recursive, exclude_file, exclude_dir):
+def prep_package(pkg_name, pkg_path, recursive, exclude_file, exclude_dir, workers=1, files=None, engine='ast',
+                 validate='mtime_ns'):
     '''
         Type
             pkg_name:     str
@@ -19,83 +26,341 @@ def prep_package(pkg_name, pkg_path, recursive, exclude_file, exclude_dir):
             recursive:    bool
             exclude_file: List[str]
             exclude_dir:  List[str]
-            return:     Tuple[Dict[str, Tuple[str, str, Union[List(str), Tuple[str]], float]], Dict[str, float]]
+            workers:      int
+            files:        Dict[str, Tuple[str, Union[List(str), Tuple[str]], Union[Tuple[int, int], bytes]]]
+            engine:       str
+            validate:     str
+            return:       Tuple[Info, Dict[str, Union[int, bytes]]]
 
         Example
             >>> prep_package('pkg', 'path/pkg/', True, [], [])
-            {'one': ('pkg.module', 'pkg/module.py', ('one', ...), 123.45), ...}, {'pkg/': 123.45, ...}
+            (Info({'one': ('pkg.module', 'pkg/module.py', ('one', ...), (1234500000000, 15)), ...}),
+             {'pkg/': 1234500000000})
+
+            # scan `.py` files using 4 worker processes
+            >>> prep_package('pkg', 'path/pkg/', True, [], [], 4)
+
+            # only extract files that have changed since last scan
+            >>> files = load_files(cache_path, version)
+            >>> prep_package('pkg', 'path/pkg/', True, [], [], 1, files)
+
+            # extract `.py` files using token engine
+            >>> prep_package('pkg', 'path/pkg/', True, [], [], 1, None, 'token')
+
+            # stamp files by content hash instead of mtime
+            >>> prep_package('pkg', 'path/pkg/', True, [], [], 1, None, 'ast', 'hash')
+
+        Note
+            - `workers=0` uses all available cores.
+            - `files` entries with same module name & mtime (stamp) are reused instead of extracted again.
+              It's updated in place to hold result of current scan (changed & removed files dropped).
+            - package inside an archive (e.g. zipapp or zip on `sys.path`) is scanned by `prep_archive()`
     '''
-    info = {}
+    if (archive := prep_archive_path(pkg_path)) is not None:
+        if files is not None:
+            files.clear()  # note: archive is checked as a whole, there is no per file result to reuse.
+        return prep_archive(pkg_name, pkg_path, archive, recursive, exclude_file, exclude_dir, engine, validate)
+
+    from .pool import MIN_FILES, pool_workers, pool_variables, pool_so_variables
+    # note: imported here as `multiprocessing` & `concurrent.futures` are only needed when package is
+    #       scanned, importing them on every start-up (with valid cache) would cost more than loading cache.
+
+    info = Info()
     dir_mtime = {}
-    for module, file_path, mtime in prep_files(pkg_name,
-                                               pkg_path,
-                                               recursive,
-                                               dir_mtime,
-                                               exclude_file,
-                                               exclude_dir):
-        for var, variables in prep_variables(module, file_path):
-            info[var] = (module, file_path, variables, mtime)
+    if files is None:
+        files = {}
+    cached = files.copy()
+    files.clear()
+    for module, file_path, mtime in prep_files(pkg_name, pkg_path, recursive, dir_mtime, exclude_file, exclude_dir,
+                                               validate):
+        found = cached.get(file_path)
+        files[file_path] = found if found and found[0] == module and found[2] == mtime else (module, None, mtime)
+
+    if workers != 1:
+        py_files = [file_path for file_path, (_, variables, _) in files.items()
+                    if variables is None and file_path.endswith(EXT_SUFFIX[0])]
+        if len(py_files) >= MIN_FILES:
+            for file_path, variables in zip(py_files, pool_variables(py_files, pool_workers(workers), engine)):
+                module, _, mtime = files[file_path]
+                files[file_path] = (module, variables, mtime)
+
+    # `.so` names are read from source next to it, otherwise all remaining extensions are imported
+    # together inside worker processes.
+    so_files = []
+    for file_path, (module, variables, mtime) in files.items():
+        if variables is None and file_path.endswith(EXT_SUFFIX[1:]):
+            if (variables := source_so_variable(file_path)) is None:
+                so_files.append(file_path)
+            else:
+                files[file_path] = (module, variables, mtime)
+    if so_files:
+        so_modules = [files[file_path][0] for file_path in so_files]
+        for file_path, variables in zip(so_files, pool_so_variables(so_modules, pool_workers(workers))):
+            module, _, mtime = files[file_path]
+            files[file_path] = (module, variables, mtime)
+
+    for file_path, (module, variables, mtime) in files.items():
+        if variables is None:
+            variables = prep_extract(module, file_path, engine)
+            files[file_path] = (module, variables, mtime)
+        info.add(module, file_path, variables, mtime)
     return info, dir_mtime
 
 
-def prep_files(pkg_name, pkg_path, recursive, dir_mtime, exclude_file, exclude_dir):
+def prep_files(pkg_name, pkg_path, recursive, dir_mtime, exclude_file, exclude_dir, validate='mtime_ns'):
     ''' Prepare python files and module names
 
         Type
             pkg_name:     str
             pkg_path:     str
             recursive:    bool
-            dir_mtime:    Dict[str, float]
+            dir_mtime:    Dict[str, Union[int, bytes]]
             exclude_file: List[str]
             exclude_dir:  List[str]
-            yield:        Tuple[str, Union[Tuple[str], List[str]], float]
+            validate:     str
+            yield:        Tuple[str, str, Union[Tuple[int, int], bytes]]
             return:       None
 
         Example
             >>> for name, file_path, mtime in prep_files('pkg', /path/pkg'):
             ...     name, file_path, mtime
-            'sub.module' '/path/pkg/sub/module.py' 123.45
+            'sub.module' '/path/pkg/sub/module.py' (1234500000000, 15)
+
+        Note
+            - `__pycache__`, hidden and excluded directories are pruned before they are scanned.
+            - `os.DirEntry` type information is reused, so only included directories & files are `stat()`ed.
     '''
     skip = len(pkg_path) - len(pkg_name) - 1  # "/path/pkg" - "pkg" - 1
-    for root, dirs, files in walk(pkg_path):
-        # skip all `__pycache__` folder
-        if root.endswith('/__pycache__'):
-            continue
-
-        # skip excluded directory
-        if (root_path := root if root.endswith('/') else f'{root}/') in exclude_dir:
-            continue
-
-        if files:
-            # e.g: "/path/pkg/sub/module/" to "pkg.sub.module"
-            if (module_name := root[skip:].replace("/", ".")).endswith('.'):
-                module_name = module_name[:-1]
-
-            for file in files:
-                if file.endswith(EXT_SUFFIX):
-                    # skip excluded file
-                    if (file_path := join(root, file)) in exclude_file:
-                        continue
+    exclude_file, file_match = prep_exclude(exclude_file)
+    exclude_dir, dir_match = prep_exclude(exclude_dir)
+
+    stack = [(pkg_path if pkg_path.endswith('/') else f'{pkg_path}/', None)]
+    while stack:
+        root_path, root_entry = stack.pop()
+        try:
+            with scandir(root_path) as entries:
+                entries = list(entries)
+        except OSError:
+            continue  # same as `os.walk()` unreadable directory is skipped.
+
+        module_name = None
+        sub_dirs = []
+        for entry in entries:
+            name = entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+
+            if is_dir:
+                # skip all `__pycache__`, hidden & excluded directory without going into it.
+                if not recursive or name == '__pycache__' or name[0] == '.' or entry.is_symlink():
+                    continue
+                if (sub_path := f'{root_path}{name}/') in exclude_dir or (dir_match and dir_match(sub_path)):
+                    continue
+                sub_dirs.append((sub_path, entry))
+            elif name.endswith(EXT_SUFFIX):
+                # skip excluded file
+                if (file_path := f'{root_path}{name}') in exclude_file or (file_match and file_match(file_path)):
+                    continue
+
+                if module_name is None:
+                    # e.g: "/path/pkg/sub/module/" to "pkg.sub.module"
+                    module_name = root_path[skip:-1].replace('/', '.')
                     # only add directory that have `EXT_SUFFIX` in it.
-                    dir_mtime[root_path] = stat(root_path).st_mtime  # cached called
-                    mtime = stat(file_path).st_mtime
+                    dir_mtime[root_path] = dir_stamp(root_path, validate, [i.name for i in entries], root_entry)
+                mtime = file_stamp(file_path, validate, entry)
+
+                if name == '__init__.py':
+                    yield f'{module_name}', file_path, mtime
+                else:
+                    yield f'{module_name}.{name.split(".")[0]}', file_path, mtime
+                    # ('pkg.sub.module', '/pkg/sub/module.py', (1234500000000, 15))
+                    # ('pkg.sub.module', '/pkg/sub/module*.so', (1234500000000, 15))
+
+        # note: reversed so sub-directories are scanned in the same order as `os.walk()` would.
+        stack.extend(reversed(sub_dirs))
+
+
+def prep_archive_path(pkg_path):
+    ''' Archive file package is stored in
+
+        Type
+            pkg_path: str
+            return:   Union[str, None]
+
+        Example
+            >>> prep_archive_path('/path/app.pyz/pkg/')
+            '/path/app.pyz'
+
+            >>> prep_archive_path('/path/pkg/')  # directory
+            None
+    '''
+    if isdir(pkg_path):
+        return None
+    path = pkg_path.rstrip('/')
+    while not isfile(path):
+        if (parent := dirname(path)) == path:
+            return None
+        path = parent
+    return path
+
+
+def prep_archive(pkg_name, pkg_path, archive, recursive, exclude_file, exclude_dir, engine='ast', validate='mtime_ns'):
+    ''' Scan package that is not on file system through its loader (`importlib.resources`)
+
+        Type
+            pkg_name:     str
+            pkg_path:     str
+            archive:      str
+            recursive:    bool
+            exclude_file: List[str]
+            exclude_dir:  List[str]
+            engine:       str
+            validate:     str
+            return:       Tuple[Info, Dict[str, Union[int, bytes]]]
+
+        Example
+            >>> prep_archive('pkg', '/path/app.pyz/pkg/', '/path/app.pyz', True, [], [])
+            ({'one': ('pkg.one', '/path/app.pyz/pkg/one.py', ('one',), None), ...},
+             {'/path/app.pyz': 1234500000000})
+
+        Note
+            - files are read using package loader's resource reader, e.g. `zipimport` for zip archives.
+            - whole archive is stamped (not each file) as only entry of directory stamps. Stamp of each name
+              is `None`, which `Module` takes to load module through import system (package loader) instead
+              of from file path.
+            - only `.py` files are scanned, extension modules can not be loaded from an archive.
+            - directory without `__init__.py` that `zipimport` can not import as namespace package is skipped.
+    '''
+    from sys import modules
+    from zipimport import zipimporter
+    from importlib.util import find_spec
+
+    module = modules.get(pkg_name)
+    loader = (module.__spec__ if module is not None else find_spec(pkg_name)).loader
+    try:
+        root = loader.get_resource_reader(pkg_name).files()
+    except AttributeError:
+        from importlib.resources import files  # note: python3.9 resource reader has no `files()`
+        root = files(pkg_name)
+
+    info = Info()
+    exclude_file, file_match = prep_exclude(exclude_file)
+    exclude_dir, dir_match = prep_exclude(exclude_dir)
+    stack = [(root, pkg_path, pkg_name)]
+    while stack:
+        folder, root_path, module_name = stack.pop()
+        sub_dirs = []
+        for entry in folder.iterdir():
+            name = entry.name
+            if entry.is_dir():
+                if not recursive or name == '__pycache__' or name[0] == '.':
+                    continue
+                if (sub_path := f'{root_path}{name}/') in exclude_dir or (dir_match and dir_match(sub_path)):
+                    continue
+                # note: python3.9 `zipfile.Path.is_file()` is also true for missing path.
+                if isinstance(loader, zipimporter) and not entry.joinpath('__init__.py').exists() \
+                        and not prep_namespace(sub_path):
+                    continue
+                sub_dirs.append((entry, sub_path, f'{module_name}.{name}'))
+            elif name.endswith(EXT_SUFFIX[0]):
+                if (file_path := f'{root_path}{name}') in exclude_file or (file_match and file_match(file_path)):
+                    continue
+                module = module_name if name == '__init__.py' else f'{module_name}.{name.split(".")[0]}'
+                info.add(module, file_path, parse_variable(entry.read_bytes(), file_path, engine), None)
+        stack.extend(reversed(sub_dirs))
+    return info, {archive: dir_stamp(archive, validate)}
 
-                    if file == '__init__.py':
-                        yield f'{module_name}', file_path, mtime
-                    else:
-                        yield f'{module_name}.{file.split(".")[0]}', file_path, mtime
-                        # ('pkg.sub.module', '/pkg/sub/module.py', 123.45)
-                        # ('pkg.sub.module', '/pkg/sub/module*.so', 123.45)
-        if not recursive:
-            break
 
+def prep_namespace(dir_path):
+    ''' Directory inside zip archive can be imported as namespace package by `zipimport`
 
-def prep_variables(module_name, file_path):
+        Type
+            dir_path: str
+            return:   bool
+
+        Example
+            >>> prep_namespace('/path/app.pyz/pkg/sub/')
+            True
+
+            >>> prep_namespace('/path/pkg.whl/pkg/sub/')  # archive without directory entries
+            False
+
+        Note
+            - `zipimport` finds namespace package only through directory entry of archive, which is not written
+              by all tools, e.g. wheels only have file entries.
+    '''
+    from zipimport import zipimporter
+
+    path, name = dir_path.rstrip('/').rsplit('/', 1)
+    loader = zipimporter(f'{path}/')
+    try:
+        return loader.find_spec(name) is not None
+    except AttributeError:  # note: python3.9 `zipimporter` has no `find_spec()`
+        return bool(loader.find_loader(name)[1])
+
+
+def prep_exclude(exclude):
+    ''' Split excluded paths into exact paths set & glob patterns matcher
+
+        Type
+            exclude: List[str]
+            return:  Tuple[Set[str], Union[Callable, None]]
+
+        Example
+            >>> prep_exclude(['/path/pkg/sub/', '/path/pkg/**/tests/'])
+            ({'/path/pkg/sub/'}, <built-in method match of re.Pattern object>)
+    '''
+    paths = set()
+    patterns = []
+    for each in exclude:
+        if GLOB_CHAR(each):
+            patterns.append(prep_glob(each))
+        else:
+            paths.add(each)
+    if patterns:
+        return paths, re_compile(f'(?:{"|".join(patterns)})\\Z').match
+    return paths, None
+
+
+def prep_glob(pattern):
+    ''' Translate glob pattern into regular expression
+
+        Type
+            pattern: str
+            return:  str
+
+        Example
+            >>> prep_glob('/path/pkg/**/test_*.py')
+            '/path/pkg/(?:.*/)?test_[^/]*\\.py'
+
+        Note
+            - `*`, `?` and `[...]` do not match "/" while `**/` matches any number of directories.
+    '''
+    r = []
+    for token in GLOB_TOKEN.findall(pattern):
+        if token == '**/':
+            r.append('(?:.*/)?')
+        elif token == '*':
+            r.append('[^/]*')
+        elif token == '?':
+            r.append('[^/]')
+        elif token[0] == '[' and len(token) > 1:
+            token = token[1:-1].replace('\\', '\\\\')
+            r.append(f'[^/{token[1:]}]' if token[:1] == '!' else f'[{token}]')
+        else:
+            r.append(escape(token))
+    return ''.join(r)
+
+
+def prep_variables(module_name, file_path, variables=None):
     ''' Prepare `__all__` variable names
 
         Type
             module_name: str
             file_path:   str
+            variables:   Union[List[str], Tuple[str], None]
             yield:       Tuple[str, Union[List[str], Tuple[str]]]
             return:      None
 
@@ -104,13 +369,41 @@ def prep_variables(module_name, file_path):
             ...     var, variables
             'one', ('one', 'two')
             'two', ('one', 'two')
+
+        Note
+            - `variables` already extracted (e.g. by worker pool) are used as is.
     '''
-    if file_path.endswith(EXT_SUFFIX[0]):  # .py
-        variables = extract_variable(file_path)
-    elif file_path.endswith(EXT_SUFFIX[1:]):  # .so
-        variables = extract_so_variable(module_name)
-    else:
-        return None
+    if variables is None:
+        if (variables := prep_extract(module_name, file_path)) is None:
+            return None
 
     for var in special(variables):
         yield var, variables  # e.g. 'one', ('one', 'two')
+
+
+def prep_extract(module_name, file_path, engine='ast'):
+    ''' Extract `__all__` variable names based on file extension
+
+        Type
+            module_name: str
+            file_path:   str
+            engine:      str
+            return:      Union[List[str], Tuple[str], None]
+
+        Example
+            >>> prep_extract('pkg.sub.module', '/path/pkg/sub/module.py')
+            ('one', 'two')
+
+            >>> prep_extract('pkg.sub.module', '/path/pkg/sub/module.bad')
+            None
+
+        Note
+            - `.so` file is never imported in current process, see `pool_so_variables()`
+    '''
+    if file_path.endswith(EXT_SUFFIX[0]):  # .py
+        return extract_variable(file_path, engine)
+    elif file_path.endswith(EXT_SUFFIX[1:]):  # .so
+        if (variables := source_so_variable(file_path)) is None:
+            from .pool import pool_so_variables
+            variables = pool_so_variables([module_name], 1)[0]
+        return variables
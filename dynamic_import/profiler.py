@@ -0,0 +1,155 @@
+from sys import argv, modules, path, stderr
+from time import perf_counter
+from runpy import run_module, run_path
+from os.path import abspath, dirname
+from threading import local
+from tracemalloc import is_tracing, start, stop, get_traced_memory
+from .module import Module
+
+
+__all__ = 'profile_start', 'profile_stop', 'profile_unused', 'profile_report', 'profile_run'
+
+
+def profile_start():
+    ''' Start recording each lazy load done through `Module.__getattr__`
+
+        Type
+            return: Dict[str, any]
+
+        Example
+            >>> state = profile_start()
+            >>> pkg.one
+            >>> profile_stop(state)
+            [{'name': 'one', 'module': 'pkg.one', 'self': 0.001, 'cumulative': 0.002, 'memory': 2048,
+              'children': [{'name': 'TWO', 'module': 'pkg.two', ...}]}]
+
+        Note
+            - only first use of a name that executes a module (not already in `sys.modules`) is recorded.
+            - memory is measured using `tracemalloc`, which slows down loading while profiling.
+    '''
+    state = {'getattr': Module.__getattr__, 'tracing': not is_tracing(), 'nodes': [], 'local': local()}
+    getattr_ = state['getattr']
+    nodes = state['nodes']
+    stack = state['local']
+
+    def profile_getattr(self, name):
+        if name in self.__dict__ or name not in self.__INFO__:
+            return getattr_(self, name)
+        module_name = self.__INFO__[name][0]
+        if module_name == self.__PACKAGE__ or module_name in modules:
+            return getattr_(self, name)
+
+        node = {'name': name, 'module': module_name, 'self': 0.0, 'cumulative': 0.0, 'memory': 0, 'children': []}
+        parent = getattr(stack, 'node', None)
+        (nodes if parent is None else parent['children']).append(node)
+        stack.node = node
+        memory = get_traced_memory()[0]
+        begin = perf_counter()
+        try:
+            return getattr_(self, name)
+        finally:
+            node['cumulative'] = perf_counter() - begin
+            node['memory'] = get_traced_memory()[0] - memory
+            node['self'] = node['cumulative'] - sum(i['cumulative'] for i in node['children'])
+            stack.node = parent
+
+    if state['tracing']:
+        start()
+    Module.__getattr__ = profile_getattr
+    return state
+
+
+def profile_stop(state):
+    ''' Stop recording lazy loads
+
+        Type
+            state:  Dict[str, any]
+            return: List[Dict[str, any]]
+    '''
+    Module.__getattr__ = state['getattr']
+    if state['tracing']:
+        stop()
+    return state['nodes']
+
+
+def profile_unused():
+    ''' Modules of each dynamic package that were never loaded
+
+        Type
+            return: Dict[str, List[str]]
+
+        Example
+            >>> profile_unused()
+            {'pkg': ['pkg.sub.three', 'pkg.two']}
+    '''
+    r = {}
+    for module in list(modules.values()):
+        if isinstance(module, Module):
+            found = {i[0] for i in module.__INFO__.values() if i[0] not in modules}
+            if found:
+                r[module.__PACKAGE__] = sorted(found)
+    return r
+
+
+def profile_report(nodes, unused, file=stderr):
+    ''' Print lazy load tree, same layout as `python -X importtime`
+
+        Type
+            nodes:  List[Dict[str, any]]
+            unused: Dict[str, List[str]]
+            file:   TextIO
+            return: None
+
+        Example
+            >>> profile_report(nodes, unused)
+            lazy load: self [us] | cumulative | memory [KiB] | name -> module
+            lazy load:       512 |       1536 |           12 | one -> pkg.one
+            lazy load:      1024 |       1024 |            4 |   TWO -> pkg.two
+            unused: pkg.sub.three
+    '''
+    def tree(nodes, depth):
+        for node in nodes:
+            print(f'lazy load: {node["self"] * 1e6:9.0f} | {node["cumulative"] * 1e6:10.0f} | '
+                  f'{node["memory"] / 1024:12.0f} | {"  " * depth}{node["name"]} -> {node["module"]}', file=file)
+            tree(node['children'], depth + 1)
+
+    print('lazy load: self [us] | cumulative | memory [KiB] | name -> module', file=file)
+    tree(nodes, 0)
+    for module_names in unused.values():
+        for module_name in module_names:
+            print(f'unused: {module_name}', file=file)
+
+
+def profile_run(entry, args=(), module=False):
+    ''' Run script or module as `__main__` while recording lazy loads
+
+        Type
+            entry:  str
+            args:   List[str]
+            module: bool
+            return: Tuple[List[Dict[str, any]], Dict[str, List[str]], Union[int, str, None]]
+
+        Example
+            >>> profile_run('app.py', ['--port', '8080'])  # script
+            ([...], {...}, 0)
+
+            >>> profile_run('app', [], True)  # module, same as `python -m app`
+            ([...], {...}, 0)
+
+        Note
+            - last value is exit code, taken from `SystemExit` if target raised it.
+    '''
+    argv[:] = [entry, *args]
+    code = 0
+    state = profile_start()
+    try:
+        if module:
+            run_module(entry, run_name='__main__', alter_sys=True)
+        else:
+            path.insert(0, dirname(abspath(entry)))  # same as `python <script>` does.
+            run_path(entry, run_name='__main__')
+    except SystemExit as e:
+        code = e.code
+    finally:
+        nodes = profile_stop(state)
+    return nodes, profile_unused(), code
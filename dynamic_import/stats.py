@@ -0,0 +1,119 @@
+from os import environ, getpid
+from sys import audit
+from time import time
+from bisect import bisect_left
+from threading import Lock
+
+
+__all__ = 'BUCKETS', 'EVENTS', 'HOOKS', 'STATS_EXPORT', 'new_stats', 'stats_event', 'stats_export'
+# upper bound (in seconds) of each timing histogram bucket, last bucket holds everything slower.
+BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0)
+# events reported for each package:
+#   'importer':   `importer()` call done
+#   'cache_hit':  cache was loaded
+#   'cache_miss': cache was missing or rejected, data has "reason" & "path" (if a file or directory changed)
+#                 reason: 'missing', 'version', 'recursive', 'exclude_file', 'exclude_dir', 'validate', 'dir',
+#                         'file', 'removed' or 'error' (could not be read)
+#   'cache_wait': other process was rebuilding cache, this one waited for it (`seconds` waited)
+#   'scan':       package was scanned, data has number of "names" & "reused" files
+#   'load':       module was loaded on first use of "name", data has "module" name
+EVENTS = ('importer', 'cache_hit', 'cache_miss', 'cache_wait', 'scan', 'load')
+# callables called as `hook(event, package, data)` for every event of every package.
+HOOKS = []
+# opt-in JSON-lines file each event is appended to, e.g: `DYNAMIC_IMPORT_STATS=/var/log/pkg.jsonl`
+STATS_EXPORT = environ.get('DYNAMIC_IMPORT_STATS')
+STATS_LOCK = Lock()
+
+
+def new_stats(package):
+    ''' Empty instrumentation data of package, available as `pkg.__STATS__`
+
+        Type
+            package: str
+            return:  Dict[str, any]
+
+        Example
+            >>> new_stats('pkg')
+            {'package': 'pkg', 'counters': {}, 'timings': {}, 'loads': {}}
+
+            # after a few events
+            >>> pkg.__STATS__
+            {'package': 'pkg',
+             'counters': {'cache_miss.dir': 1, 'scan': 1, 'importer': 1, 'load': 2},
+             'timings': {'scan': {'count': 1, 'total': 0.12, 'max': 0.12, 'buckets': [0, 0, 0, 0, 1, 0]}, ...},
+             'loads': {'one': 0.0021, 'TWO': 0.00047}}
+
+        Note
+            - "counters" key is event name, with its reason for "cache_miss" events.
+            - "timings" is histogram of event durations, see `BUCKETS`
+            - "loads" is time (in seconds) it took each name to load on first use.
+    '''
+    return {'package': package, 'counters': {}, 'timings': {}, 'loads': {}}
+
+
+def stats_event(stats, event, seconds=None, **data):
+    ''' Record event into `stats` & report it to `HOOKS`, `sys.audit()` and JSON-lines export
+
+        Type
+            stats:   Dict[str, any]
+            event:   str
+            seconds: Union[float, None]
+            data:    Dict[str, any]
+            return:  None
+
+        Example
+            >>> stats_event(stats, 'load', 0.0021, name='one', module='pkg.one')
+
+            >>> stats_event(stats, 'cache_miss', reason='file', path='/path/pkg/one.py')
+
+        Note
+            - audit event name is prefixed with "dynamic_import." e.g. `dynamic_import.load`
+              with `(package, data)` as arguments.
+    '''
+    package = stats['package']
+    key = f'{event}.{data["reason"]}' if 'reason' in data else event
+    with STATS_LOCK:
+        counters = stats['counters']
+        counters[key] = counters.get(key, 0) + 1
+        if seconds is not None:
+            data['seconds'] = seconds
+            if (timing := stats['timings'].get(event)) is None:
+                timing = stats['timings'][event] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                                    'buckets': [0] * (len(BUCKETS) + 1)}
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+            timing['buckets'][bisect_left(BUCKETS, seconds)] += 1
+            if event == 'load':
+                stats['loads'][data['name']] = seconds
+
+    audit(f'dynamic_import.{event}', package, data)
+    for hook in HOOKS:
+        hook(event, package, data)
+    if STATS_EXPORT:
+        stats_export(STATS_EXPORT, event, package, data)
+
+
+def stats_export(export_path, event, package, data):
+    ''' Append event as JSON line
+
+        Type
+            export_path: str
+            event:       str
+            package:     str
+            data:        Dict[str, any]
+            return:      None
+
+        Example
+            >>> stats_export('/var/log/pkg.jsonl', 'load', 'pkg', {'name': 'one', 'seconds': 0.0021})
+            # {"time": 1700000000.123, "pid": 1234, "package": "pkg", "event": "load", "name": "one", ...}
+
+        Note
+            - each event is written using single `write()` on file opened in append mode, so lines from
+              many processes do not interleave.
+    '''
+    from json import dumps
+
+    line = dumps({'time': time(), 'pid': getpid(), 'package': package, 'event': event, **data}, default=str)
+    with open(export_path, 'a') as file:
+        file.write(f'{line}\n')
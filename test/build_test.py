@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import pytest
+import subprocess
+from dynamic_import.build import OPTIONS, build_options, build_find, build_package, build_verify, build_static, \
+                                 build_inspect
+from dynamic_import.check import IMPORTER_CALLED
+from dynamic_import.cache import pkg_cache_path
+from dynamic_import.version import version
+
+
+def make_pkg(tmp_dir, pkg_name, init='exclude_dir="skip", validate="hash"'):
+    pkg_dir = tmp_dir / pkg_name
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / 'skip').mkdir()
+    (pkg_dir / '__init__.py').write_text(f'from dynamic_import import importer\nimporter({init})\n')
+    (pkg_dir / 'one.py').write_text('ONE = 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\n')
+    (pkg_dir / 'skip' / 'three.py').write_text('THREE = 3\n')
+    return pkg_dir
+
+
+def test_build_options(tmp_dir):
+    init = tmp_dir / '__init__.py'
+    init.write_text('import dynamic_import\ndynamic_import.importer(exclude_dir=("a", "b"), workers=0)\n')
+    assert build_options(str(init)) == {**OPTIONS, 'exclude_dir': ('a', 'b'), 'workers': 0}
+    init.write_text('from dynamic_import import importer\nimporter()\n')
+    assert build_options(str(init)) == OPTIONS
+    init.write_text('from dynamic_import import importer\nWORKERS = 4\nimporter(workers=WORKERS)\n')
+    with pytest.raises(ValueError, match=r'`importer\(workers\)` in .* is not a literal value'):
+        build_options(str(init))
+    init.write_text('from dynamic_import import importer\nimporter(**{})\n')
+    with pytest.raises(ValueError, match=r'`importer\(\*\*\)` in .* can not be read'):
+        build_options(str(init))
+    init.write_text('ONE = 1\n')
+    with pytest.raises(ValueError, match='does not call `importer\\(\\)`'):
+        build_options(str(init))
+
+
+def test_build_package(tmp_dir):
+    pkg_dir = make_pkg(tmp_dir, 'build_pkg')
+    sys.path.insert(0, str(tmp_dir))
+    try:
+        assert build_find('build_pkg') == str(pkg_dir / '__init__.py')
+        (tmp_dir / 'build_mod.py').write_text('ONE = 1\n')
+        with pytest.raises(ValueError, match="'build_mod' is not a package with `__init__.py`"):
+            build_find('build_mod')
+
+        cache_path = pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'importer')
+        assert build_verify('build_pkg') == {'package': 'build_pkg', 'status': 'missing', 'cache_path': cache_path,
+                                             'path': None}
+        r = build_package('build_pkg', {'workers': 2})
+        assert (r['status'], r['cache_path'], r['names'], r['files']) == ('built', cache_path, 2, 2)
+        assert r['size'] == os.path.getsize(cache_path)
+        assert f'{pkg_dir}/' not in IMPORTER_CALLED  # package itself is not imported.
+        assert build_package('build_pkg')['status'] == 'up-to-date'
+        assert build_package('build_pkg', force=True)['status'] == 'built'
+        assert build_verify('build_pkg')['status'] == 'ok'
+
+        r = build_inspect(cache_path)
+        assert r['version'] == version and r['validate'] == 'hash' and r['recursive'] is True
+        assert r['exclude_dir'] == [f'{pkg_dir}/skip/']
+        assert (r['dirs'], r['files'], r['modules']) == (2, 3, 2)
+        assert r['names'] == {'ONE': 'build_pkg.one', 'TWO': 'build_pkg.sub.two'}
+
+        # options that do not match `importer()` call are reported.
+        assert build_verify('build_pkg', {'validate': 'mtime_ns'})['status'] == 'validate'
+        (pkg_dir / 'sub' / 'four.py').write_text('FOUR = 4\n')
+        assert build_verify('build_pkg') == {'package': 'build_pkg', 'status': 'dir', 'cache_path': cache_path,
+                                             'path': f'{pkg_dir}/sub/'}
+        with pytest.raises(ValueError, match=r'`importer\(bogus\)` is not an option'):
+            build_package('build_pkg', {'bogus': 1})
+
+        # built cache is used by `importer()` without scanning.
+        assert build_package('build_pkg')['status'] == 'built'
+        import build_pkg
+        assert build_pkg.__STATS__['counters'] == {'cache_hit': 1, 'importer': 1}
+        assert build_pkg.FOUR == 4
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_build_disabled(tmp_dir):
+    make_pkg(tmp_dir, 'build_off', 'cache=False')
+    sys.path.insert(0, str(tmp_dir))
+    try:
+        assert build_package('build_off')['status'] == 'disabled'
+        assert build_verify('build_off')['status'] == 'disabled'
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_build_command(tmp_dir):
+    pkg_dir = make_pkg(tmp_dir, 'build_cmd')
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([str(tmp_dir), *sys.path])}
+
+    def run(*args):
+        r = subprocess.run([sys.executable, '-m', 'dynamic_import', *args], capture_output=True, text=True, env=env)
+        return r.returncode, r.stdout, r.stderr
+
+    code, out, _ = run('verify', 'build_cmd')
+    assert code == 1 and out.startswith('missing      build_cmd  ')
+    code, out, err = run('build', 'build_cmd', 'missing_pkg', '-o', 'workers=0')
+    assert code == 1 and out.startswith('built        build_cmd  2 names  2 files  ')
+    assert err.startswith('error        missing_pkg  ')
+    code, out, _ = run('build', 'build_cmd', '--json')
+    assert code == 0 and json.loads(out)['status'] == 'up-to-date'
+    code, out, _ = run('verify', 'build_cmd')
+    assert code == 0 and out.startswith('ok           build_cmd  ')
+    code, out, _ = run('inspect', 'build_cmd', '--names')
+    assert code == 0
+    assert 'names:        2\nONE -> build_cmd.one\nTWO -> build_cmd.sub.two\n' in out
+    (pkg_dir / 'one.py').write_text('ONE = 1\nUNO = 1\n')
+    code, out, _ = run('verify', 'build_cmd', '--json')
+    assert code == 1 and json.loads(out)['path'] == f'{pkg_dir}/one.py'
+    code, out, _ = run('build', 'build_cmd', '--bundle', str(tmp_dir / 'app.idx'))
+    bundled = out.splitlines()[1]
+    assert code == 0 and bundled.startswith('bundled      1 packages  ') and bundled.endswith(f'  {tmp_dir}/app.idx')
+    assert '__init__.index-' in out.splitlines()[0]
+
+
+def test_build_static(tmp_dir):
+    pkg_dir = make_pkg(tmp_dir, 'build_static')
+    (pkg_dir / '__init__.py').write_text('"""Doc."""\ntry:\n    from dynamic_import import importer\n'
+                                         'except ImportError:\n    import sys\n    sys.path.insert(0, "..")\n'
+                                         '    from dynamic_import import importer\n\n__version__ = "1.0"\n'
+                                         'importer(\n    exclude_dir="skip",\n)\nLOCAL = 1\n__all__ = ("LOCAL",)\n')
+    (pkg_dir / 'one.py').write_text('__all__ = "ONE", "UNO"\nONE = 1\nUNO = 11\n')
+    sys.path.insert(0, str(tmp_dir))
+    try:
+        source = build_static('build_static')
+    finally:
+        sys.path.remove(str(tmp_dir))
+    assert 'importer' not in source
+    assert source.startswith('"""Doc."""\n\n__version__ = "1.0"\n\n# note: generated by ')
+    assert 'sys.path' not in source  # `try` block importing `importer` is removed with its fallback.
+    # `__all__` of `__init__.py` is kept but replaced by one listing every name.
+    assert '\n\n\ndef __dir__():\n    return __all__\n\n\nLOCAL = 1\n__all__ = ("LOCAL",)\n\n\n' in source
+    assert source.endswith("\n__all__ = (\n    'LOCAL',\n    'ONE',\n    'UNO',\n    'TWO',\n)\n")
+    assert "_NAMES = {\n    'ONE': 'build_static.one',\n    'UNO': 'build_static.one',\n" in source
+    assert "_MODULES = {\n    'build_static.one': ('ONE', 'UNO'),\n    'build_static.sub.two': ('TWO',),\n}" in source
+
+    # works without `dynamic_import` being importable.
+    (pkg_dir / '__init__.py').write_text(source)
+    code = f'import sys\nsys.path.insert(0, {str(tmp_dir)!r})\nsys.modules["dynamic_import"] = None\n' \
+           'import build_static as pkg\n' \
+           'print(dir(pkg), pkg.__version__, pkg.LOCAL, "build_static.one" in sys.modules)\n' \
+           'print(pkg.UNO, "ONE" in pkg.__dict__, pkg.TWO, sys.modules["dynamic_import"])\n' \
+           'try:\n    pkg.THREE\nexcept AttributeError as e:\n    print(e)\n'
+    r = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
+    assert r.stdout.splitlines() == ["['LOCAL', 'ONE', 'TWO', 'UNO'] 1.0 1 False", '11 True 2 None',
+                                     "module 'build_static' has no attribute 'THREE'"]
+
+    # sub-module set as package global by import system does not replace exported name of same name.
+    (pkg_dir / 'one.py').write_text('__all__ = "ONE", "UNO", "one"\nONE = 1\nUNO = 11\ndef one():\n    return 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('from ..one import one as _one\nTWO = _one() + 1\n')
+    sys.path.insert(0, str(tmp_dir))
+    try:
+        (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(exclude_dir="skip")\n')
+        source = build_static('build_static')
+    finally:
+        sys.path.remove(str(tmp_dir))
+    (pkg_dir / '__init__.py').write_text(source)
+    code = f'import sys\nsys.path.insert(0, {str(tmp_dir)!r})\n' \
+           'import build_static as pkg\nprint(pkg.TWO, pkg.one, "one" in pkg.__dict__)\n' \
+           'import build_static.one\nprint(pkg.one(), pkg.ONE)\n'
+    r = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
+    assert r.stdout.splitlines()[0].startswith('2 <function one at ')
+    assert r.stdout.splitlines()[1:] == ['1 1']
+
+    (pkg_dir / '__init__.py').write_text('import dynamic_import\ndynamic_import.importer(exclude_dir="skip")\n')
+    sys.path.insert(0, str(tmp_dir))
+    try:
+        source = build_static('build_static')
+    finally:
+        sys.path.remove(str(tmp_dir))
+    assert 'dynamic_import.' not in source and source.startswith('# note: generated by ')
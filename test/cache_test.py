@@ -1,12 +1,19 @@
 import os
 import sys
+import marshal
 import os.path
 import time
+import json
 import shutil
 import pytest
+import subprocess
+import multiprocessing
 from dynamic_import.version import version
 from dynamic_import.cache import CACHE_DIR_PATH, MARSHAL_VERSION, VERSION_TAG, CACHE_EXT, \
-                                 pkg_cache_path, dump_cache, load_cache, create_cache_dir
+                                 VALIDATE, pkg_cache_path, dump_cache, load_cache, load_files, create_cache_dir, \
+                                 file_stamp, dir_stamp, cache_changed, dump_file, cache_lock, cache_id, cache_key, \
+                                 user_cache_dir, cache_writable, stamp_kind
+from dynamic_import.stats import new_stats
 
 
 def test_pkg_cache_path(tmp_path):
@@ -17,6 +24,40 @@ def test_pkg_cache_path(tmp_path):
         tmp_path / pkg_name / f'__pycache__/__init__.{func_name}-{VERSION_TAG}{CACHE_EXT}')
     assert pkg_cache_path(pkg_path, 'in.py', func_name) == str(
         tmp_path / pkg_name / f'__pycache__/in.{func_name}-{VERSION_TAG}{CACHE_EXT}')
+    # shared cache directory
+    cache_dir = str(tmp_path / 'cache')
+    assert pkg_cache_path(pkg_path, '__init__.py', func_name, cache_dir) == str(
+        tmp_path / 'cache' / cache_key(pkg_path) / f'__init__.{func_name}-{VERSION_TAG}{CACHE_EXT}')
+
+
+def test_cache_key():
+    key = cache_key('/path/pkg/')
+    assert key.startswith('pkg-') and len(key) == 20
+    assert key == cache_key('/path/pkg/')
+    assert key != cache_key('/other/pkg/')  # same name, different install.
+
+
+def test_user_cache_dir(monkeypatch):
+    if sys.platform in ('win32', 'darwin'):
+        assert user_cache_dir().endswith('dynamic_import')
+    else:
+        monkeypatch.setenv('XDG_CACHE_HOME', '/xdg')
+        assert user_cache_dir() == '/xdg/dynamic_import'
+        monkeypatch.delenv('XDG_CACHE_HOME')
+        assert user_cache_dir() == os.path.expanduser('~/.cache/dynamic_import')
+
+
+def test_cache_writable(tmp_dir):
+    cache_path = pkg_cache_path(f'{tmp_dir}/', '__init__.py', 'importer')
+    assert cache_writable(cache_path)  # `__pycache__` does not exist yet, package directory is checked.
+    create_cache_dir(cache_path)
+    assert cache_writable(cache_path)
+    if os.getuid() != 0:  # note: root can write into read-only directory.
+        os.chmod(os.path.dirname(cache_path), 0o500)
+        try:
+            assert not cache_writable(cache_path)
+        finally:
+            os.chmod(os.path.dirname(cache_path), 0o700)
 
 
 def test_defines():
@@ -67,6 +108,117 @@ def test_dump_load(tmp_dir):
     assert load_cache(cache_file, recursive, exclude_file, exclude_dir, version) is None
 
 
+def test_load_files(tmp_dir):
+    tmp_one = tmp_dir / 'one.py'
+    tmp_one.write_text('ONE = 1')
+    mtime = os.stat(tmp_one).st_mtime
+    info = {'ONE': ('pkg.one', str(tmp_one), ['ONE'], mtime)}
+    files = {str(tmp_one): ('pkg.one', ['ONE'], mtime)}
+    cache_file = pkg_cache_path(tmp_dir, '__init__.py', 'importer')
+    create_cache_dir(cache_file)
+    dump_cache(cache_file, info, True, [], [], {}, version, files)
+
+    assert load_files(cache_file, version) == files
+    # still loaded after cache is no longer valid
+    assert load_cache(cache_file, False, [], [], version) is None
+    assert load_files(cache_file, version) == files
+
+    assert load_files(cache_file, 'old-version') == {}
+    assert load_files(cache_file, version, 'hash') == {}  # stamps can not be compared
+    assert load_files(cache_file, version, 'unchecked') == files  # same stamp as "mtime_ns"
+    assert stamp_kind('unchecked') == stamp_kind('mtime_ns') == 'mtime_ns' and stamp_kind('hash') == 'hash'
+    assert load_files('bad-file', version) == {}
+
+
+def test_validate(tmp_dir):
+    assert VALIDATE == ('mtime_ns', 'hash', 'unchecked')
+    tmp_one = tmp_dir / 'one.py'
+    tmp_one.write_text('ONE = 1')
+    st = os.stat(tmp_one)
+    assert file_stamp(str(tmp_one), 'mtime_ns') == (st.st_mtime_ns, st.st_size)
+    assert file_stamp(str(tmp_one), 'unchecked') == (st.st_mtime_ns, st.st_size)
+    assert dir_stamp(str(tmp_dir), 'mtime_ns') == os.stat(tmp_dir).st_mtime_ns
+    with os.scandir(tmp_dir) as entries:
+        entry = next(i for i in entries if i.name == 'one.py')
+        assert file_stamp(str(tmp_one), 'mtime_ns', entry) == (st.st_mtime_ns, st.st_size)
+
+    # hash only changes when content or names within directory does.
+    stamp = file_stamp(str(tmp_one), 'hash')
+    assert isinstance(stamp, bytes)
+    names = dir_stamp(str(tmp_dir), 'hash')
+    assert dir_stamp(str(tmp_dir), 'hash', ['one.py']) == names
+    os.utime(tmp_one, ns=(1, 1))
+    (tmp_dir / '__pycache__').mkdir()
+    (tmp_dir / '.hidden').write_text('')
+    assert file_stamp(str(tmp_one), 'hash') == stamp
+    assert dir_stamp(str(tmp_dir), 'hash') == names
+    tmp_one.write_text('ONE = 2')
+    assert file_stamp(str(tmp_one), 'hash') != stamp
+    (tmp_dir / 'two.py').write_text('')
+    assert dir_stamp(str(tmp_dir), 'hash') != names
+
+    cache_file = pkg_cache_path(tmp_dir, '__init__.py', 'importer')
+    for validate in VALIDATE:
+        tmp_one.write_text('ONE = 1')
+        dir_mtime = {str(tmp_dir): dir_stamp(str(tmp_dir), validate)}
+        info = {'ONE': ('pkg.one', str(tmp_one), ['ONE'], file_stamp(str(tmp_one), validate))}
+        dump_cache(cache_file, info, True, [], [], dir_mtime, version, None, validate)
+        assert load_cache(cache_file, True, [], [], version, validate) == info
+        # validate mode has changed, "unchecked" & "mtime_ns" use same stamps.
+        for other in VALIDATE:
+            if stamp_kind(other) == stamp_kind(validate):
+                assert load_cache(cache_file, True, [], [], version, other) == info
+            else:
+                assert load_cache(cache_file, True, [], [], version, other) is None
+
+        os.utime(tmp_one, ns=(1, 1))  # e.g. mtime normalized by reproducible build
+        if validate == 'mtime_ns':
+            assert load_cache(cache_file, True, [], [], version, validate) is None
+        else:
+            assert load_cache(cache_file, True, [], [], version, validate) == info
+
+        tmp_one.write_text('ONE = 2')
+        if validate == 'unchecked':
+            assert load_cache(cache_file, True, [], [], version, validate) == info  # trusted as is
+        else:
+            assert load_cache(cache_file, True, [], [], version, validate) is None
+        # file check is deferred, only directories are checked.
+        assert load_cache(cache_file, True, [], [], version, validate, True) == info
+
+
+def test_load_cache_reason(tmp_dir):
+    (tmp_dir / 'sub').mkdir()
+    tmp_one = tmp_dir / 'sub' / 'one.py'
+    tmp_one.write_text('ONE = 1')
+    cache_file = pkg_cache_path(tmp_dir, '__init__.py', 'importer')
+    create_cache_dir(cache_file)
+    dir_mtime = {f'{tmp_dir}/': dir_stamp(str(tmp_dir), 'mtime_ns'),
+                 f'{tmp_dir}/sub/': dir_stamp(str(tmp_dir / 'sub'), 'mtime_ns')}
+    info = {'ONE': ('pkg.sub.one', str(tmp_one), ['ONE'], file_stamp(str(tmp_one), 'mtime_ns'))}
+    assert cache_changed(dir_mtime, info, 'mtime_ns') is None
+    dump_cache(cache_file, info, True, [], [], dir_mtime, version)
+    stats = new_stats('pkg')
+    assert load_cache(cache_file, True, [], [], 'other', stats=stats) is None
+    assert load_cache(cache_file, False, [], [], version, stats=stats) is None
+    assert load_cache(cache_file, True, ['x'], [], version, stats=stats) is None
+    assert load_cache(cache_file, True, [], ['x'], version, stats=stats) is None
+    assert load_cache(cache_file, True, [], [], version, 'hash', stats=stats) is None
+    os.utime(tmp_one, ns=(1, 1))
+    assert cache_changed(dir_mtime, info, 'mtime_ns') == ('file', str(tmp_one))
+    assert cache_changed(dir_mtime, info, 'mtime_ns', True) is None
+    assert load_cache(cache_file, True, [], [], version, stats=stats) is None
+    shutil.rmtree(tmp_dir / 'sub')
+    assert cache_changed(dir_mtime, info, 'mtime_ns') == ('dir', f'{tmp_dir}/')
+    dir_mtime[f'{tmp_dir}/'] = dir_stamp(str(tmp_dir), 'mtime_ns')
+    assert cache_changed(dir_mtime, info, 'mtime_ns') == ('removed', f'{tmp_dir}/sub/')
+    with open(cache_file, 'wb') as file:
+        file.write(b'corrupt')
+    assert load_cache(cache_file, True, [], [], version, stats=stats) is None
+    assert stats['counters'] == {'cache_miss.version': 1, 'cache_miss.recursive': 1, 'cache_miss.exclude_file': 1,
+                                 'cache_miss.exclude_dir': 1, 'cache_miss.validate': 1, 'cache_miss.file': 1,
+                                 'cache_miss.error': 1}
+
+
 def test_define():
     from basic import DEFINE
     assert DEFINE == 123
@@ -123,3 +275,118 @@ def test_dynamic(tmp_dir):
     sys.path.append(str(new_pkg_dir))
     from new_dynamic_pkg import ONE
     assert ONE == 1
+
+
+def test_dump_file(tmp_dir):
+    path = str(tmp_dir / 'data.pyc')
+    assert cache_id(path) is None
+    dump_file(path, {'one': 1})
+    first = cache_id(path)
+    assert first is not None
+    dump_file(path, {'two': 2})
+    assert cache_id(path) != first  # replaced, not written in place.
+    with open(path, 'rb') as file:
+        assert marshal.load(file) == {'two': 2}
+    with pytest.raises(ValueError):
+        dump_file(path, object())  # can not be marshaled
+    with open(path, 'rb') as file:
+        assert marshal.load(file) == {'two': 2}  # previous file is untouched
+    assert os.listdir(tmp_dir) == ['data.pyc']  # & temporary file is removed.
+
+
+def hold_lock(cache_path, locked, release):
+    with cache_lock(cache_path) as waited:
+        assert waited == 0.0
+        locked.set()
+        release.wait(10)
+
+
+def test_cache_lock(tmp_dir):
+    cache_path = str(tmp_dir / 'cache.pyc')
+    context = multiprocessing.get_context('fork')
+    locked, release = context.Event(), context.Event()
+    process = context.Process(target=hold_lock, args=(cache_path, locked, release))
+    process.start()
+    try:
+        assert locked.wait(10)
+        # lock is held by other process, gives up after timeout.
+        start = time.monotonic()
+        with cache_lock(cache_path, 0.2) as waited:
+            assert 0.2 <= waited and time.monotonic() - start < 5
+        # waits till other process releases it.
+        context.Process(target=lambda: (time.sleep(0.2), release.set())).start()
+        with cache_lock(cache_path) as waited:
+            assert 0.1 < waited < 5
+    finally:
+        release.set()
+        process.join()
+    assert process.exitcode == 0
+    with cache_lock(cache_path) as waited:
+        assert waited == 0.0
+    # lock can not be created, used without it.
+    with cache_lock(str(tmp_dir / 'missing' / 'cache.pyc')) as waited:
+        assert waited == 0.0
+
+
+def test_importer_single_flight(tmp_dir):
+    pkg_dir = tmp_dir / 'flight_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter()\n')
+    for i in range(40):
+        (pkg_dir / 'sub' / f'mod_{i}.py').write_text(f'NAME_{i} = {i}\n')
+    export = tmp_dir / 'stats.jsonl'
+    env = {**os.environ, 'DYNAMIC_IMPORT_STATS': str(export)}
+    code = f'import sys\nsys.path[:0] = {[str(tmp_dir), *sys.path]!r}\nimport flight_pkg\n' \
+           'assert flight_pkg.NAME_39 == 39 and len(dir(flight_pkg)) > 40'
+    cache_path = pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'importer')
+
+    for state in ('cold', 'stale', 'corrupt'):
+        if state == 'stale':
+            (pkg_dir / 'sub' / 'mod_0.py').write_text('NAME_0 = 0\nSTALE = 1\n')
+        elif state == 'corrupt':
+            with open(cache_path, 'r+b') as file:
+                file.truncate(100)
+        export.unlink(missing_ok=True)
+        procs = [subprocess.Popen([sys.executable, '-c', code], env=env, stderr=subprocess.PIPE) for _ in range(8)]
+        for proc in procs:
+            assert proc.wait() == 0, proc.stderr.read()
+        events = [json.loads(line)['event'] for line in export.open()]
+        assert events.count('scan') == 1, state  # all other processes used its result.
+        assert events.count('importer') == 8
+
+
+def test_importer_cache_dir(tmp_dir):
+    pkg_dir = tmp_dir / 'dir_pkg'
+    pkg_dir.mkdir()
+    (pkg_dir / 'one.py').write_text('ONE = 1\n')
+    cache_dir = tmp_dir / 'cache'
+    cache_path = pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'importer', str(cache_dir))
+    code = f'import sys\nsys.path[:0] = {[str(tmp_dir), *sys.path]!r}\n{{}}import dir_pkg\n' \
+           'print(dir_pkg.ONE, *dir_pkg.__STATS__["counters"])'
+
+    def run(init, env=None, before=''):
+        (pkg_dir / '__init__.py').write_text(f'from dynamic_import import importer\nimporter({init})\n')
+        env = {**os.environ, 'XDG_CACHE_HOME': str(cache_dir), **(env or {})}
+        r = subprocess.run([sys.executable, '-c', code.format(before)], capture_output=True, text=True, env=env)
+        assert r.returncode == 0, r.stderr
+        return r.stdout.split()
+
+    # argument
+    assert 'scan' in run(f'cache_dir={str(cache_dir)!r}')
+    assert os.path.exists(cache_path) and not (pkg_dir / '__pycache__').exists()
+    assert 'cache_hit' in run(f'cache_dir={str(cache_dir)!r}')
+    # environment variable
+    assert 'cache_hit' in run('', {'DYNAMIC_IMPORT_CACHE': str(cache_dir)})
+    shutil.rmtree(cache_dir)
+
+    # package directory is read-only, user cache directory is used instead.
+    read_only = 'import dynamic_import\nsys.modules["dynamic_import.build"].cache_writable = ' \
+                'lambda path: "/dir_pkg/" not in path\n'
+    cache_path = pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'importer', str(cache_dir / 'dynamic_import'))
+    assert run('', before=read_only)[:3] == ['1', 'cache_miss.missing', 'scan']
+    assert os.path.exists(cache_path) and not (pkg_dir / '__pycache__').exists()
+    assert run('', before=read_only) == ['1', 'cache_hit', 'importer', 'load']
+    # cache can not be created anywhere, package is still imported.
+    shutil.rmtree(cache_dir)
+    cache_dir.write_text('not a directory')
+    assert 'scan' in run('', before=read_only)
@@ -1,6 +1,8 @@
+import os
 import re
 import pytest
-from dynamic_import.check import IMPORTER_CALLED, importer_called, exclude_dir_check, exclude_file_check
+from dynamic_import.check import IMPORTER_CALLED, importer_called, exclude_dir_check, exclude_file_check, \
+                                 workers_check, engine_check, validate_check, hot_check, cache_dir_check
 from dynamic_import.prep import EXT_SUFFIX
 
 
@@ -25,6 +27,13 @@ def test_importer_called():
     IMPORTER_CALLED[pkg_path2] = {'/path/new_pkg/sub_dir/sub_1/'}
     assert importer_called(pkg_path1) is None
 
+    # exclude pattern
+    IMPORTER_CALLED['/path/glob_pkg/'] = {'/path/glob_pkg/**/tests/'}
+    assert importer_called('/path/glob_pkg/one/tests/') is None
+    assert importer_called('/path/glob_pkg/tests/sub/') is None
+    with pytest.raises(ImportError):
+        importer_called('/path/glob_pkg/one/')
+
 
 def test_exclude_file_check(tmp_dir):
     pkg_name = 'pkg'
@@ -53,6 +62,9 @@ def test_exclude_file_check(tmp_dir):
     assert r == [str(file_path)]
     assert exclude_file_check('./file.py', pkg_name, pkg_path) == [str(file_path)]
     assert exclude_file_check(None, pkg_name, pkg_path) == []
+    # pattern is not checked for extension or existence
+    assert exclude_file_check(('**/test_*.py', 'sub/*.txt'), pkg_name, pkg_path) == \
+        [f'{pkg_path}**/test_*.py', f'{pkg_path}sub/*.txt']
 
 
 def test_exclude_dir_check(tmp_dir):
@@ -90,3 +102,57 @@ def test_exclude_dir_check(tmp_dir):
     assert exclude_dir_check(('sub-dir', 'sub/sub-dir'), pkg_path, recursive) == [f'{sub_dir}/', f'{sub_sub_dir}/']
     # holder
     assert IMPORTER_CALLED[pkg_path] == {f'{sub_dir}/', f'{sub_sub_dir}/'}
+    # pattern
+    assert exclude_dir_check(('**/tests', 'docs*/'), pkg_path, recursive) == \
+        [f'{pkg_path}**/tests/', f'{pkg_path}docs*/']
+    assert f'{pkg_path}**/tests/' in IMPORTER_CALLED[pkg_path]
+
+
+def test_workers_check():
+    assert workers_check(0) == 0
+    assert workers_check(4) == 4
+    for workers in (-3, 1.5, '2', None, True):
+        error = re.escape(f'`importer(workers)` received {workers!r} must be 0 or higher.')
+        with pytest.raises(ValueError, match=error):
+            workers_check(workers)
+
+
+def test_engine_check():
+    assert engine_check('ast') == 'ast'
+    assert engine_check('token') == 'token'
+    assert engine_check('bytecode') == 'bytecode'
+    error = re.escape("`importer(engine)` received 'bad' not supported. Only allowed: 'ast, token, bytecode'")
+    with pytest.raises(ValueError, match=error):
+        engine_check('bad')
+
+
+def test_validate_check():
+    assert validate_check('mtime_ns') == 'mtime_ns'
+    assert validate_check('hash') == 'hash'
+    assert validate_check('unchecked') == 'unchecked'
+    error = re.escape("`importer(validate)` received 'mtime' not supported. Only allowed: 'mtime_ns, hash, unchecked'")
+    with pytest.raises(ValueError, match=error):
+        validate_check('mtime')
+
+
+def test_hot_check():
+    for hot in (None, 'record', 'eager', 'background'):
+        assert hot_check(hot) == hot
+    error = re.escape("`importer(hot)` received 'lazy' not supported. Only allowed: 'None, record, eager, background'")
+    with pytest.raises(ValueError, match=error):
+        hot_check('lazy')
+
+
+def test_cache_dir_check(tmp_path, monkeypatch):
+    monkeypatch.delenv('DYNAMIC_IMPORT_CACHE', raising=False)
+    assert cache_dir_check(None) is None
+    assert cache_dir_check(str(tmp_path)) == str(tmp_path)
+    assert cache_dir_check('~/cache') == os.path.expanduser('~/cache')
+    monkeypatch.setenv('DYNAMIC_IMPORT_CACHE', str(tmp_path / 'env'))
+    assert cache_dir_check(None) == str(tmp_path / 'env')
+    assert cache_dir_check(str(tmp_path)) == str(tmp_path)  # argument is used over environment variable.
+    monkeypatch.setenv('DYNAMIC_IMPORT_CACHE', '')
+    assert cache_dir_check(None) is None
+    error = re.escape("`importer(cache_dir)` received 1 must be directory path or `None`")
+    with pytest.raises(ValueError, match=error):
+        cache_dir_check(1)
@@ -4,7 +4,14 @@ import sys
 import os.path
 import pytest
 import subprocess
-from dynamic_import.extract import extract_variable, extract_so_variable
+import py_compile
+from io import BytesIO
+from importlib.util import cache_from_source
+from dynamic_import.extract import extract_variable, parse_variable, token_variable, bytecode_variable, \
+                                   code_variable, code_indented, code_instructions, source_so_variable, pyx_variable, \
+                                   extract_so_variable
+from dynamic_import import extract
+from dynamic_import.prep import EXT_SUFFIX, prep_extract
 
 
 def test_extract_variable():
@@ -14,6 +21,240 @@ def test_extract_variable():
         extract_variable('test/basic/skip/bad_all.py')
 
 
+def test_extract_token_variable():
+    for path in ('test/basic/__init__.py', 'test/basic/one.py', 'test/basic/sub/auto_find.py',
+                 'test/basic/sub/four_five.py', 'test/conflict/my_func.py'):
+        assert extract_variable(path, 'token') == extract_variable(path)
+
+    error = "`__all__` values in 'test/basic/skip/bad_all.py' is not string!"
+    with pytest.raises(TypeError, match=re.escape(error)):
+        extract_variable('test/basic/skip/bad_all.py', 'token')
+
+
+def test_token_variable():
+    def token(content):
+        return token_variable(BytesIO(content.encode()).readline, 'file.py')
+
+    content = '''
+"""doc"""
+import os
+from sys import path
+one = 1; two = 2
+three: int = 3
+four += 1
+five == 5
+six = seven = 6
+if one:
+    eight = 8
+class Nine: ten = 10
+@decorator(arg=1)
+def eleven(a=1, *, b={'c': 1}):
+    twelve = """
+thirteen = 13
+"""
+async def fourteen():
+    pass
+fifteen = lambda x=1: x
+sixteen = (
+    1)
+'''
+    names = ['one', 'two', 'six', 'Nine', 'eleven', 'fourteen', 'fifteen', 'sixteen']
+    assert token(content) == names
+    assert parse_variable(content.encode(), 'file.py', 'token') == names
+    assert parse_variable(content.encode(), 'file.py') == names
+
+    # stops at `__all__`, rest is not even valid.
+    assert token('one = 1\n__all__ = ("one",\n    "two")\n)(((') == ('one', 'two')
+    assert token('__all__ = ["one"]\n') == ['one']
+    assert token('__all__ = "one"\n') == ('one',)
+
+    # can not decide, falls back to `ast`
+    assert token('one.two = 1\n') is None
+    assert token('one, two = 1, 2\n') is None
+    assert token('(one) = 1\n') is None
+    assert token('__all__ = names\n') is None
+    assert token('__all__ = one = ["one"]\n') is None
+    assert token('one = (\n') is None
+    assert token('one = "two\n') is None
+    assert token('one = f"{two["three"]}"\n') is None
+    assert parse_variable(b'(one) = 1\n', 'file.py', 'token') == ['one']
+    with pytest.raises(SyntaxError):
+        parse_variable(b'one = (\n', 'file.py', 'token')
+
+    # strings, escapes, line continuation
+    content = 'one = "t\\"wo"; two = \'\'\'\nthree = 3\n\'\'\'\nfour = \\\n    5\nfive = f"{six!r:>{seven}}"\n'
+    assert token(content) == ['one', 'two', 'four', 'five']
+
+
+def test_bytecode_variable(tmp_dir):
+    path = tmp_dir / 'one.py'
+    path.write_text('__all__ = ["one"]\none = 1\n')
+    assert bytecode_variable(str(path)) is None  # `.pyc` does not exist.
+    assert extract_variable(str(path), 'bytecode') == ['one']
+
+    py_compile.compile(str(path), doraise=True)
+    assert bytecode_variable(str(path)) == ['one']
+
+    # stale `.pyc` is not used.
+    path.write_text('__all__ = ["one", "two"]\none = 1\ntwo = 2\n')
+    assert bytecode_variable(str(path)) is None
+    assert extract_variable(str(path), 'bytecode') == ['one', 'two']
+
+    # hash based `.pyc`
+    for mode in (py_compile.PycInvalidationMode.CHECKED_HASH, py_compile.PycInvalidationMode.UNCHECKED_HASH):
+        py_compile.compile(str(path), doraise=True, invalidation_mode=mode)
+        assert bytecode_variable(str(path)) == ['one', 'two']
+        assert parse_variable(path.read_bytes(), str(path), 'bytecode') == ['one', 'two']
+        assert bytecode_variable(str(path), b'changed = 1') is None
+
+    # broken `.pyc`
+    with open(cache_from_source(str(path)), 'r+b') as file:
+        file.truncate(20)
+    assert bytecode_variable(str(path)) is None
+    assert extract_variable(str(path), 'bytecode') == ['one', 'two']
+
+
+def test_code_variable():
+    def code(content):
+        return code_variable(compile(content, 'file.py', 'exec'), 'file.py', content.encode())
+
+    content = '''
+"""doc"""
+import os
+import os.path as path
+from sys import version, platform
+one = 1
+two = three = None if os else 2
+if one:
+    four = 4
+elif two:
+    five = 5
+else:
+    six = 6
+seven = 7 if one else 8
+del seven
+@decorator
+def eight():
+    nine = 9
+class Ten:
+    eleven = 11
+async def twelve():
+    pass
+if __name__ == '__main__':
+    thirteen = 13
+'''
+    assert code(content) is None  # `two = three = ...` can not decide
+    content = content.replace('two = three =', 'two =')
+    assert code(content) == ['one', 'two', 'seven', 'eight', 'Ten', 'twelve']
+    assert code(content) == parse_variable(content.encode(), 'file.py')
+
+    assert code('one = 1\n__all__ = ["one", "two"]\nthree = 3') == ['one', 'two']
+    assert code('__all__ = "one", "two"') == ('one', 'two')
+    assert code('__all__ = "one"') == ('one',)
+    assert code('__all__ = ["one"]') == ['one']
+    with pytest.raises(TypeError, match=re.escape("`__all__` values in 'file.py' is not string!")):
+        code('__all__ = 1.5')
+
+    # constant `if` test is removed by compiler, block is left as top-level code.
+    for content in ('if __debug__:\n    DEBUG_ONLY = 1\none = 1', 'if True:\n    one = 1',
+                    'if False:\n    pass\nelse:\n    one = 1'):
+        assert code(content) is None, content
+    assert code('one = (\n    1)\n@decorator\ndef two():\n    three = 3\n') == ['one', 'two']
+
+    # can not decide
+    for content in ('__all__ = names', 'one.two = 1', 'one, two = 1, 2', 'one: int = 1', 'one += 1',
+                    'for one in two: pass', 'try:\n    import one\nexcept ImportError:\n    one = None',
+                    'with one as two: pass', 'one, two = two, one', '(one := 1)'):
+        assert code(content) is None, content
+
+
+def test_code_indented(monkeypatch):
+    content = 'one = (\n    1)\nif __debug__:\n    two = 2\nthree = 3\n'
+    code = compile(content, 'file.py', 'exec')
+    stored = {i.offset: i.argval for i in code_instructions(code) if i.opname == 'STORE_NAME'}
+    assert sorted(stored[i] for i in code_indented(code, content.encode()) if i in stored) == ['two']
+    if extract.POSITIONS:
+        assert code_indented(code) == code_indented(code, content.encode())  # source is not needed.
+    else:
+        assert code_indented(code) is None
+
+    # python3.9 - 3.10 has no columns, indentation is read from source.
+    monkeypatch.setattr(extract, 'POSITIONS', False)
+    assert code_indented(code) is None
+    assert code_variable(code, 'file.py') is None
+    assert sorted(stored[i] for i in code_indented(code, content.encode()) if i in stored) == ['two']
+    assert code_variable(code, 'file.py', content.encode()) is None
+    assert code_variable(compile('one = 1', 'file.py', 'exec'), 'file.py', b'one = 1') == ['one']
+
+
+def test_source_so_variable(tmp_dir):
+    so_file = tmp_dir / f'one{EXT_SUFFIX[1]}'
+    so_file.write_bytes(b'')
+    assert source_so_variable(str(so_file)) is None
+
+    (tmp_dir / 'one.py').write_text('ONE = 1\n')
+    assert source_so_variable(str(so_file)) == ['ONE']
+    (tmp_dir / 'one.pyx').write_text('cpdef one(): pass\n')
+    assert source_so_variable(str(so_file)) == ['one']
+    (tmp_dir / 'one.pyi').write_text('def stub() -> None: ...\n')
+    assert source_so_variable(str(so_file)) == ['stub']
+    (tmp_dir / 'one.pyi').write_text('def bad(\n')
+    assert source_so_variable(str(so_file)) is None
+
+
+def test_pyx_variable(tmp_dir):
+    path = tmp_dir / 'file.pyx'
+
+    def pyx(content):
+        path.write_text(content)
+        return pyx_variable(str(path))
+
+    content = '''# cython: language_level=3
+"""doc"""
+cimport cython
+from libc.math cimport sqrt
+import os
+DEF SIZE = 10
+cdef int hidden = 1
+cdef:
+    int also_hidden
+cpdef int hello(int name) except -1:
+    cdef int x = <int>name
+    return x
+
+@cython.boundscheck(False)
+def world(*args):
+    pass
+
+cdef class Point:
+    cdef public double x
+cdef public class Vector [object VectorObject, type VectorType]:
+    pass
+cpdef enum Color:
+    RED
+cdef extern from "math.h":
+    double cos(double)
+cdef inline int fast(int a): return a
+ctypedef int number
+async def coroutine(): pass
+class Python(object): pass
+value = {'a': [1,
+               2]}
+if value:
+    skipped = 1
+'''
+    assert pyx(content) == ['hello', 'world', 'Point', 'Vector', 'Color', 'coroutine', 'Python', 'value']
+    assert pyx('__all__ = ["one",  # comment\n           "two"]\ncpdef one(): pass\n') == ['one', 'two']
+    assert pyx('__all__ = "one"\n') == ('one',)
+    with pytest.raises(TypeError, match=re.escape(f"`__all__` values in {str(path)!r} is not string!")):
+        pyx('__all__ = 1\n')
+    # can not decide
+    assert pyx('include "other.pxi"\n') is None
+    assert pyx('__all__ = names\n') is None
+    assert pyx('def one(:\n') is None
+    assert pyx_variable(str(tmp_dir / 'missing.pyx')) is None
+
+
 if exec_path := os.path.dirname(sys.executable):
     cythonize = os.path.join(exec_path, 'cythonize')  # '/path/python3' to '/path/cythonize'
     skip_cython = not os.path.exists(cythonize)  # check if cython + cythonize is installed
@@ -56,6 +297,13 @@ def test_extract_so_variable(tmp_dir):
         # add 'pkg' to sys path
         sys.path.append(str(pkg_path))
 
+        # names are read from `.pyx` next to `.so`, or by importing it inside worker process.
+        one_so = next(pkg_path.glob('one.*.so'))
+        assert prep_extract('one', str(one_so)) == ['hello_one']
+        one_pyx.unlink()
+        assert prep_extract('one', str(one_so)) == ['hello_one']
+        assert 'one' not in sys.modules
+
         # one - no `__all__`
         assert extract_so_variable('one') == ['hello_one']
         from pkg.one import hello_one
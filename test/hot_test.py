@@ -0,0 +1,55 @@
+import sys
+import subprocess
+from dynamic_import.hot import dump_hot, load_hot
+from dynamic_import.cache import pkg_cache_path
+from dynamic_import.version import version
+
+
+def run(tmp_dir, code):
+    ''' Run `code` in new python process, so `atexit` & start-up happen for real '''
+    env_path = [str(tmp_dir), *sys.path]
+    code = f'import sys\nsys.path[:0] = {env_path!r}\n{code}'
+    r = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
+    return r.stdout.split()
+
+
+def test_dump_load_hot(tmp_dir):
+    hot_path = str(tmp_dir / 'hot.pyc')
+    info = {'one': None, 'two': None}
+    assert load_hot(hot_path, version, info) == []  # missing
+    dump_hot(hot_path, [], version)
+    assert load_hot(hot_path, version, info) == []  # nothing used, nothing saved.
+    dump_hot(hot_path, ['two', 'gone', 'one', 'two'], version)
+    assert load_hot(hot_path, version, info) == ['two', 'one']
+    assert load_hot(hot_path, 'other-version', info) == []
+    (tmp_dir / 'hot.pyc').write_bytes(b'corrupt')
+    assert load_hot(hot_path, version, info) == []
+
+
+def test_importer_hot(tmp_dir):
+    pkg_dir = tmp_dir / 'hot_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / 'one.py').write_text('ONE = 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\nDOS = 2\n')
+    (pkg_dir / 'sub' / 'three.py').write_text('THREE = 3\n')
+    init = 'from dynamic_import import importer\nimporter(hot={!r})\n'
+    loaded = 'print(*sorted(i for i in sys.modules if i.startswith("hot_pkg.")))'
+
+    # record
+    (pkg_dir / '__init__.py').write_text(init.format('record'))
+    assert run(tmp_dir, 'import hot_pkg\nhot_pkg.DOS, hot_pkg.ONE, hot_pkg.TWO\nprint(*hot_pkg.__HOT__)') == \
+        ['DOS', 'ONE']
+    hot_path = pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'hot')
+    assert load_hot(hot_path, version, {'ONE': 1, 'DOS': 2}) == ['DOS', 'ONE']
+
+    # nothing is loaded unless asked to.
+    (pkg_dir / '__init__.py').write_text(init.format(None))
+    assert run(tmp_dir, f'import hot_pkg\n{loaded}') == []
+
+    (pkg_dir / '__init__.py').write_text(init.format('eager'))
+    assert run(tmp_dir, f'import hot_pkg\n{loaded}') == ['hot_pkg.one', 'hot_pkg.sub', 'hot_pkg.sub.two']
+
+    (pkg_dir / '__init__.py').write_text(init.format('background'))
+    assert run(tmp_dir, f'import hot_pkg\nprint(*hot_pkg.__WARMUP__.result(5))\n{loaded}') == \
+        ['hot_pkg.sub.two', 'hot_pkg.one', 'hot_pkg.one', 'hot_pkg.sub', 'hot_pkg.sub.two']
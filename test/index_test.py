@@ -0,0 +1,153 @@
+import os
+import sys
+import pytest
+import subprocess
+from dynamic_import.version import version
+from dynamic_import.cache import pkg_cache_path, create_cache_dir, dir_stamp, file_stamp, cache_key
+from dynamic_import.index import INDEX_MAGIC, Index, dump_index, index_open, load_index, index_check, index_files, \
+                                 dump_bundle, load_bundle
+from dynamic_import.build import build_package, build_bundle, build_inspect
+from dynamic_import.stats import new_stats
+
+
+def make_info(modules):
+    info = {}
+    for i in range(modules):
+        variables = (f'name_{i}', f'NAME_{i}', f'Name{i}')
+        for var in variables:
+            info[var] = (f'pkg.m{i}', f'/path/pkg/m{i}.py', variables, (i, 10))
+    return info
+
+
+def test_index(tmp_dir):
+    index_path = str(tmp_dir / 'index.pyc')
+    info = make_info(1000)
+    files = {'/path/pkg/m0.py': ('pkg.m0', ('name_0', 'NAME_0', 'Name0'), (0, 10))}
+    dump_index(index_path, info, True, [], ['/path/pkg/skip/'], {'/path/pkg/': 1}, version, files)
+    with open(index_path, 'rb') as file:
+        assert file.read(4) == INDEX_MAGIC
+
+    index = Index(index_open(index_path))
+    assert len(index) == 3000 and index.files == 1000
+    assert list(index) == list(info)
+    assert dict(index) == info
+    assert index['NAME_7'] == info['NAME_7']
+    assert index['name_7'] is index['Name7']  # names of same file share entry.
+    assert 'name_999' in index and 'name_1000' not in index and 1 not in index
+    with pytest.raises(KeyError):
+        index['missing']
+    assert index.get('missing') is None
+    assert index.options() == (version, True, [], ['/path/pkg/skip/'], {'/path/pkg/': 1}, 'mtime_ns')
+    assert index.extraction() == files
+    assert index_files(index_path, version) == files
+    assert index_files(index_path, 'other') == {}
+    assert index_files(index_path, version, 'hash') == {}
+
+    # changed in memory only, e.g. by `refresh_info()`
+    del index['name_0']
+    index['NEW'] = index['name_1'] = ('pkg.m1', '/path/pkg/m1.py', ('name_1', 'NEW'), (1, 11))
+    assert 'name_0' not in index and index['NEW'][3] == (1, 11) and index['name_1'][3] == (1, 11)
+    assert len(index) == 3000
+    assert list(index)[:2] == ['NAME_0', 'Name0'] and list(index)[-2:] == ['NEW', 'name_1']
+    with pytest.raises(KeyError):
+        del index['name_0']
+    index['name_0'] = info['name_0']
+    assert index['name_0'] == info['name_0'] and len(index) == 3001
+    assert Index(index_open(index_path))['name_1'] == info['name_1']
+
+    dump_index(index_path, {}, True, [], [], {}, version)
+    index = Index(index_open(index_path))
+    assert len(index) == 0 and list(index) == [] and 'name_0' not in index
+
+
+def test_index_check(tmp_dir):
+    (tmp_dir / 'sub').mkdir()
+    tmp_one = tmp_dir / 'sub' / 'one.py'
+    tmp_one.write_text('ONE = 1')
+    index_path = pkg_cache_path(tmp_dir, '__init__.py', 'index')
+    create_cache_dir(index_path)
+    dir_mtime = {f'{tmp_dir}/': dir_stamp(str(tmp_dir), 'mtime_ns'),
+                 f'{tmp_dir}/sub/': dir_stamp(str(tmp_dir / 'sub'), 'mtime_ns')}
+    info = {'ONE': ('pkg.sub.one', str(tmp_one), ['ONE'], file_stamp(str(tmp_one), 'mtime_ns'))}
+    dump_index(index_path, info, True, [], [], dir_mtime, version)
+    assert dict(load_index(index_path, True, [], [], version)) == info
+
+    stats = new_stats('pkg')
+    assert load_index(index_path, True, [], [], 'other', stats=stats) is None
+    assert load_index(index_path, True, [], ['x'], version, stats=stats) is None
+    assert load_index(index_path, True, [], [], version, 'hash', stats=stats) is None
+    os.utime(tmp_one, ns=(1, 1))
+    assert index_check(index_path, True, [], [], version) == (None, ('file', str(tmp_one)))
+    assert load_index(index_path, True, [], [], version, defer=True) is not None
+    assert load_index(index_path, True, [], [], version, stats=stats) is None
+    with open(index_path, 'r+b') as file:
+        file.truncate(os.path.getsize(index_path) // 2)  # cut short
+    assert load_index(index_path, True, [], [], version, stats=stats) is None
+    assert stats['counters'] == {'cache_miss.version': 1, 'cache_miss.exclude_dir': 1, 'cache_miss.validate': 1,
+                                 'cache_miss.file': 1, 'cache_miss.error': 1}
+
+
+def test_bundle(tmp_dir):
+    one_path, two_path = str(tmp_dir / 'one.pyc'), str(tmp_dir / 'two.pyc')
+    bundle_path = str(tmp_dir / 'app.idx')
+    one, two = make_info(3), make_info(5)
+    dump_index(one_path, one, True, [], [], {}, version, validate='unchecked')
+    dump_index(two_path, two, False, [], [], {}, version, validate='unchecked')
+    dump_bundle(bundle_path, {'/path/one/': one_path, '/path/two/': two_path})
+
+    stats = new_stats('pkg')
+    assert dict(load_bundle(bundle_path, '/path/one/', True, [], [], version, 'unchecked', stats=stats)) == one
+    assert dict(load_bundle(bundle_path, '/path/two/', False, [], [], version, 'unchecked', stats=stats)) == two
+    assert load_bundle(bundle_path, '/path/other/', True, [], [], version, 'unchecked', stats=stats) is None
+    assert load_bundle(bundle_path, '/path/two/', True, [], [], version, 'unchecked', stats=stats) is None
+    assert load_bundle(str(tmp_dir / 'missing.idx'), '/path/one/', True, [], [], version, stats=stats) is None
+    assert stats['counters'] == {'cache_miss.recursive': 1, 'cache_miss.error': 1}
+
+    with open(one_path, 'wb') as file:
+        file.write(b'not an index')
+    with pytest.raises(ValueError, match='is not an index cache'):
+        dump_bundle(bundle_path, {'/path/one/': one_path})
+    assert cache_key('/path/one/') != cache_key('/path/two/')
+
+
+def test_importer_index(tmp_dir):
+    pkg_dir = tmp_dir / 'index_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(index=True, defer=True)\n')
+    (pkg_dir / 'one.py').write_text('def one():\n    return 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\n')
+    code = 'import index_pkg as pkg\n' \
+           'print(type(pkg.__INFO__).__name__, *pkg.__STATS__["counters"])\n' \
+           'print(pkg.one(), pkg.TWO, *(i for i in dir(pkg) if i[0] != "_"))\n'
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([str(tmp_dir), *sys.path])}
+    env.pop('DYNAMIC_IMPORT_BUNDLE', None)
+
+    def run():
+        r = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+        assert r.returncode == 0, r.stderr
+        return r.stdout.splitlines()
+
+    assert run() == ['Info cache_miss.missing scan importer', '1 2 TWO one']
+    assert run() == ['Index cache_hit importer', '1 2 TWO one']
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\nTHREE = 3\n')  # re-extracted on first use.
+    assert run() == ['Index cache_hit importer', '1 2 THREE TWO one']
+
+    # bundle is used even without `importer(index=True)`
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter()\n')
+    sys.path.insert(0, str(tmp_dir))
+    try:
+        assert build_package('index_pkg', {'index': True})['status'] == 'built'
+        r = build_bundle(str(tmp_dir / 'app.idx'), ['index_pkg'])
+        assert r['packages'] == 1 and r['size'] == os.path.getsize(tmp_dir / 'app.idx')
+        r = build_inspect(pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'index'))
+        assert r['format'] == 'index' and r['names'] == {'THREE': 'index_pkg.sub.two', 'TWO': 'index_pkg.sub.two',
+                                                         'one': 'index_pkg.one'}
+        assert build_package('index_pkg')['status'] == 'built'
+        assert build_inspect(pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'importer'))['format'] == 'marshal'
+    finally:
+        sys.path.remove(str(tmp_dir))
+    os.remove(pkg_cache_path(f'{pkg_dir}/', '__init__.py', 'index'))
+    env['DYNAMIC_IMPORT_BUNDLE'] = str(tmp_dir / 'app.idx')
+    assert run() == ['Index cache_hit importer', '1 2 THREE TWO one']
+    (pkg_dir / 'four.py').write_text('FOUR = 4\n')
+    assert run() == ['Info cache_miss.dir scan importer', '1 2 FOUR THREE TWO one']  # falls back to package cache.
@@ -0,0 +1,49 @@
+import sys
+from marshal import dumps, loads
+from dynamic_import.info import Info, pack_info, unpack_info
+
+
+def test_info():
+    info = Info()
+    info.add('pkg.one', '/path/pkg/one.py', ['one', 'ONE', '__version__'], (1234500000000, 15))
+    info.add('pkg.two', '/path/pkg/two.py', ('two',), b'hash')
+    info.add('pkg.zip', None, ('zip',), None)
+    assert len(info) == 4 and list(info) == ['one', 'ONE', 'two', 'zip']  # special name is skipped.
+    assert info['ONE'] == ('pkg.one', '/path/pkg/one.py', ['one', 'ONE', '__version__'], (1234500000000, 15))
+    assert info['two'][3] == b'hash' and info['zip'][3] is None
+    assert info.names['one'] is info.names['ONE']  # names of same module share record.
+    assert info.get('missing') is None and 'missing' not in info
+    assert info == dict(info)
+    assert sys.intern(''.join(['O', 'NE'])) is info['ONE'][2][1]
+
+    del info['one']
+    info['NEW'] = ('pkg.two', '/path/pkg/two.py', ('two', 'NEW'), (1, 2))
+    assert info['NEW'][3] == (1, 2) and len(info.mtimes) == 4
+    assert sorted(info.modules()) == [0, 1, 2, 3]
+    del info['ONE']
+    assert sorted(info.modules()) == [1, 2, 3]
+
+    # dict entries of same module share record, e.g. `refresh_info()` or `Info(dict)`
+    variables = ('a', 'b')
+    data = {'a': ('pkg.a', '/path/pkg/a.py', variables, (1, 1)), 'b': ('pkg.a', '/path/pkg/a.py', variables, (1, 1))}
+    info = Info(data)
+    assert info == data and info.names['a'] is info.names['b'] and len(info.mtimes) == 1
+
+
+def test_pack_info():
+    info = Info()
+    info.add('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15))
+    info.add('pkg.two', '/path/pkg/two.py', ['two', 'TWO', '__all__'], b'hash')
+    info.add('pkg.zip', None, ('zip',), None)
+    del info['TWO']
+    packed = pack_info(info)
+    assert packed == (('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15), ('one', 'ONE')),
+                      ('pkg.two', '/path/pkg/two.py', ['two', 'TWO', '__all__'], b'hash', ('two',)),
+                      ('pkg.zip', None, ('zip',), None, ('zip',)))
+    assert packed[0][2] is packed[0][4]  # stored once by marshal.
+    info = unpack_info(loads(dumps(packed)))
+    assert dict(info) == {'one': ('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15)),
+                          'ONE': ('pkg.one', '/path/pkg/one.py', ('one', 'ONE'), (1234500000000, 15)),
+                          'two': ('pkg.two', '/path/pkg/two.py', ['two', 'TWO', '__all__'], b'hash'),
+                          'zip': ('pkg.zip', None, ('zip',), None)}
+    assert pack_info(Info()) == () and len(unpack_info(())) == 0
@@ -1,8 +1,13 @@
+import gc
 import re
+import sys
+import time
+import pickle
 import pytest
+import threading
 from types import ModuleType
 from dynamic_import.prep import EXT_SUFFIX, prep_package
-from dynamic_import.module import Module
+from dynamic_import.module import Module, refresh_info, warmup_names
 
 
 def test_module():
@@ -29,20 +34,227 @@ def test_module():
     module = Module(pkg_name, info, ModuleType)
     assert [i for i in sorted(dir(module)) if i[0] != "_"] == sorted(find)
 
-    with pytest.raises(NotImplementedError, match=re.escape("`Module()` 'test/basic/bad_ext.bad' extension type.")):
+    # loaded through import system, which only finds modules by their import name.
+    with pytest.raises(ModuleNotFoundError, match="No module named 'basic.bad_ext'"):
         module.bad_ext
+    for i, ext in enumerate(EXT_SUFFIX):
+        with pytest.raises(ModuleNotFoundError, match=f"No module named 'basic.file_{i}'"):
+            getattr(module, f'file_{i}')
 
-    # with pytest.raises(NotImplementedError, match=re.escape("`Module()` 'test/basic/so_file.so' extension type.")):
-    #     module.so_file
 
-    # check
-    for i, ext in enumerate(EXT_SUFFIX):
-        if ext == '.py':
-            with pytest.raises(FileNotFoundError):
-                getattr(module, f'file_{i}')
-        else:
-            with pytest.raises(ImportError):
-                getattr(module, f'file_{i}')
+def test_module_defer(tmp_dir):
+    pkg_dir = tmp_dir / 'defer_pkg'
+    pkg_dir.mkdir()
+    (pkg_dir / 'one.py').write_text('ONE = 1\nUNO = 1\n')
+    (pkg_dir / 'two.py').write_text('TWO = 2\n')
+    (pkg_dir / 'three.py').write_text('THREE = 3\n')
+    info, _ = prep_package('defer_pkg', f'{pkg_dir}/', True, [], [])
+    assert refresh_info(info, 'ONE', 'mtime_ns', 'ast') is True
+
+    sys.path.append(str(tmp_dir))  # note: modules are loaded through import system.
+    try:
+        module = Module('defer_pkg', info, ModuleType)
+        module.__CHECK__ = ('mtime_ns', 'ast')
+        # unchanged
+        assert module.TWO == 2
+        # changed after cache was created, only this file is extracted again.
+        (pkg_dir / 'one.py').write_text('ONE = 11\nFIRST = 1\n')
+        assert module.ONE == 11
+        assert module.FIRST == 1
+        assert 'UNO' not in dir(module) and 'FIRST' in dir(module)
+        with pytest.raises(AttributeError):
+            module.UNO
+        # removed
+        (pkg_dir / 'three.py').unlink()
+        with pytest.raises(AttributeError):
+            module.THREE
+        assert 'THREE' not in info
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_module_all():
+    class Names(dict):
+        listed = 0
+
+        def __iter__(self):
+            Names.listed += 1
+            return super().__iter__()
+
+    info = Names(one=('lazy_pkg.one', 'lazy_pkg/one.py', ('one', 'ONE'), None),
+                 ONE=('lazy_pkg.one', 'lazy_pkg/one.py', ('one', 'ONE'), None))
+    module = Module('lazy_pkg', info, ModuleType)
+    assert Names.listed == 0 and '__all__' not in module.__dict__  # e.g. `Index` names are not decoded.
+    assert {'one', 'ONE'} <= set(dir(module)) and Names.listed == 1
+    assert module.__all__[-2:] == ('one', 'ONE') and module.__all__ is module.__all__ and Names.listed == 1
+
+
+def test_module_once(tmp_dir):
+    pkg_dir = tmp_dir / 'once_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / 'sub' / 'deep').mkdir()
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\nINIT = 1\n')
+    (pkg_dir / 'sub' / 'one.py').write_text('import builtins\n'
+                                            'builtins.__dict__.setdefault("once_pkg_loads", []).append(1)\n'
+                                            'def one():\n    return 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('from .one import one\n__all__ = "two"\ndef two():\n    return one() + 1\n')
+    (pkg_dir / 'sub' / 'deep' / '__init__.py').write_text('DEEP = "deep"\n')
+    (pkg_dir / 'sub' / 'deep' / 'three.py').write_text('from . import DEEP\nTHREE = DEEP\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import once_pkg
+        assert once_pkg.INIT == 1  # from `__init__.py` without running it again.
+        assert once_pkg.one() == 1
+        assert 'once_pkg.sub.one' in sys.modules
+        assert isinstance(sys.modules['once_pkg.sub'], ModuleType)  # namespace package created.
+        assert list(sys.modules['once_pkg.sub'].__path__) == [str(pkg_dir / 'sub')]
+
+        # normal & relative import reuse loaded module.
+        import once_pkg.sub.one
+        assert once_pkg.sub.one.one is once_pkg.one
+        assert once_pkg.two() == 2
+        import builtins
+        assert builtins.once_pkg_loads == [1]
+
+        # sub-package `__init__.py` is loaded as parent.
+        assert once_pkg.THREE == 'deep'
+        assert sys.modules['once_pkg.sub.deep'].DEEP == 'deep'
+
+        # functions can be pickled
+        assert pickle.loads(pickle.dumps(once_pkg.one)) is once_pkg.one
+
+        # sub-module set by import system is not listed.
+        assert 'sub' not in dir(once_pkg) and {'INIT', 'one', 'two', 'THREE'} <= set(dir(once_pkg))
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_module_threads(tmp_dir):
+    pkg_dir = tmp_dir / 'thread_pkg'
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\n')
+    for name in ('one', 'two'):
+        (pkg_dir / f'{name}.py').write_text('import time, builtins\n'
+                                            f'builtins.__dict__.setdefault("thread_pkg_loads", []).append({name!r})\n'
+                                            'time.sleep(0.5)\n'
+                                            f'{name.upper()} = object()\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import thread_pkg
+        barrier = threading.Barrier(16)
+        found = []
+
+        def first_access(name):
+            barrier.wait()
+            found.append((name, getattr(thread_pkg, name)))
+
+        threads = [threading.Thread(target=first_access, args=('ONE' if i % 2 else 'TWO',)) for i in range(16)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # each module loaded once & different modules are loaded at the same time.
+        assert time.perf_counter() - start < 0.95
+        import builtins
+        assert sorted(builtins.thread_pkg_loads) == ['one', 'two']
+        assert len(found) == 16
+        assert all(value is getattr(thread_pkg, name) for name, value in found)
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_module_warmup(tmp_dir):
+    pkg_dir = tmp_dir / 'warm_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\nINIT = 1\n')
+    (pkg_dir / 'one.py').write_text('ONE = 1\nUNO = 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\n')
+    (pkg_dir / 'sub' / 'three.py').write_text('THREE = 3\n')
+    (pkg_dir / 'sub' / 'error.py').write_text('ERROR = 1 / 0\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import warm_pkg
+        info = warm_pkg.__INFO__
+        assert warmup_names(info, 'warm_pkg', ['ONE', 'UNO', 'TWO', 'INIT']) == {'warm_pkg.one': 'ONE',
+                                                                                 'warm_pkg.sub.two': 'TWO'}
+        assert sorted(warmup_names(info, 'warm_pkg', 'sub')) == sorted(warmup_names(info, 'warm_pkg', 'warm_pkg.sub'))
+        assert sorted(warmup_names(info, 'warm_pkg')) == ['warm_pkg.one', 'warm_pkg.sub.error',
+                                                          'warm_pkg.sub.three', 'warm_pkg.sub.two']
+        with pytest.raises(AttributeError, match="module 'warm_pkg' has no attribute 'BAD'"):
+            warm_pkg.__warmup__(['BAD'])
+        with pytest.raises(ValueError, match=re.escape('`__warmup__(workers)` received 0 must be 1 or higher.')):
+            warm_pkg.__warmup__(workers=0)
+
+        assert warm_pkg.__warmup__(['INIT']).result() == []
+        assert warm_pkg.__warmup__(['UNO']).result(5) == ['warm_pkg.one']
+        assert 'ONE' in warm_pkg.__dict__ and 'TWO' not in warm_pkg.__dict__
+        assert 'ONE' not in info and 'UNO' not in info and 'ONE' in dir(warm_pkg)  # dropped once loaded.
+        assert warmup_names(info, 'warm_pkg', ['ONE', 'TWO'], warm_pkg.__dict__) == {'warm_pkg.sub.two': 'TWO'}
+        # original package module forwards names, still found after they are dropped.
+        orig = warm_pkg.__MODULE__
+        assert orig.UNO == 1 and orig.UNO == 1 and orig.INIT == 1
+        with pytest.raises(AttributeError, match="module 'warm_pkg' has no attribute 'BAD'"):
+            orig.BAD
+
+        future = warm_pkg.__warmup__('sub', 2)
+        with pytest.raises(ZeroDivisionError):
+            future.result(5)
+        assert warm_pkg.__dict__['TWO'] == 2 and warm_pkg.__dict__['THREE'] == 3  # others still loaded.
+        assert 'warm_pkg.sub.error' not in sys.modules
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_module_prefork(tmp_dir):
+    pkg_dir = tmp_dir / 'fork_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\n')
+    (pkg_dir / 'one.py').write_text('import fork_pkg.sub.three\nONE = bytearray(100_000)\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\n')
+    (pkg_dir / 'sub' / 'three.py').write_text('THREE = 3\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import fork_pkg
+        r = fork_pkg.__prefork__(['ONE'], False)
+        assert r['loaded'] == ['fork_pkg.one']
+        assert r['modules'] == 3  # `three` (& its parent `sub`) is imported by `one`
+        assert r['bytes'] >= 100_000
+        assert 'ONE' in fork_pkg.__dict__ and 'TWO' not in fork_pkg.__dict__
+
+        try:
+            r = fork_pkg.__prefork__()
+            assert sorted(r['loaded']) == ['fork_pkg.sub.three', 'fork_pkg.sub.two']  # `one` is already loaded.
+            assert r['modules'] == 1
+            assert r['frozen'] > 0 and gc.get_freeze_count() > 0
+        finally:
+            gc.unfreeze()
+        assert all(name in fork_pkg.__dict__ for name in ('ONE', 'TWO', 'THREE'))
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_module_missing(tmp_dir):
+    pkg_dir = tmp_dir / 'missing_pkg'
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('__all__ = ("INIT", "gone")\n'
+                                         'from dynamic_import import importer\nimporter(cache=False)\nINIT = 1\n')
+    (pkg_dir / 'one.py').write_text('__all__ = ("one", "missing")\ndef one():\n    return 1\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import missing_pkg
+        assert missing_pkg.INIT == 1
+        # listed in `__all__` but never defined, original package module forwards it back to `Module`.
+        with pytest.raises(AttributeError, match="module 'missing_pkg' has no attribute 'gone'"):
+            missing_pkg.gone
+        with pytest.raises(AttributeError, match="module 'missing_pkg' has no attribute 'gone'"):
+            missing_pkg.__MODULE__.gone
+        # fully loaded module is not reported as circular import.
+        with pytest.raises(AttributeError, match="^module 'missing_pkg.one' has no attribute 'missing'"):
+            missing_pkg.missing
+        assert missing_pkg.one() == 1
+    finally:
+        sys.path.remove(str(tmp_dir))
 
 
 def test_calling_from_not_init():
@@ -0,0 +1,86 @@
+import re
+import sys
+import pytest
+import threading
+from dynamic_import import pool
+from dynamic_import.pool import MIN_FILES, pool_workers, pool_fork, pool_variables, pool_so_variables
+from dynamic_import.prep import prep_package
+
+
+def test_pool_workers():
+    assert pool_workers(4) == 4
+    assert pool_workers(0) >= 1
+    with pytest.raises(ValueError, match=re.escape('`importer(workers)` received -1 must be 0 or higher.')):
+        pool_workers(-1)
+
+
+def test_pool_variables():
+    file_paths = ['test/basic/__init__.py', 'test/basic/one.py', 'test/basic/sub/auto_find.py']
+    assert pool_variables(file_paths, 2) == [('DEFINE', 're_import'),
+                                             ('one',),
+                                             ['my_function', 'var', 'MyClass', 'my_async_func']]
+    error = "`__all__` values in 'test/basic/skip/bad_all.py' is not string!"
+    with pytest.raises(TypeError, match=re.escape(error)):
+        pool_variables(['test/basic/one.py', 'test/basic/skip/bad_all.py'], 2)
+
+
+def test_prep_package_workers(tmp_dir):
+    pkg_name = 'pool_pkg'
+    pkg_dir = tmp_dir / pkg_name
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('')
+    for i in range(MIN_FILES + 1):
+        sub_dir = pkg_dir / f'sub_{i % 3}'
+        sub_dir.mkdir(exist_ok=True)
+        (sub_dir / f'mod_{i}.py').write_text(f'NAME_{i} = {i}\n\ndef func_{i}():\n    pass\n')
+    pkg_path = f'{pkg_dir}/'
+
+    serial = prep_package(pkg_name, pkg_path, True, [], [])
+    parallel = prep_package(pkg_name, pkg_path, True, [], [], 2)
+    assert list(serial[0].items()) == list(parallel[0].items())
+    assert serial[1] == parallel[1]
+    assert parallel[0]['func_7'][0:3] == ('pool_pkg.sub_1.mod_7', f'{pkg_dir}/sub_1/mod_7.py', ['NAME_7', 'func_7'])
+
+
+def test_pool_so_variables(tmp_dir):
+    (tmp_dir / 'so_one.py').write_text('__all__ = "one"\none = 1\n')
+    (tmp_dir / 'so_two.py').write_text('two = 2\n')
+    (tmp_dir / 'so_slow.py').write_text('import time\ntime.sleep(10)\n')
+    (tmp_dir / 'so_error.py').write_text('raise RuntimeError("init failed")\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        assert pool_so_variables(['so_one', 'so_two'], 2) == [['one'], ['two']]
+        # imported inside worker process only.
+        assert 'so_one' not in sys.modules and 'so_two' not in sys.modules
+
+        with pytest.raises(RuntimeError, match='init failed'):
+            pool_so_variables(['so_error'], 1)
+
+        error = re.escape("extracting names from 'so_slow' took longer than 0.5 seconds.")
+        with pytest.raises(TimeoutError, match=error):
+            pool_so_variables(['so_one', 'so_slow'], 2, 0.5)
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_pool_fork(tmp_dir, monkeypatch):
+    assert pool_fork() is (sys.platform == 'linux')
+    (tmp_dir / 'fork_one.py').write_text('one = 1\n')
+    sys.path.append(str(tmp_dir))
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        # other thread is running, extracted in current process.
+        assert pool_fork() is False
+        file_paths = ['test/basic/one.py', 'test/basic/__init__.py']
+        assert pool_variables(file_paths, 2) == [('one',), ('DEFINE', 're_import')]
+        assert pool_so_variables(['fork_one'], 2) == [['one']] and 'fork_one' in sys.modules
+    finally:
+        stop.set()
+        thread.join()
+        sys.path.remove(str(tmp_dir))
+        sys.modules.pop('fork_one', None)
+
+    monkeypatch.setattr(pool, 'platform', 'darwin')
+    assert pool_fork() is False
@@ -1,5 +1,11 @@
+import os
+import sys
 import pytest
-from dynamic_import.prep import EXT_SUFFIX, prep_package, prep_variables
+import zipapp
+import zipfile
+import subprocess
+from dynamic_import.prep import EXT_SUFFIX, prep_package, prep_files, prep_exclude, prep_glob, prep_variables, \
+                                prep_archive_path, prep_namespace
 
 
 def test_cache():
@@ -64,6 +70,18 @@ def test_prep():
     assert set(dir_mtime) == find_dir_mtime
     assert cached_match == match
 
+    # token engine gives same result
+    info, dir_mtime = prep_package('basic', pkg_path, recursive, exclude_file, exclude_dir, 1, None, 'token')
+    assert {k: v[0:3] for k, v in info.items()} == match
+    info, dir_mtime = prep_package('basic', pkg_path, recursive, exclude_file, exclude_dir, 1, None, 'bytecode')
+    assert {k: v[0:3] for k, v in info.items()} == match
+
+    # content hash stamps
+    info, dir_mtime = prep_package('basic', pkg_path, recursive, exclude_file, exclude_dir, 1, None, 'ast', 'hash')
+    assert {k: v[0:3] for k, v in info.items()} == match
+    assert set(dir_mtime) == find_dir_mtime
+    assert all(isinstance(v[3], bytes) for v in info.values())
+
     # recusvie False test
     # -------------------
     find_dir_mtime = {'test/basic/'}
@@ -92,6 +110,86 @@ def test_prep():
     assert set(dir_mtime) == find_dir_mtime
 
 
+def test_prep_incremental(tmp_dir):
+    pkg_dir = tmp_dir / 'inc_pkg'
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('')
+    one = pkg_dir / 'one.py'
+    one.write_text('ONE = 1\n')
+    two = pkg_dir / 'two.py'
+    two.write_text('TWO = 2\n')
+    pkg_path = f'{pkg_dir}/'
+
+    files = {}
+    info, _ = prep_package('inc_pkg', pkg_path, True, [], [], 1, files)
+    assert sorted(info) == ['ONE', 'TWO']
+    assert set(files) == {f'{pkg_dir}/__init__.py', str(one), str(two)}  # files without names are kept too.
+
+    # unchanged file is reused without extracting it again.
+    module, variables, mtime = files[str(one)]
+    files[str(one)] = (module, ['REUSED'], mtime)
+    # removed & added file
+    two.unlink()
+    (pkg_dir / 'three.py').write_text('THREE = 3\n')
+    info, _ = prep_package('inc_pkg', pkg_path, True, [], [], 1, files)
+    assert sorted(info) == ['REUSED', 'THREE']
+    assert str(two) not in files
+
+    # excluded file is dropped, others are still reused.
+    info, _ = prep_package('inc_pkg', pkg_path, True, [f'{pkg_dir}/three.py'], [], 1, files)
+    assert sorted(info) == ['REUSED']
+
+    # changed file is extracted again.
+    files[str(one)] = (module, ['REUSED'], (mtime[0] - 1, mtime[1]))
+    info, _ = prep_package('inc_pkg', pkg_path, True, [], [], 1, files)
+    assert sorted(info) == ['ONE', 'THREE']
+
+
+def test_prep_files(tmp_dir):
+    pkg_dir = tmp_dir / 'scan_pkg'
+    for each in ('', 'sub', 'sub/tests', 'sub/deep', 'sub/deep/tests', 'tests', 'skip', 'skip/child', '.hidden',
+                 '__pycache__'):
+        (pkg_dir / each).mkdir()
+        (pkg_dir / each / '__init__.py').write_text('')
+        (pkg_dir / each / 'test_one.py').write_text('')
+        (pkg_dir / each / 'note.txt').write_text('')
+    pkg_path = f'{pkg_dir}/'
+
+    def scan(exclude_file=(), exclude_dir=(), recursive=True):
+        dir_mtime = {}
+        r = list(prep_files('scan_pkg', pkg_path, recursive, dir_mtime, exclude_file, exclude_dir))
+        assert set(dir_mtime) == {file_path.rsplit('/', 1)[0] + '/' for _, file_path, _ in r}
+        return sorted(name for name, *_ in r)
+
+    # `__pycache__`, hidden directory & non python file are skipped.
+    assert scan() == ['scan_pkg', 'scan_pkg.skip', 'scan_pkg.skip.child', 'scan_pkg.skip.child.test_one',
+                      'scan_pkg.skip.test_one', 'scan_pkg.sub', 'scan_pkg.sub.deep', 'scan_pkg.sub.deep.test_one',
+                      'scan_pkg.sub.deep.tests', 'scan_pkg.sub.deep.tests.test_one', 'scan_pkg.sub.test_one',
+                      'scan_pkg.sub.tests', 'scan_pkg.sub.tests.test_one', 'scan_pkg.test_one', 'scan_pkg.tests',
+                      'scan_pkg.tests.test_one']
+    assert scan(recursive=False) == ['scan_pkg', 'scan_pkg.test_one']
+    # excluded directory is pruned along with its children.
+    assert not [i for i in scan(exclude_dir=[f'{pkg_path}skip/']) if i.startswith('scan_pkg.skip')]
+    # glob patterns
+    assert scan(exclude_dir=[f'{pkg_path}**/tests/', f'{pkg_path}sk*/']) == \
+        ['scan_pkg', 'scan_pkg.sub', 'scan_pkg.sub.deep', 'scan_pkg.sub.deep.test_one', 'scan_pkg.sub.test_one',
+         'scan_pkg.test_one']
+    assert scan(exclude_file=[f'{pkg_path}**/test_*.py'], exclude_dir=[f'{pkg_path}*/']) == ['scan_pkg']
+    assert scan(exclude_file=[f'{pkg_path}test_one.py', f'{pkg_path}*/test_?ne.py'],
+                exclude_dir=[f'{pkg_path}s*/', f'{pkg_path}*/tests/']) == ['scan_pkg', 'scan_pkg.tests']
+
+
+def test_prep_exclude():
+    assert prep_exclude([]) == (set(), None)
+    paths, match = prep_exclude(['/pkg/one.py', '/pkg/**/test_*.py', '/pkg/[!_]?.py'])
+    assert paths == {'/pkg/one.py'}
+    assert match('/pkg/test_one.py') and match('/pkg/a/b/test_one.py') and match('/pkg/ab.py')
+    assert not match('/pkg/one.py') and not match('/pkg/test_one.pyc') and not match('/pkg/_b.py')
+    assert prep_glob('/pkg/**/test_*.py') == r'/pkg/(?:.*/)?test_[^/]*\.py'
+    assert prep_glob('/pkg/[!a]?[bc].py') == r'/pkg/[^/a][^/][bc]\.py'
+    assert prep_glob('/pkg/[one') == r'/pkg/\[one'
+
+
 def test_prep_variables(tmp_dir):
     pkg_path = tmp_dir / 'no_pkg'
     pkg_path.mkdir()
@@ -100,3 +198,72 @@ def test_prep_variables(tmp_dir):
     with pytest.raises(ModuleNotFoundError, match="No module named 'no_pkg'"):
         list(prep_variables('no_pkg', str(file_so)))
     assert list(prep_variables('pkg', 'file.bad')) == []
+
+
+def test_prep_archive_path(tmp_dir):
+    assert prep_archive_path(f'{tmp_dir}/') is None
+    assert prep_archive_path(f'{tmp_dir}/missing/pkg/') is None
+    (tmp_dir / 'app.pyz').write_bytes(b'')
+    assert prep_archive_path(f'{tmp_dir}/app.pyz/pkg/sub/') == f'{tmp_dir}/app.pyz'
+
+
+def test_importer_archive(tmp_dir):
+    app_dir = tmp_dir / 'app'
+    pkg_dir = app_dir / 'zip_pkg'
+    for sub in ('sub', 'reg', 'skip'):
+        (pkg_dir / sub).mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\n'
+                                         'importer(exclude_dir="skip", exclude_file="sub/bad.py")\n')
+    (pkg_dir / 'one.py').write_text('def one():\n    return 1\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('TWO = 2\n')
+    (pkg_dir / 'sub' / 'bad.py').write_text('raise Exception\n')
+    (pkg_dir / 'reg' / '__init__.py').write_text('REG = 1\n')
+    (pkg_dir / 'reg' / 'three.py').write_text('from zip_pkg import one\nTHREE = one() + 2\n')
+    (pkg_dir / 'skip' / 'four.py').write_text('raise Exception\n')
+    (app_dir / '__main__.py').write_text(
+        'import sys, zip_pkg\n'
+        'print(*zip_pkg.__STATS__["counters"], "zip_pkg.one" in sys.modules)\n'
+        'print(*(i for i in dir(zip_pkg) if i[0] != "_"))\n'
+        'print(zip_pkg.THREE, zip_pkg.TWO, zip_pkg.REG, zip_pkg.one.__module__,\n'
+        '      zip_pkg.one is sys.modules["zip_pkg.one"].one)\n')
+    archive = tmp_dir / 'app.pyz'
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path), 'XDG_CACHE_HOME': str(tmp_dir / 'cache')}
+    env.pop('DYNAMIC_IMPORT_CACHE', None)
+
+    def run():
+        r = subprocess.run([sys.executable, str(archive)], capture_output=True, text=True, env=env)
+        assert r.returncode == 0, r.stderr
+        return r.stdout.splitlines()
+
+    zipapp.create_archive(app_dir, archive)
+    assert run() == ['cache_miss.missing scan importer False', 'REG THREE TWO one', '3 2 1 zip_pkg.one True']
+    assert run()[0] == 'cache_hit importer False'
+    os.utime(archive, ns=(1, 1))  # archive changed
+    assert run()[0] == 'cache_miss.dir scan importer False'
+
+
+def test_importer_archive_files_only(tmp_dir):
+    # note: zip without directory entries (e.g. wheel), `zipimport` can not import `ns` namespace package from it.
+    archive = tmp_dir / 'app.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('file_pkg/__init__.py', 'from dynamic_import import importer\nimporter()\n')
+        z.writestr('file_pkg/one.py', 'ONE = 1\n')
+        z.writestr('file_pkg/reg/__init__.py', '')
+        z.writestr('file_pkg/reg/two.py', 'TWO = 2\n')
+        z.writestr('file_pkg/ns/three.py', 'THREE = 3\n')
+        z.writestr('__main__.py', 'import file_pkg\n'
+                                  'print(*(i for i in dir(file_pkg) if i[0] != "_"))\n'
+                                  'print(file_pkg.ONE, file_pkg.TWO)\n')
+    assert prep_namespace(f'{archive}/file_pkg/ns/') is False
+    assert prep_namespace(f'{archive}/file_pkg/missing/') is False
+
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path), 'XDG_CACHE_HOME': str(tmp_dir / 'cache')}
+    env.pop('DYNAMIC_IMPORT_CACHE', None)
+    r = subprocess.run([sys.executable, str(archive)], capture_output=True, text=True, env=env)
+    assert r.returncode == 0, r.stderr
+    assert r.stdout.splitlines() == ['ONE TWO', '1 2']  # `ns` directory is skipped.
+
+    with zipfile.ZipFile(archive := tmp_dir / 'dir.zip', 'w') as z:
+        z.writestr('file_pkg/ns/', '')
+        z.writestr('file_pkg/ns/three.py', 'THREE = 3\n')
+    assert prep_namespace(f'{archive}/file_pkg/ns/') is True
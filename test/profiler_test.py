@@ -0,0 +1,71 @@
+import os
+import sys
+import subprocess
+from dynamic_import.module import Module
+from dynamic_import.profiler import profile_start, profile_stop, profile_unused, profile_report
+
+
+def make_pkg(tmp_dir, pkg_name):
+    pkg_dir = tmp_dir / pkg_name
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\n')
+    (pkg_dir / 'one.py').write_text(f'from {pkg_name} import TWO\nONE = bytearray(200_000)\n')
+    (pkg_dir / 'sub' / 'two.py').write_text('import time\ntime.sleep(0.01)\nTWO = 2\n')
+    (pkg_dir / 'sub' / 'three.py').write_text('THREE = 3\n')
+
+
+def test_profile(tmp_dir):
+    make_pkg(tmp_dir, 'profile_pkg')
+    sys.path.append(str(tmp_dir))
+    try:
+        import profile_pkg
+        getattr_ = Module.__getattr__
+        state = profile_start()
+        try:
+            assert profile_pkg.ONE == bytearray(200_000)
+            assert profile_pkg.TWO == 2  # already loaded, not recorded again.
+        finally:
+            nodes = profile_stop(state)
+        assert Module.__getattr__ is getattr_
+        assert len(nodes) == 1
+        one = nodes[0]
+        assert (one['name'], one['module']) == ('ONE', 'profile_pkg.one')
+        assert one['memory'] >= 200_000
+        two, = one['children']
+        assert (two['name'], two['module'], two['children']) == ('TWO', 'profile_pkg.sub.two', [])
+        assert two['self'] == two['cumulative'] >= 0.01
+        assert one['cumulative'] == one['self'] + two['cumulative']
+        unused = profile_unused()
+        assert unused['profile_pkg'] == ['profile_pkg.sub.three']
+
+        class File(list):
+            write = list.append
+
+        file = File()
+        profile_report(nodes, {'profile_pkg': unused['profile_pkg']}, file)
+        lines = ''.join(file).splitlines()
+        assert lines[0] == 'lazy load: self [us] | cumulative | memory [KiB] | name -> module'
+        assert lines[1].endswith('| ONE -> profile_pkg.one')
+        assert lines[2].endswith('|   TWO -> profile_pkg.sub.two')
+        assert lines[3] == 'unused: profile_pkg.sub.three'
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_profile_command(tmp_dir):
+    make_pkg(tmp_dir, 'profile_cmd')
+    (tmp_dir / 'main.py').write_text('import sys, profile_cmd\nprint(profile_cmd.ONE[0], sys.argv[1:])\nsys.exit(3)\n')
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+    r = subprocess.run([sys.executable, '-m', 'dynamic_import', 'profile', str(tmp_dir / 'main.py'), '--port', '1'],
+                       capture_output=True, text=True, env=env, cwd=tmp_dir)
+    assert r.returncode == 3
+    assert r.stdout == "0 ['--port', '1']\n"
+    lines = r.stderr.splitlines()
+    assert lines[1].endswith('| ONE -> profile_cmd.one')
+    assert lines[2].endswith('|   TWO -> profile_cmd.sub.two')
+    assert lines[3:] == ['unused: profile_cmd.sub.three']
+
+    (tmp_dir / 'main.py').rename(tmp_dir / 'main_mod.py')
+    r = subprocess.run([sys.executable, '-m', 'dynamic_import', 'profile', '-m', 'main_mod'],
+                       capture_output=True, text=True, env=env, cwd=tmp_dir)
+    assert r.returncode == 3 and r.stdout == '0 []\n'
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import subprocess
+from dynamic_import.stats import BUCKETS, HOOKS, new_stats, stats_event, stats_export
+
+AUDIT = []
+sys.addaudithook(lambda event, args: AUDIT.append((event, args)) if event.startswith('dynamic_import.') else None)
+
+
+def test_stats_event():
+    stats = new_stats('pkg')
+    assert stats == {'package': 'pkg', 'counters': {}, 'timings': {}, 'loads': {}}
+    found = []
+    HOOKS.append(lambda *args: found.append(args))
+    try:
+        stats_event(stats, 'cache_miss', reason='file', path='/path/pkg/one.py')
+        stats_event(stats, 'load', 0.00005, name='one', module='pkg.one')
+        stats_event(stats, 'load', 0.5, name='TWO', module='pkg.two')
+        stats_event(stats, 'load', 5.0, name='three', module='pkg.three')
+    finally:
+        HOOKS.pop()
+    assert stats['counters'] == {'cache_miss.file': 1, 'load': 3}
+    assert stats['timings'] == {'load': {'count': 3, 'total': 5.50005, 'max': 5.0, 'buckets': [1, 0, 0, 0, 1, 1]}}
+    assert len(stats['timings']['load']['buckets']) == len(BUCKETS) + 1
+    assert stats['loads'] == {'one': 0.00005, 'TWO': 0.5, 'three': 5.0}
+    assert found[0] == ('cache_miss', 'pkg', {'reason': 'file', 'path': '/path/pkg/one.py'})
+    assert found[1] == ('load', 'pkg', {'name': 'one', 'module': 'pkg.one', 'seconds': 0.00005})
+    assert ('dynamic_import.load', ('pkg', {'name': 'TWO', 'module': 'pkg.two', 'seconds': 0.5})) in AUDIT
+
+
+def test_stats_export(tmp_dir):
+    path = str(tmp_dir / 'stats.jsonl')
+    stats_export(path, 'scan', 'pkg', {'names': 3, 'seconds': 0.1})
+    stats_export(path, 'load', 'pkg', {'name': 'one', 'seconds': 0.2})
+    lines = [json.loads(line) for line in open(path)]
+    assert [(i['event'], i['package'], i['seconds']) for i in lines] == [('scan', 'pkg', 0.1), ('load', 'pkg', 0.2)]
+    assert all(isinstance(i['time'], float) and isinstance(i['pid'], int) for i in lines)
+
+
+def test_importer_stats(tmp_dir):
+    pkg_dir = tmp_dir / 'stats_pkg'
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter()\n')
+    (pkg_dir / 'one.py').write_text('ONE = 1\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import stats_pkg
+        assert stats_pkg.ONE == 1
+        stats = stats_pkg.__STATS__
+        assert stats['counters'] == {'cache_miss.missing': 1, 'scan': 1, 'importer': 1, 'load': 1}
+        assert set(stats['timings']) == {'scan', 'importer', 'load'}
+        assert list(stats['loads']) == ['ONE']
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_importer_stats_restart(tmp_dir):
+    pkg_dir = tmp_dir / 'restart_pkg'
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter()\n')
+    for i in range(4):
+        (pkg_dir / 'sub' / f'mod_{i}.py').write_text(f'NAME_{i} = {i}\n')
+    export = tmp_dir / 'stats.jsonl'
+    # note: no `.pyc` is written, so `__pycache__` is only created by `importer()`
+    env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '1', 'DYNAMIC_IMPORT_STATS': str(export)}
+    code = f'import sys\nsys.path[:0] = {[str(tmp_dir), *sys.path]!r}\nimport restart_pkg\n'
+
+    def run():
+        export.unlink(missing_ok=True)
+        r = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+        assert r.returncode == 0, r.stderr
+        return [(i['event'], i.get('reason'), i.get('reused')) for i in map(json.loads, export.open())]
+
+    assert run() == [('cache_miss', 'missing', None), ('scan', None, 0), ('importer', None, None)]
+    assert run() == [('cache_hit', None, None), ('importer', None, None)]  # cache created by first run is valid.
+    (pkg_dir / 'sub' / 'mod_3.py').write_text('NAME_3 = 33\n')
+    # only changed file is extracted again.
+    assert run() == [('cache_miss', 'file', None), ('scan', None, 4), ('importer', None, None)]
@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import pytest
+import threading
+import importlib
+from dynamic_import.check import IMPORTER_CALLED, importer_called
+
+try:
+    import _interpreters as interpreters  # python3.13+
+except ImportError:
+    interpreters = None  # note: python3.12 `_xxsubinterpreters` is experimental, crashes when ran from threads.
+
+THREADS = 16
+
+
+def make_pkg(tmp_dir, pkg_name, modules=8):
+    ''' Create package that calls `importer()` with `modules` number of sub-modules '''
+    pkg_dir = tmp_dir / pkg_name
+    (pkg_dir / 'sub').mkdir(parents=True)
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\n')
+    for i in range(modules):
+        (pkg_dir / 'sub' / f'mod_{i}.py').write_text(f'import time\ntime.sleep(0.01)\nNAME_{i} = object()\n')
+    return pkg_dir
+
+
+def run_threads(target, args):
+    ''' Run `target(*arg)` for each of `args` in its own thread, all released at once '''
+    barrier = threading.Barrier(len(args))
+    errors = []
+
+    def run(*arg):
+        barrier.wait()
+        try:
+            target(*arg)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=arg) for arg in args]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def test_importer_called_threads():
+    paths = [f'/path/thread_called_{i}/' for i in range(THREADS * 8)]
+    run_threads(lambda start: [importer_called(path) for path in paths[start::THREADS]],
+                [(i,) for i in range(THREADS)])
+    assert all(IMPORTER_CALLED[path] == set() for path in paths)
+    assert all(importer_called(path) is True for path in paths)
+
+
+def test_importer_threads(tmp_dir):
+    pkg_names = [f'thread_many_{i}' for i in range(THREADS // 2)]
+    for pkg_name in pkg_names:
+        make_pkg(tmp_dir, pkg_name)
+    sys.path.append(str(tmp_dir))
+    try:
+        found = {}
+
+        def use(pkg_name, i):
+            # many packages are imported at once, each name is first used from 2 threads.
+            pkg = importlib.import_module(pkg_name)
+            for j in range(8):
+                found[pkg_name, i, j] = getattr(pkg, f'NAME_{(i + j) % 8}')
+
+        run_threads(use, [(pkg_name, i) for pkg_name in pkg_names for i in range(2)])
+        for (pkg_name, i, j), value in found.items():
+            assert value is getattr(sys.modules[f'{pkg_name}.sub.mod_{(i + j) % 8}'], f'NAME_{(i + j) % 8}')
+            assert value is getattr(sys.modules[pkg_name], f'NAME_{(i + j) % 8}')
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+@pytest.mark.skipif(interpreters is None, reason='sub-interpreters are not supported.')
+def test_importer_subinterpreters(tmp_dir):
+    make_pkg(tmp_dir, 'thread_interp')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # each interpreter has its own `IMPORTER_CALLED`, `Module` & loaded modules.
+    code = f'''if True:
+        import sys
+        sys.path[:0] = [{root!r}, {str(tmp_dir)!r}]
+        import thread_interp
+        from dynamic_import.check import IMPORTER_CALLED
+        assert list(IMPORTER_CALLED) == [{f'{tmp_dir}/thread_interp/'!r}], IMPORTER_CALLED
+        assert thread_interp.NAME_3 is sys.modules['thread_interp.sub.mod_3'].NAME_3
+        assert type(thread_interp).__name__ == 'Module'
+    '''
+    ids = [interpreters.create() for _ in range(4)]
+    try:
+        results = []
+        run_threads(lambda interp: results.append(interpreters.run_string(interp, code)), [(i,) for i in ids])
+        assert results == [None] * len(ids)  # note: returns error instead of raising it.
+    finally:
+        for interp in ids:
+            interpreters.destroy(interp)
+    assert 'thread_interp' not in sys.modules  # main interpreter is not affected.
+
+
+def test_import_threads(tmp_dir):
+    pkg_dir = make_pkg(tmp_dir, 'thread_import')
+    # note: other threads find original module in `sys.modules` while `__init__.py` is still running.
+    (pkg_dir / '__init__.py').write_text('import time\ntime.sleep(0.2)\n'
+                                         'from dynamic_import import importer\nimporter(cache=False)\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        found = []
+
+        def use(i):
+            time.sleep(i * 0.005)  # most threads start importing while `__init__.py` is sleeping.
+            import thread_import
+            found.append((thread_import.NAME_1, 'NAME_2' in dir(thread_import)))
+
+        run_threads(use, [(i,) for i in range(THREADS)])
+        assert found == [(sys.modules['thread_import.sub.mod_1'].NAME_1, True)] * THREADS
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_import_loading(tmp_dir):
+    pkg_dir = tmp_dir / 'thread_loading'
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\n')
+    (pkg_dir / 'slow.py').write_text('import time\ntime.sleep(0.3)\ndef slow():\n    return 1\nSLOW = 2\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import thread_loading
+        found = []
+
+        def use(i):
+            if i:
+                time.sleep(0.1)  # note: `slow.py` is still running in other thread.
+                found.append(importlib.import_module('thread_loading.slow').SLOW)
+            else:
+                found.append(thread_loading.SLOW)
+
+        # `import` waits for module being loaded through `Module` instead of getting it half executed.
+        run_threads(use, [(0,), (1,)])
+        assert found == [2, 2]
+        assert thread_loading.slow() == 1  # exported name is not replaced by sub-module of same name.
+    finally:
+        sys.path.remove(str(tmp_dir))
+
+
+def test_import_cycle(tmp_dir):
+    pkg_dir = tmp_dir / 'thread_cycle'
+    pkg_dir.mkdir()
+    (pkg_dir / '__init__.py').write_text('from dynamic_import import importer\nimporter(cache=False)\n')
+    (pkg_dir / 'a.py').write_text('import time\nA = 1\ntime.sleep(0.2)\nfrom thread_cycle import B\n')
+    (pkg_dir / 'b.py').write_text('import time\nB = 2\ntime.sleep(0.2)\nfrom thread_cycle import A\n')
+    sys.path.append(str(tmp_dir))
+    try:
+        import thread_cycle
+        barrier = threading.Barrier(2)
+        found = {}
+
+        def use(name):
+            barrier.wait()
+            found[name] = getattr(thread_cycle, name)
+
+        # each thread loads one module, which uses name of the other one while its still being loaded.
+        threads = [threading.Thread(target=use, args=(name,), daemon=True) for name in ('A', 'B')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        assert not any(thread.is_alive() for thread in threads)  # no deadlock.
+        assert found == {'A': 1, 'B': 2}
+        assert (sys.modules['thread_cycle.a'].B, sys.modules['thread_cycle.b'].A) == (2, 1)
+    finally:
+        sys.path.remove(str(tmp_dir))